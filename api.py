@@ -0,0 +1,219 @@
+import argparse
+import hmac
+import json
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlsplit
+import core
+from config import (API_HOST, API_MAX_BODY_BYTES, API_PORT,
+                    SEARCH_RESULT_LIMIT, SUGGESTION_LIMIT)
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class ApiError(Exception):
+    """
+    Error answered to the client with an HTTP status and a message.
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _names(body: dict[str, Any]) -> list[str]:
+    # The "items" of a request body, a list of item names
+    items = body.get("items")
+    if not isinstance(items, list) or not all(
+            isinstance(item, str) and item.strip() for item in items):
+        raise ApiError(400, '"items" must be a list of item names')
+    return items
+
+
+def _pairs(body: dict[str, Any]) -> list[tuple[str, str]]:
+    # The "items" of a catalog add, a list of {"category", "item"}
+    items = body.get("items")
+    if not isinstance(items, list) or not all(
+            isinstance(entry, dict)
+            and isinstance(entry.get("category"), str)
+            and isinstance(entry.get("item"), str)
+            and entry["item"].strip() for entry in items):
+        raise ApiError(400, '"items" must be a list of {"category", '
+                       '"item"} objects')
+    return [(entry["category"], entry["item"]) for entry in items]
+
+
+def _limit(query: dict[str, list[str]], default: int) -> int:
+    try:
+        limit = int(query.get("limit", [default])[0])
+    except ValueError:
+        raise ApiError(400, '"limit" must be an integer') from None
+    if limit < 1:
+        raise ApiError(400, '"limit" must be positive')
+    return limit
+
+
+def _list(grocery_list: tuple[str, ...]) -> dict[str, Any]:
+    return {"items": list(grocery_list)}
+
+
+def _catalog_summary(groceries) -> dict[str, Any]:
+    # Mutations answer with the size only, the catalog can be large
+    return {"item_count": groceries.item_count()}
+
+
+# Handlers by method and path, called with the query and the JSON body
+ROUTES: dict[tuple[str, str], Callable[[dict, dict], dict[str, Any]]] = {
+    ("GET", "/list"): lambda query, body: _list(core.read_list()),
+    ("POST", "/list/add"): lambda query, body: _list(
+        core.add_to_list(_names(body))),
+    ("POST", "/list/remove"): lambda query, body: _list(
+        core.remove_from_list(_names(body))),
+    ("POST", "/list/check-off"): lambda query, body: _list(
+        core.check_off(_names(body))),
+    ("GET", "/catalog"): lambda query, body: {
+        "categories": core.read_groceries().to_dict()},
+    ("GET", "/catalog/search"): lambda query, body: {"results": [
+        {"category": category, "item": item}
+        for category, item in core.read_groceries().search(
+            query.get("q", [""])[0],
+            _limit(query, SEARCH_RESULT_LIMIT))]},
+    ("POST", "/catalog/add"): lambda query, body: _catalog_summary(
+        core.add_groceries(_pairs(body))),
+    ("POST", "/catalog/remove"): lambda query, body: _catalog_summary(
+        core.remove_groceries(_names(body))),
+    ("GET", "/suggestions"): lambda query, body: {"items": [
+        {"item": stats.item, "count": stats.count}
+        for stats in core.suggest(_limit(query, SUGGESTION_LIMIT))]},
+    ("GET", "/status"): lambda query, body: {
+        "pending_writes": core.pending_writes(),
+        "read_cache": core.read_cache_stats(),
+        "storage": core.storage_stats()},
+}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    Request handler answering the routes of ROUTES with JSON.
+
+    Requests must carry "Authorization: Bearer <token>" when the
+    GROCERY_API_TOKEN environment variable is set.
+    """
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        try:
+            self._authorize()
+            route = ROUTES.get((method, url.path.rstrip("/")))
+            if route is None:
+                raise ApiError(404, f"No route {method} {url.path}")
+            self._send(200, route(parse_qs(url.query), self._body()))
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logger.error("Error in %s %s: %s", method, url.path, e)
+            self._send(500, {"error": str(e)})
+
+    def _authorize(self) -> None:
+        token = os.environ.get("GROCERY_API_TOKEN")
+        if not token:
+            return
+        given = self.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode(),
+                                   f"Bearer {token}".encode()):
+            raise ApiError(401, "Missing or wrong bearer token")
+
+    def _body(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_BODY_BYTES:
+            raise ApiError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ApiError(400, "Request body is not valid JSON") from None
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return body
+
+    def _send(self, status: int, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s " + format, self.address_string(), *args)
+
+
+def start_server(port: int, host: str = API_HOST) -> ThreadingHTTPServer:
+    """
+    Serve the JSON API from a daemon thread.
+
+    Arguments:
+        port -- Port to listen on.
+
+    Keyword Arguments:
+        host -- Address to bind, default: API_HOST
+
+    Returns:
+        ThreadingHTTPServer -- The running server.
+
+    Raises:
+        OSError -- If the port cannot be bound.
+
+    Example:
+        >>> start_server(8600)
+        # curl -d '{"items": ["Milk"]}' http://127.0.0.1:8600/list/add
+    """
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="api-http",
+                     daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve the grocery list and catalog as a JSON API.")
+    parser.add_argument("--host", default=API_HOST,
+                        help="address to bind")
+    parser.add_argument("--port", type=int,
+                        default=os.environ.get("GROCERY_API_PORT",
+                                               API_PORT or 8600),
+                        help="port to listen on")
+    args = parser.parse_args()
+    core.recover()
+    core.start_change_feed()
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    logger.info("Serving the JSON API on %s:%s", args.host, args.port)
+    # Store what is queued when stopped by the process manager
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        core.flush_writes()
+
+
+if __name__ == "__main__":
+    main()
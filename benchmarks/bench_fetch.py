@@ -0,0 +1,99 @@
+"""
+Compare serial and concurrent cold reads of the list and catalog.
+
+Runs against an in-memory SQLite backend behind a fake that adds a
+round-trip delay to every call, a different one per document. The
+serial run calls get_list() then get_groceries(), as main.py used to;
+the concurrent run calls load_documents(). Each run starts from an
+empty read cache and fresh op-logs.
+
+Usage:
+    python -m benchmarks.bench_fetch --list-latency 0.08 \\
+        --catalog-latency 0.12 [--items 10000] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+from typing import Callable
+
+from benchmarks.fakes import (FakeStreamlit, LatencyBackend, fake_backend,
+                              fake_oplogs, synthetic_catalog)
+import core
+import functions
+from journal import Journal
+
+
+def _cold(backend: LatencyBackend, fake: FakeStreamlit) -> None:
+    fake.session_state.clear()
+    oplogs = fake_oplogs(backend)
+    core._get_oplogs = lambda: oplogs
+    core._read_cache.invalidate("list")
+    core._read_cache.invalidate("groceries")
+
+
+def _serial() -> None:
+    functions.get_list()
+    functions.get_groceries()
+
+
+def time_runs(func: Callable[[], None], setup: Callable[[], None],
+              repeat: int) -> list[float]:
+    """
+    Time a function, running setup before every run.
+
+    Arguments:
+        func -- The function to time.
+        setup -- Called untimed before each run.
+        repeat -- Number of runs.
+
+    Returns:
+        list[float] -- Wall time of each run in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--list-latency", type=float, default=0.08,
+                        help="seconds per backend call on the list")
+    parser.add_argument("--catalog-latency", type=float, default=0.12,
+                        help="seconds per backend call on the catalog")
+    parser.add_argument("--items", type=int, default=10000,
+                        help="catalog size in items")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timed runs per mode")
+    args = parser.parse_args()
+
+    fake = FakeStreamlit()
+    functions.st = fake
+    # Resolve the cached pool once, outside of a running app
+    pool = functions._get_fetch_pool()
+    functions._get_fetch_pool = lambda: pool
+    # Nothing is written, the journal only has to be empty
+    journal = Journal(None)
+    core._get_journal = lambda: journal
+    backend = LatencyBackend(
+        fake_backend(synthetic_catalog(args.items), ["Milk", "Bread"]), 0.0,
+        {"list": args.list_latency, "groceries": args.catalog_latency})
+
+    # A cold read of a document is two calls, the snapshot and the op-log
+    print(f"cold read: list {2 * args.list_latency * 1000:.0f} ms, "
+          f"catalog {2 * args.catalog_latency * 1000:.0f} ms "
+          f"(2 calls each), {args.items} items")
+    for name, func in (("serial", _serial),
+                       ("concurrent", functions.load_documents)):
+        timings = time_runs(func, lambda: _cold(backend, fake), args.repeat)
+        print(f"{name:<12} median {statistics.median(timings) * 1000:>8.1f}"
+              f" ms, min {min(timings) * 1000:>8.1f} ms")
+    assert fake.session_state["grocery_list"] == ("Milk", "Bread")
+    assert fake.session_state["groceries"].item_count() == args.items
+
+
+if __name__ == "__main__":
+    main()
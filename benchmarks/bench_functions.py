@@ -0,0 +1,211 @@
+"""
+Time the functions.py hot paths on synthetic catalogs.
+
+Each benchmark runs against a fake st module and an in-memory SQLite
+backend, for every catalog size. Results are printed as a table and can
+be written as JSON and compared with an earlier run.
+
+Usage:
+    python -m benchmarks.bench_functions --sizes 100,1000,10000,100000 \\
+        --output results.json [--compare baseline.json]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable
+
+from benchmarks.fakes import (FakeStreamlit, fake_backend, fake_oplogs,
+                              synthetic_catalog)
+import core
+import functions
+from catalog import Catalog, canonical_name
+from config import CATEGORIES
+from journal import Journal
+
+# Number of checked items used by the selection benchmarks
+SELECTED = 100
+# Typeahead queries timed together by the catalog_search benchmark
+QUERIES = ("i", "item 0", "item 00000042", "fresh", "frsh", "dairy's",
+           "itme 5", "pantry item", "frozen 00001", "zzz")
+
+
+def _selection(catalog: dict[str, list[str]], count: int) -> list[str]:
+    items = [item for items in catalog.values() for item in items]
+    return random.Random(1).sample(items, min(count, len(items)))
+
+
+def _fresh_state(fake: FakeStreamlit, shared: Catalog,
+                 catalog: dict[str, list[str]], selected: list[str]) -> None:
+    fake.session_state.clear()
+    # Sessions start from the shared snapshot, as published by the cache
+    core._read_cache.invalidate("groceries")
+    fake.session_state["groceries"] = shared
+    fake.session_state["grocery_list"] = ()
+    checked = {shared.item_id(item) for item in selected}
+    fake.session_state["added_groceries"] = set(checked)
+    for items in catalog.values():
+        for item in items:
+            item_id = shared.item_id(item)
+            fake.session_state[functions.item_key(item_id)] = \
+                item_id in checked
+
+
+def benchmarks(fake: FakeStreamlit, catalog: dict[str, list[str]]
+               ) -> dict[str, tuple[Callable[[], None], Callable[[], None]]]:
+    """
+    Build the setup and timed callables for one catalog.
+
+    Arguments:
+        fake -- The fake st module installed in functions.
+        catalog -- The synthetic catalog.
+
+    Returns:
+        dict[str, tuple[Callable, Callable]] -- Setup and timed function
+            for each benchmark name.
+    """
+    items = [item for cat_items in catalog.values() for item in cat_items]
+    selected = _selection(catalog, SELECTED)
+    oplogs = fake_oplogs(fake_backend(catalog))
+    core._get_oplogs = lambda: oplogs
+    shared = Catalog(catalog).freeze()
+
+    def reset() -> None:
+        _fresh_state(fake, shared, catalog, selected)
+
+    def load() -> None:
+        reset()
+
+    searched = Catalog(catalog)
+    searched.search("warm up")
+
+    def search() -> None:
+        for query in QUERIES:
+            searched.search(query)
+
+    def display() -> None:
+        fake.session_state["added_groceries"] = set()
+        for category in CATEGORIES:
+            functions.display_grocery_category(category)
+
+    return {
+        "canonical_name": (reset, lambda: [canonical_name(item)
+                                           for item in items]),
+        "split_categories": (reset, functions.split_categories),
+        "remove_groceries": (reset, functions.remove_groceries),
+        "clear_session_state": (reset, functions.clear_session_state),
+        "get_groceries": (load, functions.get_groceries),
+        "display_grocery_category": (reset, display),
+        "catalog_search": (lambda: None, search),
+    }
+
+
+def run(sizes: list[int], repeat: int,
+        only: set[str] | None = None) -> list[dict]:
+    """
+    Run every benchmark for every catalog size.
+
+    Arguments:
+        sizes -- Catalog sizes in items.
+        repeat -- Timed runs per benchmark and size.
+
+    Keyword Arguments:
+        only -- Names of the benchmarks to run, default: None (all)
+
+    Returns:
+        list[dict] -- One result record per benchmark and size.
+    """
+    fake = FakeStreamlit()
+    functions.st = fake
+    # Keep the journal in a scratch directory so publishes pay its fsync
+    scratch = tempfile.TemporaryDirectory()
+    journal = Journal(f"{scratch.name}/journal.jsonl")
+    core._get_journal = lambda: journal
+    core._start_writer_client = lambda: None
+    results = []
+    for size in sizes:
+        catalog = synthetic_catalog(size)
+        for name, (setup, func) in benchmarks(fake, catalog).items():
+            if only and name not in only:
+                continue
+            timings = []
+            for _ in range(repeat):
+                setup()
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            results.append({"benchmark": name, "items": size,
+                            "repeat": repeat,
+                            "median_s": statistics.median(timings),
+                            "min_s": min(timings)})
+            print(f"{name:<26} {size:>8} items "
+                  f"{results[-1]['median_s'] * 1000:>12.3f} ms")
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], baseline_path: str) -> None:
+    """
+    Print the ratio of each median to the same benchmark in a baseline.
+
+    Arguments:
+        results -- Results of this run.
+        baseline_path -- JSON file written by an earlier run.
+
+    Returns:
+        None
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["benchmark"], r["items"]): r
+                    for r in json.load(f)["results"]}
+    print("\nbenchmark                  items     baseline ms   current ms"
+          "   ratio")
+    for r in results:
+        old = baseline.get((r["benchmark"], r["items"]))
+        if old is None:
+            continue
+        print(f"{r['benchmark']:<26} {r['items']:>8} "
+              f"{old['median_s'] * 1000:>12.3f} "
+              f"{r['median_s'] * 1000:>12.3f} "
+              f"{r['median_s'] / old['median_s']:>7.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="comma separated catalog sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="",
+                        help="comma separated benchmark names")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare with")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = set(filter(None, args.only.split(",")))
+    results = run(sizes, args.repeat, only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": _git_commit(),
+                       "python": platform.python_version(),
+                       "timestamp": datetime.now().isoformat(),
+                       "results": results}, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
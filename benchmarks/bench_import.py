@@ -0,0 +1,107 @@
+"""
+Measure the throughput of the streaming catalog import and export.
+
+Writes a synthetic catalog file of the given number of rows, in CSV and
+in JSON, where every tenth row repeats an earlier item in other casing.
+Each file is imported into an empty in-memory SQLite backend and the
+catalog is exported again. Reports rows per second and the peak memory
+of the process, which grows with the catalog and not with the file.
+
+Usage:
+    python -m benchmarks.bench_import --rows 1000000 [--batch-size 5000]
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.fakes import fake_backend
+import catalog_io
+from config import CATEGORIES, CSV_HEADERS, IMPORT_BATCH_SIZE
+
+
+def synthetic_rows(rows: int):
+    """
+    Yield (category, item) rows with one duplicate in ten.
+
+    Arguments:
+        rows -- Number of rows.
+
+    Returns:
+        Iterator[tuple[str, str]] -- The rows.
+    """
+    for i in range(rows):
+        if i % 10 == 9:
+            yield CATEGORIES[0], f"ITEM {i - 5:08d}"
+        else:
+            yield CATEGORIES[i % len(CATEGORIES)], f"item {i:08d}"
+
+
+def write_files(rows: int, directory: str) -> dict[str, str]:
+    """
+    Write the synthetic rows as a CSV and a JSON catalog file.
+
+    Arguments:
+        rows -- Number of rows.
+        directory -- Directory for the files.
+
+    Returns:
+        dict[str, str] -- Paths of the files keyed by format.
+    """
+    paths = {fmt: os.path.join(directory, f"catalog.{fmt}")
+             for fmt in ("csv", "json")}
+    with open(paths["csv"], "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        writer.writerows(synthetic_rows(rows))
+    # One pass over the rows per category, so the rows are never all held
+    with open(paths["json"], "w", encoding="utf-8") as f:
+        f.write("{")
+        for i, category in enumerate(CATEGORIES):
+            f.write(f"{',' if i else ''}\n{json.dumps(category)}:[")
+            f.write(",".join(json.dumps(item)
+                             for cat, item in synthetic_rows(rows)
+                             if cat == category))
+            f.write("]")
+        f.write("\n}\n")
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1_000_000,
+                        help="rows in the catalog file")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE,
+                        help="operations per storage insert")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(args.rows, directory)
+        for fmt, path in paths.items():
+            backend = fake_backend({})
+            reader = catalog_io.read_csv if fmt == "csv" \
+                else catalog_io.read_json
+            started = time.perf_counter()
+            with open(path, encoding="utf-8", newline="") as f:
+                counts = catalog_io.import_rows(backend, reader(f),
+                                                args.batch_size)
+            elapsed = time.perf_counter() - started
+            print(f"import {fmt:<4} {counts['rows']:>9} rows "
+                  f"{elapsed:7.2f} s {counts['rows'] / elapsed:>9.0f} "
+                  f"rows/s ({counts['added']} added, "
+                  f"{counts['duplicates']} duplicates)")
+            started = time.perf_counter()
+            with open(os.path.join(directory, f"export.{fmt}"), "w",
+                      encoding="utf-8", newline="") as f:
+                written = catalog_io.export_rows(backend, f, fmt)
+            elapsed = time.perf_counter() - started
+            print(f"export {fmt:<4} {written:>9} rows "
+                  f"{elapsed:7.2f} s {written / elapsed:>9.0f} rows/s")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak memory: {peak:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
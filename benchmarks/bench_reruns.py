@@ -0,0 +1,337 @@
+"""
+Replay many simulated sessions through main.py at the same time.
+
+Every session is a Streamlit AppTest in a process of its own, like one
+server instance per session, and all of them share one SQLite database
+file, so the sessions contend for its write lock and rebase onto each
+other's op-log writes. Each session replays a weighted mix of user
+actions. The sessions are first run one alone, as the uncontended
+baseline, then all together.
+
+The report gives the rerun latency percentiles per action of both runs
+and the slowdown of the concurrent one, the mean latency of each storage
+call, the op-log writes that were rebased onto another session's
+operations or refused because their base was compacted, storage retries
+and timeouts, and the depth of the write queues.
+
+Usage:
+    python -m benchmarks.bench_reruns --sessions 20 --items 1000 \\
+        [--actions 30] [--think 0.05] [--seed 0]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any
+
+from benchmarks.fakes import synthetic_catalog
+from storage import SQLiteBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative weight of each simulated user action
+ACTIONS = {"check": 40, "add_to_list": 12, "tick_off": 12, "search": 16,
+           "add_catalog": 8, "remove_catalog": 4, "page": 8}
+# Seconds between two samples of the write queue
+SAMPLE_INTERVAL = 0.01
+
+
+def percentiles(timings: list[float]) -> dict[str, float]:
+    """
+    Return the p50, p95 and p99 of a list of timings.
+
+    Arguments:
+        timings -- Timings in seconds.
+
+    Returns:
+        dict[str, float] -- Percentiles in milliseconds.
+    """
+    if len(timings) < 2:
+        value = timings[0] * 1000 if timings else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000,
+            "p99": cuts[98] * 1000}
+
+
+class Session:
+    """
+    One simulated user driving its own AppTest.
+
+    Attributes:
+        name: Session name used in error reports.
+        timings: Rerun times in seconds per action.
+        errors: Exceptions raised by the app, as strings.
+    """
+
+    def __init__(self, name: str, seed: int) -> None:
+        from streamlit.testing.v1 import AppTest
+        self.name = name
+        self.rng = random.Random(seed)
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self.errors: list[str] = []
+        self.app = AppTest.from_file(os.path.join(ROOT, "main.py"),
+                                     default_timeout=120)
+        self._created = 0
+
+    def _timed(self, action: str, element) -> None:
+        start = time.perf_counter()
+        element.run()
+        self.timings[action].append(time.perf_counter() - start)
+        if self.app.exception:
+            self.errors.append(f"{self.name} {action}: "
+                               f"{self.app.exception[0].message}")
+
+    def _checkboxes(self, prefix: str) -> list:
+        return [box for box in self.app.checkbox
+                if box.key and box.key.startswith(prefix)]
+
+    def open(self) -> None:
+        self._timed("open", self.app)
+
+    def act(self, action: str) -> None:
+        """
+        Perform one user action, if the current page allows it.
+
+        Arguments:
+            action -- A key of ACTIONS.
+
+        Returns:
+            None
+        """
+        app, rng = self.app, self.rng
+        if action == "check":
+            boxes = [box for box in self._checkboxes("item_")
+                     if not box.value]
+            if boxes:
+                self._timed(action, rng.choice(boxes).check())
+        elif action == "add_to_list":
+            self._timed(action, app.button(key="add_button").click())
+        elif action == "tick_off":
+            boxes = self._checkboxes("list_")
+            if boxes:
+                self._timed(action, rng.choice(boxes).check())
+        elif action == "search":
+            query = rng.choice(["item", "fresh", "dairy", "froz", "itme"])
+            self._timed(action, app.text_input(key="search_query")
+                        .input(f"{query} {rng.randrange(100):02d}"))
+            self._timed(action, app.text_input(key="search_query").input(""))
+        elif action == "add_catalog":
+            app.selectbox(key="category").select_index(
+                rng.randrange(len(app.selectbox(key="category").options)))
+            self._created += 1
+            self._timed(action, app.text_input(key="tmp_grocery").input(
+                f"new {self.name} {self._created}"))
+        elif action == "remove_catalog":
+            boxes = self._checkboxes("item_")
+            if boxes:
+                rng.choice(boxes).check()
+                self._timed(action, app.button(key="remove_button").click())
+        elif action == "page":
+            pages = [box for box in app.number_input
+                     if box.key and box.key.startswith("page_")]
+            if pages:
+                box = rng.choice(pages)
+                self._timed(action, box.set_value(
+                    rng.randint(box.min, box.max)))
+
+
+def _seed_database(path: str, items: int, list_size: int) -> None:
+    catalog = synthetic_catalog(items)
+    names = [item for cat_items in catalog.values() for item in cat_items]
+    backend = SQLiteBackend(path)
+    backend.write_document("groceries", catalog, 0)
+    backend.write_document("list", random.Random(0).sample(
+        names, min(list_size, len(names))), 0)
+
+
+def _session(index: int, path: str, scratch: str, actions: int,
+             think: float, seed: int, start: Any, results: Any) -> None:
+    """
+    Run one session in a process of its own and report its counts.
+
+    Arguments:
+        index -- Number of the session.
+        path -- The shared SQLite database file.
+        scratch -- Directory for the session's journal.
+        actions -- Actions to perform.
+        think -- Seconds to wait between actions.
+        seed -- Random seed of the action mix.
+        start -- Barrier all sessions pass before their first rerun.
+        results -- Queue the counts are put on.
+
+    Returns:
+        None
+    """
+    os.environ["GROCERY_STORAGE_BACKEND"] = "sqlite"
+    os.environ["GROCERY_SQLITE_PATH"] = path
+    os.environ["GROCERY_JOURNAL_PATH"] = os.path.join(
+        scratch, f"journal-{index}.jsonl")
+    user = Session(f"s{index}", seed + index)
+    start.wait()
+    began = time.perf_counter()
+    user.open()
+
+    import core
+    import database
+    import resilience
+    writer = core._start_write_behind()
+    depths: list[int] = []
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.wait(SAMPLE_INTERVAL):
+            depths.append(writer.pending())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    names, weights = zip(*ACTIONS.items())
+    for _ in range(actions):
+        user.act(user.rng.choices(names, weights)[0])
+        if think:
+            time.sleep(think)
+    wall = time.perf_counter() - began
+    writer.flush(timeout=60)
+    done.set()
+    sampler.join()
+    oplogs = core._get_oplogs().values()
+    results.put({
+        "timings": dict(user.timings), "errors": user.errors,
+        "depths": depths, "superseded": writer.superseded, "wall": wall,
+        "rebases": sum(log.rebases for log in oplogs),
+        "refused": sum(log.stale for log in oplogs),
+        "storage": database.get_backend().stats(),
+        "calls": {labels[0]: (series[1], series[2]) for labels, series
+                  in resilience._CALL_SECONDS._series.items()}})
+
+
+def run(sessions: int, items: int, actions: int, think: float,
+        seed: int) -> dict:
+    """
+    Run the sessions at the same time, each in its own process.
+
+    Arguments:
+        sessions -- Number of sessions.
+        items -- Catalog size in items.
+        actions -- Actions per session.
+        think -- Seconds each session waits between actions.
+        seed -- Random seed of the action mix.
+
+    Returns:
+        dict -- Timings per action, queue samples, storage call times and
+            counts summed over the sessions, errors and the wall time.
+    """
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Barrier(sessions), context.Queue()
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "groceries.db")
+        _seed_database(path, items, list_size=30)
+        workers = [context.Process(target=_session, args=(
+            index, path, scratch, actions, think, seed, start, results))
+            for index in range(sessions)]
+        for worker in workers:
+            worker.start()
+        reports = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+    merged = {"timings": defaultdict(list), "depths": [], "errors": [],
+              "calls": defaultdict(lambda: [0.0, 0]), "storage": Counter(),
+              "superseded": 0, "rebases": 0, "refused": 0,
+              "wall": max(report["wall"] for report in reports)}
+    for report in reports:
+        for action, values in report["timings"].items():
+            merged["timings"][action].extend(values)
+        for op, (total, count) in report["calls"].items():
+            merged["calls"][op][0] += total
+            merged["calls"][op][1] += count
+        merged["storage"].update({key: value for key, value
+                                  in report["storage"].items()
+                                  if isinstance(value, int)})
+        merged["depths"].extend(report["depths"])
+        merged["errors"].extend(report["errors"])
+        for key in ("superseded", "rebases", "refused"):
+            merged[key] += report[key]
+    return merged
+
+
+def report(baseline: dict, results: dict, sessions: int,
+           items: int) -> None:
+    """
+    Print the results of the concurrent run next to the baseline.
+
+    Arguments:
+        baseline -- The return value of run() with one session.
+        results -- The return value of run() with all sessions.
+        sessions -- Number of sessions.
+        items -- Catalog size in items.
+
+    Returns:
+        None
+    """
+    timings = results["timings"]
+    every = [timing for action in timings.values() for timing in action]
+    alone = [timing for action in baseline["timings"].values()
+             for timing in action]
+    print(f"{sessions} concurrent sessions, {items} catalog items, "
+          f"{len(every)} reruns in {results['wall']:.1f} s "
+          f"({len(every) / results['wall']:.1f} reruns/s, one session "
+          f"alone {len(alone) / baseline['wall']:.1f} reruns/s)")
+    print(f"{'action':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'alone p50':>10} {'slowdown':>9}")
+    for action, values in sorted(timings.items()) + [("all", every)]:
+        cuts = percentiles(values)
+        base = percentiles(alone if action == "all"
+                           else baseline["timings"].get(action, []))
+        slowdown = f"{cuts['p50'] / base['p50']:.2f}x" if base["p50"] \
+            else "-"
+        print(f"{action:<16} {len(values):>6} {cuts['p50']:>9.1f} "
+              f"{cuts['p95']:>9.1f} {cuts['p99']:>9.1f} "
+              f"{base['p50']:>10.1f} {slowdown:>9}")
+    print("storage calls:")
+    print(f"  {'operation':<20} {'count':>6} {'mean ms':>9} "
+          f"{'alone ms':>9}")
+    for op, (total, count) in sorted(results["calls"].items()):
+        base_total, base_count = baseline["calls"].get(op, (0.0, 0))
+        alone_mean = f"{base_total / base_count * 1000:.2f}" \
+            if base_count else "-"
+        print(f"  {op:<20} {count:>6} {total / count * 1000:>9.2f} "
+              f"{alone_mean:>9}")
+    storage = results["storage"]
+    print(f"contention: {results['rebases']} op-log writes rebased, "
+          f"{results['refused']} refused on a compacted base, "
+          f"{storage['retries']} storage retries, {storage['timeouts']} "
+          f"timeouts, {storage['failures']} failed attempts")
+    depths = results["depths"] or [0]
+    print(f"write queues: max {max(depths)}, mean "
+          f"{statistics.fmean(depths):.2f} pending documents, "
+          f"{results['superseded']} snapshots coalesced")
+    if results["errors"]:
+        print(f"{len(results['errors'])} app exceptions, first: "
+              f"{results['errors'][0]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=20,
+                        help="number of sessions")
+    parser.add_argument("--items", type=int, default=1000,
+                        help="catalog size in items")
+    parser.add_argument("--actions", type=int, default=30,
+                        help="actions per session")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="seconds between the actions of a session")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed of the action mix")
+    args = parser.parse_args()
+    baseline = run(1, args.items, args.actions, args.think, args.seed)
+    results = run(args.sessions, args.items, args.actions, args.think,
+                  args.seed)
+    report(baseline, results, args.sessions, args.items)
+
+
+if __name__ == "__main__":
+    main()
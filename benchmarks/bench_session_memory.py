@@ -0,0 +1,99 @@
+"""
+Measure the memory each session adds for the catalog and the list.
+
+Compares the former layout, where every session held its own copy of
+the catalog and the list, with the shared layout, where sessions hold
+references to the process-wide frozen snapshots plus their selection.
+
+Usage:
+    python -m benchmarks.bench_session_memory --sessions 1000 \\
+        --items 10000 [--list-size 30] [--selected 5]
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+from typing import Callable
+
+from benchmarks.fakes import FakeSessionState, synthetic_catalog
+from catalog import Catalog
+
+
+def _measure(sessions: int, make: Callable[[], FakeSessionState]) -> int:
+    """
+    Return the bytes allocated by creating a number of session states.
+
+    Arguments:
+        sessions -- Number of sessions to create.
+        make -- Creates the state of one session.
+
+    Returns:
+        int -- Bytes still allocated once all sessions exist.
+    """
+    gc.collect()
+    tracemalloc.start()
+    states = [make() for _ in range(sessions)]
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del states
+    return allocated
+
+
+def run(sessions: int, items: int, list_size: int,
+        selected: int) -> dict[str, int]:
+    """
+    Measure both session layouts.
+
+    Arguments:
+        sessions -- Number of concurrent sessions.
+        items -- Catalog size in items.
+        list_size -- Items on the grocery list.
+        selected -- Checked catalog items per session.
+
+    Returns:
+        dict[str, int] -- Total bytes per layout.
+    """
+    catalog = synthetic_catalog(items)
+    names = [item for cat_items in catalog.values() for item in cat_items]
+    rng = random.Random(0)
+    shared = Catalog(catalog).freeze()
+    shared_list = tuple(rng.sample(names, list_size))
+
+    def copied() -> FakeSessionState:
+        state = FakeSessionState()
+        state["groceries"] = shared.copy()
+        state["grocery_list"] = list(shared_list)
+        state["added_groceries"] = rng.sample(names, selected)
+        return state
+
+    def overlay() -> FakeSessionState:
+        state = FakeSessionState()
+        state["groceries"] = shared
+        state["grocery_list"] = shared_list
+        state["added_groceries"] = rng.sample(names, selected)
+        return state
+
+    return {"per-session copy": _measure(sessions, copied),
+            "shared snapshot": _measure(sessions, overlay)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=1000,
+                        help="number of concurrent sessions")
+    parser.add_argument("--items", type=int, default=10000,
+                        help="catalog size in items")
+    parser.add_argument("--list-size", type=int, default=30,
+                        help="items on the grocery list")
+    parser.add_argument("--selected", type=int, default=5,
+                        help="checked catalog items per session")
+    args = parser.parse_args()
+    results = run(args.sessions, args.items, args.list_size, args.selected)
+    print(f"{args.sessions} sessions, {args.items} catalog items")
+    for layout, total in results.items():
+        print(f"{layout:<18} {total / 2 ** 20:>10.1f} MiB total "
+              f"{total / args.sessions / 1024:>10.1f} KiB per session")
+
+
+if __name__ == "__main__":
+    main()
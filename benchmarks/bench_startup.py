@@ -0,0 +1,159 @@
+"""
+Measure the cold-start cost of the app.
+
+Reports the cumulative import time of the app modules, as measured by
+``python -X importtime``, and the wall time of the first and second
+render of main.py with Streamlit's AppTest. Runs offline against an
+in-memory SQLite backend. With --baseline, the same is measured on an
+earlier revision checked out in a temporary git worktree, and both are
+reported side by side.
+
+Usage:
+    python -m benchmarks.bench_startup [--baseline a6c15b3^] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("functions", "database", "logger_config", "storage", "streamlit")
+ENV = {**os.environ,
+       "GROCERY_STORAGE_BACKEND": "sqlite",
+       "GROCERY_SQLITE_PATH": ":memory:"}
+
+
+def import_times(module: str = "functions",
+                 root: str = ROOT) -> dict[str, int]:
+    """
+    Import a module in a fresh interpreter and collect -X importtime output.
+
+    Keyword Arguments:
+        module -- The module to import, default: "functions"
+        root -- Checkout to import from, default: this one
+
+    Returns:
+        dict[str, int] -- Cumulative import time in microseconds for each
+            module in MODULES that was imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root, env=ENV, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name in MODULES and name not in times:
+            times[name] = int(cumulative)
+    return times
+
+
+def render_times(root: str = ROOT) -> tuple[float, float]:
+    """
+    Time the first and second run of main.py in a fresh interpreter.
+
+    Keyword Arguments:
+        root -- Checkout to run main.py from, default: this one
+
+    Returns:
+        tuple[float, float] -- First and second render time in seconds.
+    """
+    script = (
+        "import time\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "start = time.perf_counter()\n"
+        f"app = AppTest.from_file({os.path.join(root, 'main.py')!r},"
+        " default_timeout=60).run()\n"
+        "first = time.perf_counter() - start\n"
+        "start = time.perf_counter()\n"
+        "app.run()\n"
+        "print(first, time.perf_counter() - start)\n")
+    result = subprocess.run([sys.executable, "-c", script], cwd=root,
+                            env=ENV, capture_output=True, text=True,
+                            check=True)
+    first, second = result.stdout.split()[-2:]
+    return float(first), float(second)
+
+
+@contextmanager
+def worktree(revision: str) -> Iterator[str]:
+    """
+    Check out a revision of this repository in a temporary git worktree.
+
+    Arguments:
+        revision -- Any git revision, e.g. a commit or tag.
+
+    Returns:
+        Iterator[str] -- Yields the path of the checkout, which is removed
+            afterwards.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "baseline")
+        subprocess.run(["git", "worktree", "add", "--detach", path,
+                        revision], cwd=ROOT, capture_output=True,
+                       check=True)
+        try:
+            yield path
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", path],
+                           cwd=ROOT, capture_output=True)
+
+
+def measure(root: str, runs: int) -> dict[str, float]:
+    """
+    Return the median import and render times of a checkout.
+
+    Arguments:
+        root -- Checkout to measure.
+        runs -- Fresh interpreters to start for each measurement.
+
+    Returns:
+        dict[str, float] -- Milliseconds per module import, and for the
+            first and second render.
+    """
+    samples: dict[str, list[float]] = {}
+    for _ in range(runs):
+        for name, cumulative in import_times(root=root).items():
+            samples.setdefault(name, []).append(cumulative / 1000)
+        first, second = render_times(root)
+        samples.setdefault("first render", []).append(first * 1000)
+        samples.setdefault("second render", []).append(second * 1000)
+    return {name: statistics.median(values)
+            for name, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--baseline", default=None,
+                        help="git revision to compare with")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="fresh interpreters per measurement, the "
+                             "median is reported")
+    args = parser.parse_args()
+    current = measure(ROOT, args.runs)
+    if args.baseline is None:
+        print(f"{'':<24} {'ms':>10}")
+        for name, value in sorted(current.items(), key=lambda i: i[1]):
+            print(f"{name:<24} {value:>10.1f}")
+        return
+    with worktree(args.baseline) as path:
+        baseline = measure(path, args.runs)
+    print(f"{'':<24} {args.baseline[:10]:>10} {'current':>10} "
+          f"{'change':>8}")
+    for name in sorted(current, key=lambda name: current[name]):
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<24} {'-':>10} {current[name]:>10.1f}")
+            continue
+        print(f"{name:<24} {before:>10.1f} {current[name]:>10.1f} "
+              f"{(current[name] - before) / before:>+8.0%}")
+
+
+if __name__ == "__main__":
+    main()
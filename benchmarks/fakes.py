@@ -0,0 +1,186 @@
+"""
+Offline stand-ins shared by the benchmark scripts.
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any
+
+# Keep the app modules offline when they are imported by a benchmark
+os.environ.setdefault("GROCERY_STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("GROCERY_SQLITE_PATH", ":memory:")
+
+from config import CATEGORIES  # noqa: E402
+from oplog import OpLog  # noqa: E402
+from storage import SQLiteBackend, StorageBackend  # noqa: E402
+
+
+class FakeSessionState(dict):
+    """
+    Dictionary with the attribute access of st.session_state.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        self[name] = value
+
+
+class FakeStreamlit:
+    """
+    The subset of the streamlit module used by functions.py, without a
+    running app. Widgets return their value from the session state.
+
+    Attributes:
+        session_state: The fake session state.
+        widgets: Number of widgets created since the last reset.
+    """
+
+    def __init__(self) -> None:
+        self.session_state = FakeSessionState()
+        self.widgets = 0
+
+    def checkbox(self, label: str, key: str | None = None,
+                 **kwargs: Any) -> bool:
+        self.widgets += 1
+        return bool(self.session_state.get(key, False))
+
+    def markdown(self, body: str, **kwargs: Any) -> None:
+        self.widgets += 1
+
+    def error(self, body: str, **kwargs: Any) -> None:
+        pass
+
+    @contextmanager
+    def spinner(self, text: str = ""):
+        yield
+
+    def __getattr__(self, name: str) -> Any:
+        # Widgets this fake does not model render nothing
+        return lambda *args, **kwargs: None
+
+
+def synthetic_catalog(size: int, seed: int = 0) -> dict[str, list[str]]:
+    """
+    Build a catalog of unique item names spread over CATEGORIES.
+
+    Arguments:
+        size -- Total number of items.
+
+    Keyword Arguments:
+        seed -- Random seed for the category distribution, default: 0
+
+    Returns:
+        dict[str, list[str]] -- Sorted items per category.
+
+    Example:
+        >>> synthetic_catalog(3)
+        {'Fresh Produce': ['Item 00000002 Fresh'], ...}
+    """
+    rng = random.Random(seed)
+    catalog: dict[str, list[str]] = {cat: [] for cat in CATEGORIES}
+    for i in range(size):
+        category = rng.choice(CATEGORIES)
+        catalog[category].append(
+            f"item {i:08d} {category.split()[0].lower()}'s")
+    return {cat: sorted(items) for cat, items in catalog.items()}
+
+
+def fake_backend(catalog: dict[str, list[str]],
+                 grocery_list: list[str] | None = None) -> SQLiteBackend:
+    """
+    Create an in-memory SQLite backend holding a catalog and a list.
+
+    Arguments:
+        catalog -- The groceries dictionary to store.
+
+    Keyword Arguments:
+        grocery_list -- The grocery list to store, default: None (empty)
+
+    Returns:
+        SQLiteBackend -- The seeded backend.
+    """
+    backend = SQLiteBackend(":memory:")
+    backend.write_document("groceries", catalog, 0)
+    backend.write_document("list", grocery_list or [], 0)
+    return backend
+
+
+def fake_oplogs(backend: SQLiteBackend) -> dict[str, OpLog]:
+    """
+    Create op-logs for both documents on a backend.
+
+    Arguments:
+        backend -- The storage backend.
+
+    Returns:
+        dict[str, OpLog] -- The op-logs keyed by document name.
+    """
+    return {"list": OpLog(backend, "list"),
+            "groceries": OpLog(backend, "groceries")}
+
+
+class LatencyBackend(StorageBackend):
+    """
+    Storage backend that delays every call by a round-trip time.
+
+    Attributes:
+        inner: The backend that serves the calls.
+        latency: Seconds added to every call.
+        doc_latency: Seconds added instead to the calls on a document.
+        calls: Number of calls made.
+    """
+
+    def __init__(self, inner: StorageBackend, latency: float,
+                 doc_latency: dict[str, float] | None = None) -> None:
+        self.inner = inner
+        self.latency = latency
+        self.doc_latency = doc_latency or {}
+        self.calls = 0
+
+    def _call(self, name: str, *args: Any, doc: str | None = None) -> Any:
+        self.calls += 1
+        time.sleep(self.doc_latency.get(doc, self.latency))
+        return getattr(self.inner, name)(*args)
+
+    def read_document(self, doc):
+        return self._call("read_document", doc, doc=doc)
+
+    def read_ops(self, doc, after):
+        return self._call("read_ops", doc, after, doc=doc)
+
+    def latest_seq(self, doc):
+        return self._call("latest_seq", doc, doc=doc)
+
+    def nth_latest_seq(self, doc, n):
+        return self._call("nth_latest_seq", doc, n, doc=doc)
+
+    def has_ops_between(self, doc, after, before):
+        return self._call("has_ops_between", doc, after, before, doc=doc)
+
+    def append_ops(self, doc, ops):
+        return self._call("append_ops", doc, ops, doc=doc)
+
+    def write_document(self, doc, document, seq):
+        return self._call("write_document", doc, document, seq, doc=doc)
+
+    def swap_document(self, doc, document, seq, expected):
+        return self._call("swap_document", doc, document, seq, expected,
+                          doc=doc)
+
+    def delete_ops(self, doc, before):
+        return self._call("delete_ops", doc, before, doc=doc)
+
+    def append_history(self, entries):
+        return self._call("append_history", entries)
+
+    def read_history(self, after=0):
+        return self._call("read_history", after)
+
+    def insert_logs(self, entries):
+        return self._call("insert_logs", entries)
@@ -0,0 +1,187 @@
+"""
+Stress the optimistic writes of the op-log with many concurrent writers.
+
+Every writer thread stands in for one process: it has its own OpLog on
+one shared backend, a MemoryClient standing in for the Supabase tables
+behind a simulated round trip, so the run is offline. A writer edits its
+own view of the grocery list, adding and removing items named after
+itself, and writes it with the version the view was loaded at. Views are
+only reloaded now and then, so most writes are based on a stale version
+and have to be rebased onto the other writers' changes, and the small
+compaction threshold makes snapshot swaps collide. A write whose base
+was compacted away is refused, and the writer reloads its view and
+applies its own adds and removes to it again.
+
+At the end the stored list must hold every item a writer last added and
+none it removed, and all untouched seed items. With --blind the writes
+carry no base version, to show the updates lost without rebasing.
+
+Usage:
+    python -m benchmarks.stress_cas --writers 16 --writes 200 \\
+        [--compact 50] [--reload 0.2] [--latency 0.001] [--blind]
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.fakes import LatencyBackend
+from memory_client import MemoryClient
+from oplog import OpLog, RebaseConflict
+from storage import SupabaseBackend
+
+# Items on the list before the run that no writer touches
+SEED_ITEMS = [f"seed {i:03d}" for i in range(20)]
+
+
+class Writer(threading.Thread):
+    """
+    One simulated process editing the list through its own op-log.
+
+    Attributes:
+        name: Prefix of the items this writer adds.
+        log: The writer's op-log.
+        expected: Items of this writer that must be on the stored list.
+        removed: Items of this writer that must not be on it.
+        errors: Exceptions raised by the writes, as strings.
+    """
+
+    def __init__(self, name: str, backend: SupabaseBackend, writes: int,
+                 compact: int, reload: float, blind: bool,
+                 start: threading.Barrier) -> None:
+        super().__init__(name=name, daemon=True)
+        self.log = OpLog(backend, "list", compact_threshold=compact)
+        self.writes = writes
+        self.reload = reload
+        self.blind = blind
+        self.barrier = start
+        self.rng = random.Random(name)
+        self.expected: set[str] = set()
+        self.removed: set[str] = set()
+        self.errors: list[str] = []
+
+    def run(self) -> None:
+        view, base = self.log.load()
+        self.barrier.wait()
+        for n in range(self.writes):
+            if self.expected and self.rng.random() < 0.3:
+                item = self.rng.choice(sorted(self.expected))
+                self.expected.discard(item)
+                self.removed.add(item)
+                view = [name for name in view if name != item]
+            else:
+                item = f"{self.name} {n:05d}"
+                self.expected.add(item)
+                view = view + [item]
+            try:
+                self.log.write(view, None if self.blind else base)
+            except RebaseConflict:
+                view, base = self.log.load()
+                view = [name for name in view if name not in self.removed]
+                view += sorted(self.expected - set(view))
+                self.log.write(view, base)
+            except Exception as e:
+                self.errors.append(f"{type(e).__name__}: {e}")
+            if self.rng.random() < self.reload:
+                view, base = self.log.load()
+
+
+def run(writers: int, writes: int, compact: int, reload: float,
+        latency: float, blind: bool) -> dict:
+    """
+    Run the writers to completion and check the stored list.
+
+    Arguments:
+        writers -- Number of concurrent writers.
+        writes -- Writes per writer.
+        compact -- Operations between compactions of each op-log.
+        reload -- Probability that a writer reloads its view after a write.
+        latency -- Seconds added to every storage call.
+        blind -- Write without base versions.
+
+    Returns:
+        dict -- Wall time, write count, rebases, snapshot conflicts,
+            writes refused for a compacted base, lost and resurrected
+            items, and errors.
+    """
+    client = MemoryClient({"grocery_ops": "seq"})
+    backend = SupabaseBackend(client)
+    backend.write_document("list", [], 0)
+    backend.append_ops("list", [{"op": "add", "category": None, "item": item}
+                                for item in SEED_ITEMS])
+    shared = LatencyBackend(backend, latency)
+    barrier = threading.Barrier(writers)
+    threads = [Writer(f"w{i:02d}", shared, writes, compact, reload, blind,
+                      barrier) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    stored, _ = OpLog(backend, "list").load()
+    stored = set(stored)
+    expected = set(SEED_ITEMS).union(*(t.expected for t in threads))
+    return {"wall": wall, "writes": writers * writes,
+            "rebases": sum(t.log.rebases for t in threads),
+            "conflicts": sum(t.log.conflicts for t in threads),
+            "stale": sum(t.log.stale for t in threads),
+            "lost": sorted(expected - stored),
+            "resurrected": sorted(stored - expected),
+            "errors": [e for t in threads for e in t.errors],
+            "ops": len(client.table("grocery_ops").select().execute()
+                       .data)}
+
+
+def report(results: dict, writers: int) -> None:
+    """
+    Print the results of a stress run.
+
+    Arguments:
+        results -- The return value of run().
+        writers -- Number of writers.
+
+    Returns:
+        None
+    """
+    print(f"{writers} writers, {results['writes']} writes in "
+          f"{results['wall']:.2f} s "
+          f"({results['writes'] / results['wall']:.0f} writes/s)")
+    print(f"rebased writes: {results['rebases']}, snapshot swaps lost: "
+          f"{results['conflicts']}, stale bases reloaded: "
+          f"{results['stale']}, operations left after compaction: "
+          f"{results['ops']}")
+    print(f"lost items: {len(results['lost'])}, resurrected items: "
+          f"{len(results['resurrected'])}, errors: "
+          f"{len(results['errors'])}")
+    for item in (results["lost"] + results["resurrected"])[:5]:
+        print(f"  {item}")
+    for error in results["errors"][:5]:
+        print(f"  {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--writers", type=int, default=16,
+                        help="number of concurrent writers")
+    parser.add_argument("--writes", type=int, default=200,
+                        help="writes per writer")
+    parser.add_argument("--compact", type=int, default=50,
+                        help="operations between compactions")
+    parser.add_argument("--reload", type=float, default=0.2,
+                        help="probability of reloading the view after a "
+                             "write")
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="seconds added to every storage call")
+    parser.add_argument("--blind", action="store_true",
+                        help="write without base versions")
+    args = parser.parse_args()
+    results = run(args.writers, args.writes, args.compact, args.reload,
+                  args.latency, args.blind)
+    report(results, args.writers)
+    if results["lost"] or results["resurrected"] or results["errors"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+# checked_at of an entry that must be revalidated on the next get; 0.0
+# would not do, the monotonic clock may start near zero
+_UNCHECKED = float("-inf")
+
+
+@dataclass
+class CacheEntry:
+    """
+    A cached document with the data version it was loaded at.
+
+    Attributes:
+        value: The cached document.
+        version: Data version of the document, None when unknown.
+        checked_at: Monotonic time the version was last confirmed.
+    """
+    value: Any
+    version: int | None
+    checked_at: float
+
+
+class VersionedCache:
+    """
+    Process-wide cache of documents keyed by name and data version.
+
+    An entry younger than the TTL is served without any network access.
+    An older entry is revalidated with a cheap version probe and only
+    reloaded when the version has moved on. If the probe or the reload
+    fails, the older entry is served stale rather than failing the read.
+
+    Methods:
+        get(key, loader, probe) -- Return a cached or freshly loaded value.
+        update(key, change, default) -- Publish a changed value.
+        apply(key, base, version, change) -- Apply another writer's delta.
+        peek(key) -- The cached value, without any storage access.
+        advance(key, old, new) -- Record that our own write moved the version.
+        invalidate(key) -- Drop an entry.
+        stats() -- Hit, revalidation, miss and stale counts.
+
+    Attributes:
+        ttl: Seconds an entry is served before it is revalidated.
+    """
+
+    def __init__(self, ttl: float = 5.0) -> None:
+        """
+        Initialize an empty cache.
+
+        Keyword Arguments:
+            ttl (float) -- Seconds between version probes, default: 5.0
+
+        Returns:
+            None
+
+        Example:
+            >>> cache = VersionedCache(ttl=5.0)
+        """
+        self.ttl = ttl
+        self._entries: dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._hits = 0
+        self._revalidations = 0
+        self._misses = 0
+        self._stale = 0
+        self._deltas = 0
+
+    def _load_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str,
+            loader: Callable[[], tuple[Any, int | None]],
+            probe: Callable[[], int]) -> Any:
+        """
+        Return the cached value for key, loading it when missing or stale.
+
+        A load replaces the value, including changes published with
+        update() that are not written yet, so the loader must apply
+        those to what it reads.
+
+        Arguments:
+            key (str) -- Name of the document.
+            loader (Callable) -- Returns the document and its version.
+            probe (Callable) -- Returns the current version of the document.
+
+        Returns:
+            Any -- The cached document. Callers must not mutate it.
+
+        Raises:
+            Exception -- The probe or loader error, if nothing is cached.
+        """
+        # Only one thread loads a given key, the others wait for its result
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and time.monotonic() - entry.checked_at < self.ttl:
+                    self._hits += 1
+                    return entry.value
+            try:
+                if entry is not None and entry.version is not None \
+                        and probe() == entry.version:
+                    with self._lock:
+                        entry.checked_at = time.monotonic()
+                        self._revalidations += 1
+                        return entry.value
+                value, version = loader()
+            except Exception:
+                if entry is None:
+                    raise
+                with self._lock:
+                    self._stale += 1
+                return entry.value
+            with self._lock:
+                self._entries[key] = CacheEntry(value, version,
+                                                time.monotonic())
+                self._misses += 1
+            return value
+
+    def update(self, key: str, change: Callable[[Any], Any],
+               default: Any) -> tuple[Any, int | None]:
+        """
+        Publish a new value derived from the current one after a local change.
+
+        The change runs under the cache lock, so concurrent changes from
+        different sessions are applied one after the other and none is
+        lost. It must return a new value rather than mutate the current
+        one, which other sessions may still be reading. The version is
+        kept, so the entry stays valid until the change is written and
+        advance() records the new version. A load of the key in progress
+        is waited for, so it cannot replace the changed value with one
+        loaded before the change.
+
+        Arguments:
+            key (str) -- Name of the document.
+            change (Callable) -- Returns the new value from the current one.
+            default (Any) -- Current value to use when key is not cached.
+
+        Returns:
+            tuple[Any, int | None] -- The published value and the version
+                it was derived from, None when unknown.
+        """
+        with self._load_lock(key), self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = CacheEntry(default, None, _UNCHECKED)
+                self._entries[key] = entry
+            entry.value = change(entry.value)
+            return entry.value, entry.version
+
+    def apply(self, key: str, base: int, version: int,
+              change: Callable[[Any, int], Any]) -> bool:
+        """
+        Apply a delta another writer stored, instead of reloading the entry.
+
+        The delta is applied when the entry's version is at least its base,
+        so no earlier operation is missing. Otherwise the entry is marked
+        stale and the next get reloads it. Like update(), the change must
+        return a new value.
+
+        Arguments:
+            key (str) -- Name of the document.
+            base (int) -- Version the delta applies on.
+            version (int) -- Version after the delta.
+            change (Callable) -- Returns the new value from the current one
+                and its version, applying only the newer operations.
+
+        Returns:
+            bool -- True if the entry is now at the delta's version.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry.version is None or entry.version < base:
+                entry.version = None
+                entry.checked_at = _UNCHECKED
+                return False
+            if entry.version < version:
+                entry.value = change(entry.value, entry.version)
+                entry.version = version
+                self._deltas += 1
+            entry.checked_at = time.monotonic()
+            return True
+
+    def peek(self, key: str) -> Any:
+        """
+        Return the cached value for key without probing or loading it.
+
+        Arguments:
+            key (str) -- Name of the document.
+
+        Returns:
+            Any -- The cached document, None if not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry.value
+
+    def advance(self, key: str, old: int | None, new: int | None) -> None:
+        """
+        Move an entry to the version produced by our own write.
+
+        The entry is only advanced when it was at the version the write
+        was based on, and kept when a delta already moved it past the
+        write. Otherwise it is marked stale so the next get reloads.
+
+        Arguments:
+            key (str) -- Name of the document.
+            old (int | None) -- Version the write was based on.
+            new (int | None) -- Version after the write, None when unknown.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if old is not None and entry.version == old and new is not None:
+                entry.version = new
+            elif new is not None and entry.version is not None \
+                    and entry.version >= new:
+                pass
+            else:
+                entry.version = None
+                entry.checked_at = _UNCHECKED
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drop the cached value for key.
+
+        Arguments:
+            key (str) -- Name of the document.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the hit and miss counts since the cache was created.
+
+        Arguments:
+            None
+
+        Returns:
+            dict[str, int] -- Counts of hits, revalidations, misses, stale
+                values served because storage failed and applied deltas.
+
+        Example:
+            >>> cache.stats()
+            {'hits': 12, 'revalidations': 3, 'misses': 2, 'stale': 0,
+             'deltas': 4}
+        """
+        with self._lock:
+            return {"hits": self._hits,
+                    "revalidations": self._revalidations,
+                    "misses": self._misses,
+                    "stale": self._stale,
+                    "deltas": self._deltas}
@@ -0,0 +1,426 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections.abc import Iterable, Iterator, Mapping
+from functools import lru_cache
+from config import CATEGORIES, NAME_CACHE_SIZE
+from search import SearchIndex
+
+# Contractions that str.title() capitalizes after the apostrophe
+_CONTRACTION = re.compile(r"'(S|T|Ll|Re|Ve|M|D)")
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def canonical_name(text: str) -> str:
+    """
+    Return the canonical stored form of an item name.
+
+    Collapses whitespace and title-cases the words, keeping contractions
+    lowercase. Applied once when a name is written or imported, so reads
+    can use stored names as they are.
+
+    Arguments:
+        text -- The item name as typed or imported.
+
+    Returns:
+        str -- The canonical name.
+
+    Example:
+        >>> canonical_name("  sam's   club")
+        "Sam's Club"
+    """
+    return _CONTRACTION.sub(lambda m: "'" + m.group(1).lower(),
+                            " ".join(text.split()).title())
+
+
+def canonical_groceries(groceries: Mapping[str, list[str]]
+                        ) -> dict[str, list[str]]:
+    """
+    Canonicalize and deduplicate every item of a groceries dictionary.
+
+    Arguments:
+        groceries -- Items per category.
+
+    Returns:
+        dict[str, list[str]] -- Sorted canonical items per category. An
+            item listed in several categories is kept in the last one.
+
+    Example:
+        >>> canonical_groceries({"Beverages": [" tea", "Tea"]})
+        {'Beverages': ['Tea']}
+    """
+    return Catalog({cat: [canonical_name(item) for item in items]
+                    for cat, items in groceries.items()},
+                   categories=()).to_dict()
+
+
+def normalize(item: str) -> str:
+    """
+    Normalize an item name for membership tests.
+
+    Arguments:
+        item -- The item name.
+
+    Returns:
+        str -- The stripped, case-folded name.
+
+    Example:
+        >>> normalize(" Lactose Free Milk")
+        'lactose free milk'
+    """
+    return item.strip().casefold()
+
+
+class ItemIds:
+    """
+    Process-wide registry of compact integer item IDs.
+
+    Names are numbered from 0 in the order they are first seen, by their
+    normalized form. IDs are never reused or reassigned, so they stay
+    valid across catalog snapshots and reloads for the life of the
+    process and can be used in widget keys and selections.
+
+    Methods:
+        id_of(item) -- ID of an item name, assigning one if needed.
+        key_of(item_id) -- Normalized name of an ID.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty registry.
+
+        Returns:
+            None
+        """
+        self._ids: dict[str, int] = {}
+        self._keys: list[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def id_of(self, item: str) -> int:
+        """
+        Return the ID of an item name, assigning the next free one if new.
+
+        Arguments:
+            item -- The item name, in any case or spacing.
+
+        Returns:
+            int -- The item ID.
+
+        Example:
+            >>> item_ids.id_of("Milk") == item_ids.id_of(" milk")
+            True
+        """
+        key = normalize(item)
+        item_id = self._ids.get(key)
+        if item_id is None:
+            with self._lock:
+                item_id = self._ids.setdefault(key, len(self._keys))
+                if item_id == len(self._keys):
+                    self._keys.append(key)
+        return item_id
+
+    def key_of(self, item_id: int) -> str:
+        """
+        Return the normalized name an ID was assigned to.
+
+        Arguments:
+            item_id -- The item ID.
+
+        Returns:
+            str -- The normalized name.
+
+        Raises:
+            IndexError -- If the ID was never assigned.
+        """
+        return self._keys[item_id]
+
+
+# Shared by every catalog of this process
+item_ids = ItemIds()
+
+
+class Catalog(Mapping):
+    """
+    Grocery catalog with an item-to-category index.
+
+    Reads like the dict[str, list[str]] of sorted items per category used
+    elsewhere in the app, while adds, removes and membership tests are
+    O(1) dictionary operations. Each category keeps an insertion-ordered
+    set of items plus a sorted view that is maintained incrementally.
+
+    Methods:
+        add(category, item) -- Add an item, moving it from another category.
+        add_many(category, items) -- Add items, sorting the view once.
+        remove(item) -- Remove an item from whichever category holds it.
+        category_of(item) -- Category holding an item, or None.
+        has_item(item) -- Whether any category holds an item.
+        item_id(item) -- Compact integer ID of an item.
+        item_of(item_id) -- Stored name of an item ID, or None.
+        search(query, limit) -- Typeahead matches as (category, item).
+        freeze() -- Make the catalog read-only so it can be shared.
+        copy() -- Independent, writable copy of the catalog.
+        to_dict() -- Plain dict of sorted item lists.
+    """
+
+    def __init__(self, groceries: Mapping[str, list[str]] | None = None,
+                 categories: tuple[str, ...] = CATEGORIES) -> None:
+        """
+        Initialize the catalog from a groceries dictionary.
+
+        Keyword Arguments:
+            groceries -- Items per category, default: None (empty)
+            categories -- Categories to include, in display order,
+                default: CATEGORIES
+
+        Returns:
+            None
+
+        Example:
+            >>> catalog = Catalog({"Beverages": ["Tea", "Coffee"]})
+            >>> catalog["Beverages"]
+            ['Coffee', 'Tea']
+        """
+        self._items: dict[str, dict[str, None]] = {cat: {}
+                                                   for cat in categories}
+        # Normalized name -> (category, stored name)
+        self._index: dict[str, tuple[str, str]] = {}
+        self._sorted: dict[str, list[str]] = {}
+        # Built on the first search, copies share its unchanged nodes
+        self._search: SearchIndex | None = None
+        self._frozen = False
+        for category, items in (groceries or {}).items():
+            for item in items:
+                self.add(category, item)
+        self._sorted = {cat: sorted(items)
+                        for cat, items in self._items.items()}
+
+    def __getitem__(self, category: str) -> list[str]:
+        # The sorted view is shared, callers must not mutate it
+        if category not in self._sorted:
+            self._sorted[category] = sorted(self._items[category])
+        return self._sorted[category]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def item_count(self) -> int:
+        """
+        Return the number of items over all categories.
+
+        Arguments:
+            None
+
+        Returns:
+            int -- The number of items.
+        """
+        return len(self._index)
+
+    def category_of(self, item: str) -> str | None:
+        """
+        Return the category that holds an item.
+
+        Arguments:
+            item -- The item name, in any case or spacing.
+
+        Returns:
+            str | None -- The category, or None if the item is unknown.
+        """
+        entry = self._index.get(normalize(item))
+        return None if entry is None else entry[0]
+
+    def has_item(self, item: str) -> bool:
+        """
+        Check whether any category holds an item.
+
+        Arguments:
+            item -- The item name, in any case or spacing.
+
+        Returns:
+            bool -- True if the item is in the catalog.
+        """
+        return normalize(item) in self._index
+
+    def item_id(self, item: str) -> int:
+        """
+        Return the compact integer ID of an item.
+
+        Arguments:
+            item -- The item name, in any case or spacing.
+
+        Returns:
+            int -- The item ID, the same in every catalog of this process.
+        """
+        return item_ids.id_of(item)
+
+    def item_of(self, item_id: int) -> str | None:
+        """
+        Return the stored name of an item ID.
+
+        Arguments:
+            item_id -- The item ID.
+
+        Returns:
+            str | None -- The item name, or None if the catalog does not
+                hold the item.
+        """
+        entry = self._index.get(item_ids.key_of(item_id))
+        return None if entry is None else entry[1]
+
+    def add(self, category: str, item: str) -> bool:
+        """
+        Add an item to a category.
+
+        An item that is already in another category is moved.
+
+        Arguments:
+            category -- The category to add to.
+            item -- The item name.
+
+        Returns:
+            bool -- False if the category already held the item.
+
+        Raises:
+            TypeError -- If the catalog is frozen.
+        """
+        self._check_writable()
+        current = self.category_of(item)
+        if current == category:
+            return False
+        if current is not None:
+            self.remove(item)
+        self._items.setdefault(category, {})[item] = None
+        self._index[normalize(item)] = (category, item)
+        if category in self._sorted:
+            insort(self._sorted[category], item)
+        if self._search is not None:
+            self._search.add(item)
+        return True
+
+    def add_many(self, category: str, items: Iterable[str]) -> int:
+        """
+        Add items to a category, like add() for each of them.
+
+        Rather than inserting every item into the sorted view, the new
+        items are merged into it with one sort, so adding k items to a
+        category of n costs O(n + k log k) instead of O(k n).
+
+        Arguments:
+            category -- The category to add to.
+            items -- The item names.
+
+        Returns:
+            int -- Number of items the category did not hold yet.
+
+        Raises:
+            TypeError -- If the catalog is frozen.
+        """
+        self._check_writable()
+        view = self._sorted.pop(category, None)
+        added = [item for item in items if self.add(category, item)]
+        if view is not None:
+            self._sorted[category] = sorted(view + added)
+        return len(added)
+
+    def remove(self, item: str) -> str | None:
+        """
+        Remove an item from the category that holds it.
+
+        Arguments:
+            item -- The item name, in any case or spacing.
+
+        Returns:
+            str | None -- The category it was removed from, or None.
+
+        Raises:
+            TypeError -- If the catalog is frozen.
+        """
+        self._check_writable()
+        entry = self._index.pop(normalize(item), None)
+        if entry is None:
+            return None
+        category, name = entry
+        del self._items[category][name]
+        if category in self._sorted:
+            view = self._sorted[category]
+            del view[bisect_left(view, name)]
+        if self._search is not None:
+            self._search.remove(name)
+        return category
+
+    def _check_writable(self) -> None:
+        if self._frozen:
+            raise TypeError("Catalog is frozen, change a copy() instead")
+
+    def freeze(self) -> "Catalog":
+        """
+        Make the catalog read-only so it can be shared between sessions.
+
+        Arguments:
+            None
+
+        Returns:
+            Catalog -- The catalog itself, for chaining.
+        """
+        self._frozen = True
+        return self
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, str]]:
+        """
+        Find items by typeahead query.
+
+        Arguments:
+            query -- The text typed so far.
+
+        Keyword Arguments:
+            limit -- Maximum number of matches, default: 10
+
+        Returns:
+            list[tuple[str, str]] -- Category and item of each match,
+                best match first.
+
+        Example:
+            >>> catalog.search("lact")
+            [('Dairy & Eggs', 'Lactose Free Milk')]
+        """
+        if self._search is None:
+            self._search = SearchIndex([name for _, name
+                                        in self._index.values()])
+        return [(self.category_of(item), item)
+                for item in self._search.search(query, limit)]
+
+    def copy(self) -> "Catalog":
+        """
+        Return an independent, writable copy of the catalog.
+
+        Arguments:
+            None
+
+        Returns:
+            Catalog -- The copy.
+        """
+        clone = Catalog.__new__(Catalog)
+        clone._items = {cat: dict(items) for cat, items in self._items.items()}
+        clone._index = dict(self._index)
+        clone._sorted = {cat: list(view) for cat, view in self._sorted.items()}
+        clone._search = None if self._search is None \
+            else self._search.copy()
+        clone._frozen = False
+        return clone
+
+    def to_dict(self) -> dict[str, list[str]]:
+        """
+        Return the catalog as a plain dict of sorted item lists.
+
+        Arguments:
+            None
+
+        Returns:
+            dict[str, list[str]] -- Copies of the sorted items per category.
+        """
+        return {cat: list(self[cat]) for cat in self._items}
@@ -0,0 +1,292 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import TextIO
+from catalog import canonical_name, normalize
+from config import (CATEGORIES, CSV_HEADERS, IMPORT_BATCH_SIZE,
+                    IMPORT_COMPACT_OPS, IMPORT_READ_CHARS)
+from database import get_backend
+from logger_config import get_logger
+from oplog import OpLog
+from storage import StorageBackend
+
+logger = get_logger(__name__)
+
+# Catalog categories by their normalized name
+_CATEGORIES = {normalize(category): category for category in CATEGORIES}
+
+
+def read_csv(file: TextIO) -> Iterator[tuple[str, str]]:
+    """
+    Yield the (category, item) rows of a CSV catalog.
+
+    Arguments:
+        file -- Text file opened with newline="".
+
+    Returns:
+        Iterator[tuple[str, str]] -- The rows, blank lines skipped and
+            rows without two columns as empty pairs.
+
+    Raises:
+        ValueError -- If the header is not CSV_HEADERS.
+    """
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header != CSV_HEADERS:
+        raise ValueError(f"CSV header must be {','.join(CSV_HEADERS)}, "
+                         f"got {','.join(header or [])}")
+    for row in reader:
+        if row:
+            yield (row[0], row[1]) if len(row) == 2 else ("", "")
+
+
+class _JsonReader:
+    """
+    Incremental reader of a JSON catalog, one string at a time.
+
+    Only a window of the file is buffered, refilled as the strings are
+    decoded.
+    """
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        chunk = self.file.read(IMPORT_READ_CHARS)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON catalog: expected one of "
+                             f"{chars!r}, got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def string(self) -> str:
+        self.expect('"')
+        self.pos -= 1
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The string may continue after the buffered window
+                if not self._fill():
+                    raise ValueError("Invalid JSON catalog: unterminated "
+                                     "string") from None
+                continue
+            self.pos = end
+            return value
+
+
+def read_json(file: TextIO) -> Iterator[tuple[str, str]]:
+    """
+    Yield the (category, item) rows of a JSON catalog without loading it.
+
+    Arguments:
+        file -- Text file holding {"category": ["item", ...], ...}.
+
+    Returns:
+        Iterator[tuple[str, str]] -- The rows in file order.
+
+    Raises:
+        ValueError -- If the file is not a JSON object of string lists.
+    """
+    reader = _JsonReader(file)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        category = reader.string()
+        reader.expect(":")
+        reader.expect("[")
+        if reader.peek() != "]":
+            while True:
+                yield category, reader.string()
+                if reader.expect(",]") == "]":
+                    break
+        else:
+            reader.expect("]")
+        if reader.expect(",}") == "}":
+            return
+
+
+def import_rows(backend: StorageBackend, rows: Iterable[tuple[str, str]],
+                batch_size: int = IMPORT_BATCH_SIZE) -> dict[str, int]:
+    """
+    Add the new items of a stream of rows to the stored catalog.
+
+    Memory grows with the catalog, not with the file. The normalized
+    name of every catalog item and every new item is held to find
+    duplicates, and each compaction loads the whole catalog, which is
+    stored as one document; that document is what limits the catalog
+    size. The op-log is compacted every IMPORT_COMPACT_OPS new items, so
+    no more operations than that are read back at once.
+
+    Arguments:
+        backend -- The storage backend.
+        rows -- (category, item) pairs.
+
+    Keyword Arguments:
+        batch_size -- Operations per storage insert,
+            default: IMPORT_BATCH_SIZE
+
+    Returns:
+        dict[str, int] -- Counts of rows read, items added, duplicates
+            and rows rejected for a missing item or unknown category.
+
+    Raises:
+        ValueError -- If the rows cannot be read.
+        Exception -- If a write fails. Batches already written stay.
+    """
+    catalog, _ = OpLog(backend, "groceries").load()
+    seen = {normalize(item) for items in catalog.values() for item in items}
+    del catalog
+    counts = Counter(rows=0, added=0, duplicates=0, rejected=0)
+    unknown: Counter[str] = Counter()
+    batch = []
+    uncompacted = 0
+
+    def store() -> None:
+        nonlocal uncompacted
+        backend.append_ops("groceries", batch)
+        counts["added"] += len(batch)
+        uncompacted += len(batch)
+        batch.clear()
+        if uncompacted >= IMPORT_COMPACT_OPS:
+            # A new op-log each time, so no catalog is held in between
+            OpLog(backend, "groceries").compact()
+            uncompacted = 0
+
+    for category, item in rows:
+        counts["rows"] += 1
+        known = _CATEGORIES.get(normalize(category))
+        name = canonical_name(item)
+        if known is None or not name:
+            counts["rejected"] += 1
+            if name:
+                unknown[category] += 1
+            continue
+        key = normalize(name)
+        if key in seen:
+            counts["duplicates"] += 1
+            continue
+        seen.add(key)
+        batch.append({"op": "add", "category": known, "item": name})
+        if len(batch) >= batch_size:
+            store()
+    if batch:
+        store()
+    if unknown:
+        logger.warning("Skipped rows of unknown categories: %s",
+                       dict(unknown.most_common(10)))
+    if uncompacted:
+        OpLog(backend, "groceries").compact()
+    return dict(counts)
+
+
+def export_rows(backend: StorageBackend, file: TextIO, fmt: str) -> int:
+    """
+    Write the stored catalog as CSV or JSON, a row at a time.
+
+    Categories are written in CATEGORIES order, followed by any others.
+
+    Arguments:
+        backend -- The storage backend.
+        file -- Text file to write, opened with newline="" for CSV.
+        fmt -- "csv" or "json".
+
+    Returns:
+        int -- Number of items written.
+    """
+    catalog, _ = OpLog(backend, "groceries").load()
+    order = [cat for cat in CATEGORIES if cat in catalog] + \
+        [cat for cat in catalog if cat not in CATEGORIES]
+    written = 0
+    if fmt == "csv":
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADERS)
+        for category in order:
+            writer.writerows((category, item) for item in catalog[category])
+            written += len(catalog[category])
+        return written
+    # The layout of default_groceries.json, one category per line
+    file.write("{")
+    for i, category in enumerate(order):
+        file.write(f"{',' if i else ''}\n{json.dumps(category)}:[")
+        for j, item in enumerate(catalog[category]):
+            file.write(("," if j else "")
+                       + json.dumps(item, ensure_ascii=False))
+        file.write("]")
+        written += len(catalog[category])
+    file.write("\n}\n")
+    return written
+
+
+def _format(path: str, given: str | None) -> str:
+    if given:
+        return given
+    if path.lower().endswith(".json"):
+        return "json"
+    if path.lower().endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path}, use --format")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Import or export the catalog as CSV or JSON. CSV "
+        "files have a category,grocery_items header and one item per row, "
+        "JSON files one list of items per category, like "
+        "default_groceries.json. Imported names are stored in canonical "
+        "form, and items already in the catalog or of unknown categories "
+        "are skipped.")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("path", help="file to read or write, - for "
+                        "stdin or stdout")
+    parser.add_argument("--format", choices=("csv", "json"),
+                        help="file format, default: from the extension")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE,
+                        help="operations per storage insert")
+    args = parser.parse_args()
+    fmt = _format(args.path, args.format)
+    started = time.perf_counter()
+    if args.action == "import":
+        file = sys.stdin if args.path == "-" else \
+            open(args.path, encoding="utf-8", newline="")
+        with file:
+            counts = import_rows(get_backend(), read_csv(file)
+                                 if fmt == "csv" else read_json(file),
+                                 args.batch_size)
+        rows = counts["rows"]
+        print(", ".join(f"{count} {name}" for name, count in counts.items()),
+              file=sys.stderr)
+    else:
+        file = sys.stdout if args.path == "-" else \
+            open(args.path, "w", encoding="utf-8", newline="")
+        with file:
+            rows = export_rows(get_backend(), file, fmt)
+    elapsed = time.perf_counter() - started
+    print(f"{rows} rows in {elapsed:.2f} s "
+          f"({rows / max(elapsed, 1e-9):.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
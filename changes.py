@@ -0,0 +1,439 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable
+from config import (CHANGE_GAP_SECONDS, CHANGE_POLL_SECONDS,
+                    CHANGE_RESYNC_SECONDS)
+from logger_config import get_logger
+from storage import StorageBackend
+
+logger = get_logger(__name__)
+
+# Documents whose operations are propagated
+DOCS = ("list", "groceries")
+# Table the operations of all documents are appended to
+OPS_TABLE = "grocery_ops"
+
+
+@dataclass(frozen=True)
+class Delta:
+    """
+    Operations another writer stored on one document.
+
+    Attributes:
+        doc: Document name, "list" or "groceries".
+        base: Version the operations apply on.
+        version: Version of the document after the operations.
+        ops: The operations with their "seq", oldest first.
+    """
+    doc: str
+    base: int
+    version: int
+    ops: list[dict[str, Any]]
+
+
+class ChangeFeed:
+    """
+    In-process hub pushing versioned deltas to subscribers.
+
+    The feed keeps one version per document, the sequence number of the
+    newest operation it has delivered. Every delta starts where the
+    previous one ended, so a subscriber holding a document at a version
+    of at least the delta's base can apply it without a reload.
+    Operations at or below the feed's version are dropped, so sources may
+    deliver the same operation more than once.
+
+    Methods:
+        sync(doc, version) -- Set the starting version of a document.
+        publish(doc, ops) -- Deliver new operations to the subscribers.
+        subscribe(callback) -- Register a subscriber.
+        version(doc) -- Newest delivered version of a document.
+
+    Attributes:
+        published: Number of deltas delivered.
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[str, int] = {}
+        self._subscribers: list[Callable[[Delta], None]] = []
+        # Held while delivering, so subscribers see deltas in order
+        self._lock = threading.RLock()
+        self.published = 0
+
+    def sync(self, doc: str, version: int) -> None:
+        """
+        Set the version a document's deltas start from, if not yet known.
+
+        Arguments:
+            doc (str) -- Document name.
+            version (int) -- Current version in storage.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._versions.setdefault(doc, version)
+
+    def version(self, doc: str) -> int | None:
+        """
+        Return the newest version delivered for a document.
+
+        Arguments:
+            doc (str) -- Document name.
+
+        Returns:
+            int | None -- The version, None before sync().
+        """
+        with self._lock:
+            return self._versions.get(doc)
+
+    def publish(self, doc: str, ops: list[dict[str, Any]]) -> Delta | None:
+        """
+        Deliver the operations newer than the document's version.
+
+        Arguments:
+            doc (str) -- Document name.
+            ops (list[dict[str, Any]]) -- Operations read from the op-log,
+                in sequence order.
+
+        Returns:
+            Delta | None -- The delivered delta, None if nothing was new
+                or the document was never synced.
+        """
+        with self._lock:
+            base = self._versions.get(doc)
+            if base is None:
+                return None
+            fresh = [op for op in ops if op["seq"] > base]
+            if not fresh:
+                return None
+            delta = Delta(doc, base, fresh[-1]["seq"], fresh)
+            self._versions[doc] = delta.version
+            self.published += 1
+            for callback in list(self._subscribers):
+                try:
+                    callback(delta)
+                except Exception as e:
+                    logger.error("Error in change subscriber: %s", e)
+            return delta
+
+    def subscribe(self, callback: Callable[[Delta], None]
+                  ) -> Callable[[], None]:
+        """
+        Register a function called with every delta.
+
+        Callbacks run on the thread that publishes and must be quick.
+
+        Arguments:
+            callback (Callable[[Delta], None]) -- Receives the deltas.
+
+        Returns:
+            Callable[[], None] -- Removes the subscription.
+
+        Example:
+            >>> unsubscribe = feed.subscribe(lambda delta: print(delta.doc))
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+
+class LocalBus:
+    """
+    In-process pub/sub stand-in for Supabase realtime, for tests and
+    benchmarks. A MemoryClient created with a bus publishes every row it
+    inserts, like the realtime INSERT events of a table.
+
+    Methods:
+        subscribe(table, callback) -- Receive the rows inserted in a table.
+        publish(table, row) -- Deliver an inserted row.
+        start() -- No-op, the bus is always connected.
+        close() -- Drop all subscriptions.
+
+    Attributes:
+        connected: Always True.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: dict[str, list[Callable]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.connected = True
+
+    def subscribe(self, table: str,
+                  callback: Callable[[dict[str, Any]], None]) -> None:
+        with self._lock:
+            self._subscribers[table].append(callback)
+
+    def publish(self, table: str, row: dict[str, Any]) -> None:
+        with self._lock:
+            callbacks = list(self._subscribers.get(table, ()))
+        for callback in callbacks:
+            callback(row)
+
+    def start(self) -> "LocalBus":
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            self._subscribers.clear()
+
+
+class SupabaseRealtime:
+    """
+    INSERT events of Supabase tables, received over the realtime
+    websocket on a background thread with its own event loop.
+
+    The realtime client reconnects by itself; while it is disconnected,
+    connected is False so the poller falls back to frequent polling.
+    The table must be in the supabase_realtime publication.
+
+    Methods:
+        subscribe(table, callback) -- Receive the rows inserted in a table.
+        start() -- Connect from a daemon thread.
+        close() -- Disconnect.
+
+    Attributes:
+        connected: True while the subscriptions are active.
+    """
+
+    def __init__(self, url: str, key: str) -> None:
+        """
+        Prepare a realtime connection to a Supabase project.
+
+        Arguments:
+            url (str) -- The project URL, as SUPABASE_URL.
+            key (str) -- The API key, as SUPABASE_KEY.
+
+        Returns:
+            None
+
+        Example:
+            >>> source = SupabaseRealtime(url, key)
+        """
+        scheme, rest = url.rstrip("/").split("://", 1)
+        self.url = f"{'wss' if scheme == 'https' else 'ws'}://{rest}" \
+            "/realtime/v1"
+        self.key = key
+        self.connected = False
+        self._subscribers: dict[str, list[Callable]] = defaultdict(list)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop: asyncio.Event | None = None
+
+    def subscribe(self, table: str,
+                  callback: Callable[[dict[str, Any]], None]) -> None:
+        self._subscribers[table].append(callback)
+
+    def start(self) -> "SupabaseRealtime":
+        threading.Thread(target=self._run, name="realtime",
+                         daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._listen())
+        except Exception as e:
+            logger.error("Realtime connection failed, polling instead: %s",
+                         e)
+        self.connected = False
+
+    async def _listen(self) -> None:
+        # Imported here, realtime comes with the optional supabase package
+        from realtime import AsyncRealtimeClient
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        client = AsyncRealtimeClient(self.url, self.key)
+        await client.connect()
+        for table in self._subscribers:
+            channel = client.channel(f"changes-{table}")
+            channel.on_postgres_changes("INSERT", table=table,
+                                        schema="public",
+                                        callback=partial(self._deliver,
+                                                         table))
+            await channel.subscribe(self._on_state)
+        await self._stop.wait()
+        await client.close()
+
+    def _deliver(self, table: str, payload: dict[str, Any]) -> None:
+        row = payload["data"].get("record") or {}
+        for callback in self._subscribers[table]:
+            callback(row)
+
+    def _on_state(self, state: Any, error: Exception | None) -> None:
+        self.connected = str(getattr(state, "value", state)) == "SUBSCRIBED"
+        if error is not None:
+            logger.warning("Realtime subscription %s: %s", state, error)
+
+
+class Poller:
+    """
+    Reads the operations stored after the feed's versions and publishes
+    them, on a daemon thread.
+
+    A realtime source only wakes the poller: its events say which
+    document changed, and the operations are then read from the op-log
+    after the last position read, so events missed while disconnected are
+    not skipped. Without a connected source the poller polls every
+    poll_interval seconds, with one every resync_interval seconds in case
+    an event is lost.
+
+    Sequence numbers are taken when an insert starts, not when it
+    commits, so with Supabase an operation can become visible after a
+    newer one. The documents share one sequence, and the poller only
+    publishes up to the first number none of them holds, polling again
+    until it shows up. A number still missing after gap_window seconds is
+    taken to belong to an insert that failed or was ignored as a
+    duplicate and is passed over; an operation committing even later than
+    that is not published, and cached documents only include it once
+    they are next loaded from storage.
+
+    Methods:
+        start() -- Sync the feed to storage and start polling.
+        notify(row) -- Wake the poller for an inserted operation.
+        poll() -- Publish the new operations of every document.
+        stop() -- Stop the thread.
+
+    Attributes:
+        polls: Number of op-log reads.
+        failed: Number of failed polls.
+        skipped: Number of missing sequence numbers passed over.
+    """
+
+    def __init__(self, backend: StorageBackend, feed: ChangeFeed,
+                 source: Any = None,
+                 poll_interval: float = CHANGE_POLL_SECONDS,
+                 resync_interval: float = CHANGE_RESYNC_SECONDS,
+                 gap_window: float = CHANGE_GAP_SECONDS) -> None:
+        """
+        Initialize the poller.
+
+        Arguments:
+            backend (StorageBackend) -- Storage holding the op-log.
+            feed (ChangeFeed) -- Feed to publish to.
+
+        Keyword Arguments:
+            source (Any) -- Realtime source with a connected attribute,
+                default: None (poll only)
+            poll_interval (float) -- Seconds between polls without a
+                connected source, default: CHANGE_POLL_SECONDS
+            resync_interval (float) -- Seconds between polls with one,
+                default: CHANGE_RESYNC_SECONDS
+            gap_window (float) -- Seconds a missing sequence number is
+                waited for, default: CHANGE_GAP_SECONDS
+
+        Returns:
+            None
+
+        Example:
+            >>> Poller(get_backend(), feed).start()
+        """
+        self.backend = backend
+        self.feed = feed
+        self.source = source
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.gap_window = gap_window
+        self.polls = 0
+        self.failed = 0
+        self.skipped = 0
+        # Every sequence number up to the position is published or passed
+        # over, gaps maps the number before a missing one to when it was
+        # first seen missing
+        self._position: int | None = None
+        self._gaps: dict[int, float] = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self) -> "Poller":
+        self._sync()
+        threading.Thread(target=self._run, name="change-poller",
+                         daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def notify(self, row: dict[str, Any]) -> None:
+        version = self.feed.version(row.get("doc"))
+        if version is None or row.get("seq", 0) > version:
+            self._wake.set()
+
+    def _sync(self) -> None:
+        versions = {doc: self.backend.latest_seq(doc) for doc in DOCS}
+        for doc, version in versions.items():
+            self.feed.sync(doc, version)
+        self._position = max(versions.values())
+
+    def poll(self) -> None:
+        """
+        Read and publish the operations after the last position read.
+
+        Operations are published up to the first missing sequence number
+        younger than the gap window.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            Exception -- If storage cannot be read.
+        """
+        if self._position is None:
+            self._sync()
+            return
+        self.polls += 1
+        ops = sorted((op for doc in DOCS
+                      for op in self.backend.read_ops(doc, self._position)),
+                     key=lambda op: op["seq"])
+        now = time.monotonic()
+        position, ready = self._position, []
+        for op in ops:
+            if op["seq"] > position + 1:
+                seen = self._gaps.setdefault(position, now)
+                if now - seen < self.gap_window:
+                    break
+                self.skipped += op["seq"] - position - 1
+                logger.warning("Passing over missing op-log sequence "
+                               "numbers %d to %d", position + 1,
+                               op["seq"] - 1)
+            ready.append(op)
+            position = op["seq"]
+        self._position = position
+        self._gaps = {seq: seen for seq, seen in self._gaps.items()
+                      if seq >= position}
+        for doc in DOCS:
+            fresh = [op for op in ready if op["doc"] == doc]
+            if fresh:
+                self.feed.publish(doc, fresh)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            connected = getattr(self.source, "connected", False)
+            timeout = self.resync_interval if connected \
+                else self.poll_interval
+            if self._gaps:
+                timeout = min(timeout, self.gap_window)
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.poll()
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Error polling for changes: %s", e)
@@ -12,3 +12,101 @@ CSV_HEADERS = ["category", "grocery_items"]
 
 SUPABASE_DEFAULT_TABLE = "default_groceries"
 SUPABASE_GROCERY_TABLE = "grocery_list"
+
+# Write-behind: seconds of quiet before a write, and maximum write delay
+WRITE_DEBOUNCE_SECONDS = 0.5
+WRITE_MAX_DELAY_SECONDS = 2.0
+
+# Op-log table for item-level changes, and operations between compactions
+SUPABASE_OPS_TABLE = "grocery_ops"
+OPLOG_COMPACT_THRESHOLD = 200
+
+# Attempts to swap in a compacted snapshot when other writers swap first,
+# and operations kept after compaction so writes on older versions rebase
+OPLOG_CAS_ATTEMPTS = 3
+OPLOG_RETAIN_OPS = 1000
+
+# Seconds a cached list or catalog is served before its version is probed
+READ_CACHE_TTL_SECONDS = 5.0
+
+# Seconds to wait for the concurrent read of the list and catalog
+STARTUP_FETCH_TIMEOUT_SECONDS = 10.0
+
+# Remote log handler: buffered records, rows per insert, seconds per flush
+LOG_BUFFER_CAPACITY = 1000
+LOG_BATCH_SIZE = 50
+LOG_FLUSH_INTERVAL_SECONDS = 2.0
+
+# Storage calls: deadlines in seconds, tries and backoff of idempotent
+# calls, and consecutive failures that open the circuit for a while
+READ_DEADLINE_SECONDS = 5.0
+WRITE_DEADLINE_SECONDS = 10.0
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY_SECONDS = 0.2
+RETRY_MAX_DELAY_SECONDS = 2.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+# Storage backend, "supabase" or "sqlite", and the SQLite database file
+STORAGE_BACKEND = "supabase"
+SQLITE_PATH = "groceries.db"
+
+# Checkboxes shown per page of a catalog category
+CATEGORY_PAGE_SIZE = 50
+
+# Maximum number of catalog search results shown
+SEARCH_RESULT_LIMIT = 20
+
+# Memoized canonical item names
+NAME_CACHE_SIZE = 4096
+
+# Purchase history table, half-life in days of the decayed purchase
+# frequency, and number of suggestions shown
+SUPABASE_HISTORY_TABLE = "purchase_history"
+HISTORY_HALF_LIFE_DAYS = 30.0
+SUGGESTION_LIMIT = 8
+
+# Local Prometheus metrics endpoint, None disables it
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None
+
+# Local write-ahead journal of changes not yet in storage: file, numbered
+# next to it for further processes, seconds a commit waits for others to
+# share its fsync, and size that triggers a rewrite
+JOURNAL_PATH = "write_journal.jsonl"
+JOURNAL_COMMIT_WINDOW_SECONDS = 0.0
+JOURNAL_COMPACT_BYTES = 1_000_000
+
+# Unix socket of the host-wide writer process, None to write from every
+# app process, and seconds between reconnection attempts
+WRITER_SOCKET_PATH = None
+WRITER_RECONNECT_SECONDS = 1.0
+
+# Logging policy: records per second and burst per message template,
+# seconds in which repeated warnings are dropped, and per-module levels
+LOG_RATE_PER_SECOND = 5.0
+LOG_RATE_BURST = 20
+LOG_DEDUP_SECONDS = 60.0
+LOG_LEVELS: dict[str, str] = {}
+
+# Headless JSON API, None disables it in the app process, and the largest
+# request body in bytes
+API_HOST = "127.0.0.1"
+API_PORT = None
+API_MAX_BODY_BYTES = 1_000_000
+
+# Change propagation: listen to Supabase realtime, seconds between op-log
+# polls without it and as a resync with it, seconds a missing sequence
+# number is waited for, and seconds between checks of an open session for
+# changes
+CHANGE_REALTIME = True
+CHANGE_POLL_SECONDS = 2.0
+CHANGE_RESYNC_SECONDS = 30.0
+CHANGE_GAP_SECONDS = 2.0
+CHANGE_CHECK_SECONDS = 2.0
+
+# Catalog import: operations per storage insert, operations appended
+# between compactions, and characters read at a time from a JSON catalog
+IMPORT_BATCH_SIZE = 5000
+IMPORT_COMPACT_OPS = 100_000
+IMPORT_READ_CHARS = 65536
@@ -0,0 +1,925 @@
+import os
+import threading
+import time
+import uuid
+from functools import partial, wraps
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, TypeVar
+from database import get_backend, get_change_source
+from cache import VersionedCache
+from catalog import Catalog, canonical_name, normalize
+from changes import OPS_TABLE, ChangeFeed, Delta, Poller
+from config import (CATEGORIES, JOURNAL_PATH, READ_CACHE_TTL_SECONDS,
+                    WRITE_DEBOUNCE_SECONDS, WRITE_MAX_DELAY_SECONDS,
+                    WRITER_SOCKET_PATH)
+from history import ItemStats, PurchaseHistory
+from journal import Journal
+from logger_config import get_logger, summarize
+from metrics import registry
+from oplog import (OpLog, RebaseConflict, apply_ops, diff_groceries,
+                   diff_list)
+from write_behind import WriteBehind
+from writer_service import WriterClient
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Keeps published snapshots and their queued writes in the same order
+_publish_lock = threading.Lock()
+
+
+def _resource(create: Callable[[], T]) -> Callable[[], T]:
+    """
+    Create a resource once per process, on first use.
+
+    Like st.cache_resource, but usable without a Streamlit runtime, so
+    the app sessions and the JSON API of one process share the resource.
+    A failed creation is not cached, the next call tries again.
+
+    Arguments:
+        create -- Creates the resource.
+
+    Returns:
+        Callable -- Returns the resource, creating it on the first call.
+    """
+    lock = threading.RLock()
+    created: list = []
+
+    @wraps(create)
+    def get() -> T:
+        if not created:
+            with lock:
+                if not created:
+                    created.append(create())
+        return created[0]
+
+    return get
+
+
+@_resource
+def _get_read_cache() -> VersionedCache:
+    """
+    Create the read cache shared by all sessions of this process.
+
+    Returns:
+        VersionedCache -- The shared cache for the list and groceries.
+    """
+    cache = VersionedCache(ttl=READ_CACHE_TTL_SECONDS)
+    for name, text in (("hits", "Reads served from the read cache."),
+                       ("revalidations", "Cached reads whose version was "
+                        "probed."),
+                       ("misses", "Reads loaded from storage."),
+                       ("stale", "Reads served stale after a storage "
+                        "error."),
+                       ("deltas", "Deltas of other writers applied to "
+                        "cached documents.")):
+        registry.gauge(f"grocery_read_cache_{name}_total", text,
+                       lambda name=name: cache.stats()[name],
+                       kind="counter")
+    return cache
+
+
+@_resource
+def _get_oplogs() -> dict[str, OpLog]:
+    """
+    Create the delta persistence for the list and groceries documents.
+    The backend is only connected on first use.
+
+    Returns:
+        dict[str, OpLog] -- The op-logs keyed by document name.
+    """
+    backend = get_backend()
+    return {"list": OpLog(backend, "list"),
+            "groceries": OpLog(backend, "groceries")}
+
+
+@_resource
+def _get_history() -> PurchaseHistory:
+    """
+    Create the purchase history shared by all sessions of this process.
+    The stored history is only read once.
+
+    Returns:
+        PurchaseHistory -- The history and its aggregate.
+    """
+    return PurchaseHistory(get_backend())
+
+
+@_resource
+def _get_journal() -> Journal:
+    """
+    Open the write-ahead journal and replay what an earlier process left.
+
+    The GROCERY_JOURNAL_PATH environment variable overrides
+    config.JOURNAL_PATH; an empty path keeps the journal in memory only.
+    The journal is opened and replayed once. If the replay fails nothing
+    is kept, and writes are refused until a later call replays it.
+
+    Returns:
+        Journal -- The journal shared by all sessions.
+
+    Raises:
+        Exception -- If the journal cannot be opened or replayed.
+    """
+    journal = Journal(os.environ.get("GROCERY_JOURNAL_PATH", JOURNAL_PATH)
+                      or None)
+    try:
+        _replay_journal(journal)
+    except Exception:
+        journal.close()
+        raise
+    registry.gauge("grocery_journal_pending_entries",
+                   "Journaled changes not yet confirmed by storage.",
+                   journal.pending)
+    registry.gauge("grocery_journal_syncs_total",
+                   "Group commits of the write-ahead journal.",
+                   lambda: journal.syncs, kind="counter")
+    return journal
+
+
+def _replay_journal(journal: Journal) -> None:
+    """
+    Write the changes an earlier process journaled but never stored.
+
+    List and catalog operations are applied to the stored documents, and
+    purchases are added to the history. The entries are confirmed once
+    written, so each target is replayed at most once per process.
+
+    Arguments:
+        journal -- The journal just opened.
+
+    Returns:
+        None
+
+    Raises:
+        Exception -- If a replayed write fails.
+    """
+    entries: dict[str, list] = {"list": [], "groceries": [], "history": []}
+    last: dict[str, int] = {}
+    for seq, target, data in journal.replay():
+        entries[target].extend(data if target != "history" else [data])
+        last[target] = seq
+    for doc in ("list", "groceries"):
+        if entries[doc]:
+            doc_log = _get_oplogs()[doc]
+            document, _ = doc_log.load()
+            doc_log.write(apply_ops(document, entries[doc]))
+            _read_cache.invalidate(doc)
+    if entries["history"]:
+        history = _get_history()
+        for purchase in entries["history"]:
+            history.record(purchase["item"], purchase["at"],
+                           key=purchase.get("id"))
+        history.flush()
+    for target, seq in last.items():
+        journal.confirm(target, seq)
+    if last:
+        logger.info("Replayed %d journaled changes", len(journal.replay()))
+
+
+def recover() -> None:
+    """
+    Replay the changes an earlier process journaled but never stored.
+    Only the first call of a process does any work.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        Exception -- If the journal cannot be opened or replayed.
+    """
+    _get_journal()
+
+
+def _confirm_write(target: str, seq: int | None) -> None:
+    """
+    Drop the journal entries of a target once the write-behind stored them.
+
+    Arguments:
+        target -- Name of the written target.
+        seq -- Journal sequence number the snapshot was submitted with.
+
+    Returns:
+        None
+    """
+    if seq is not None:
+        _get_journal().confirm(target, seq)
+
+
+@_resource
+def _start_write_behind() -> WriteBehind:
+    """
+    Start the write-behind engine for the list, groceries and history.
+    The writer thread is only started once, on the first queued write.
+
+    Returns:
+        WriteBehind -- The engine shared by all sessions.
+    """
+    writer = WriteBehind({"list": write_list, "groceries": write_groceries,
+                          "history": write_history},
+                         debounce=WRITE_DEBOUNCE_SECONDS,
+                         max_delay=WRITE_MAX_DELAY_SECONDS,
+                         on_written=_confirm_write)
+    registry.gauge("grocery_write_queue_depth",
+                   "Documents with writes not yet sent to storage.",
+                   writer.pending)
+    registry.gauge("grocery_write_lag_seconds",
+                   "Age of the oldest write not yet sent to storage.",
+                   writer.lag)
+    registry.gauge("grocery_write_failures_total",
+                   "Background writes that failed and were queued again.",
+                   lambda: writer.failed, kind="counter")
+    registry.gauge("grocery_write_superseded_total",
+                   "Queued snapshots replaced by a newer one.",
+                   lambda: writer.superseded, kind="counter")
+    return writer.start()
+
+
+@_resource
+def _start_writer_client() -> WriterClient | None:
+    """
+    Connect to the host-wide writer service, if one is configured.
+
+    The GROCERY_WRITER_SOCKET environment variable overrides
+    config.WRITER_SOCKET_PATH; without a socket this process writes to
+    storage itself. There is one connection per process.
+
+    Returns:
+        WriterClient | None -- The client, None to write locally.
+    """
+    path = os.environ.get("GROCERY_WRITER_SOCKET", WRITER_SOCKET_PATH)
+    if not path:
+        return None
+    client = WriterClient(path, on_written=_confirm_write)
+    registry.gauge("grocery_write_queue_depth",
+                   "Changes sent to the writer service and not yet stored.",
+                   client.pending)
+    registry.gauge("grocery_write_lag_seconds",
+                   "Age of the oldest change not yet stored.", client.lag)
+    registry.gauge("grocery_write_failures_total",
+                   "Lost connections to the writer service.",
+                   lambda: client.failed, kind="counter")
+    return client.start()
+
+
+def _get_writer() -> WriteBehind | WriterClient:
+    """
+    Return what stores this process's changes: the writer service client
+    if configured, else the local write-behind engine.
+
+    Returns:
+        WriteBehind | WriterClient -- The writer.
+    """
+    return _start_writer_client() or _start_write_behind()
+
+
+def _queue_write(target: str, snapshot: Any, change: Any, seq: int) -> None:
+    """
+    Queue a journaled change for storage.
+
+    The local engine writes the latest snapshot of the target, the writer
+    service the change itself.
+
+    Arguments:
+        target -- "list", "groceries" or "history".
+        snapshot -- The full document after the change and the version it
+            was derived from, None for history.
+        change -- The journaled operations or purchase.
+        seq -- Journal sequence number of the change.
+
+    Returns:
+        None
+    """
+    writer = _get_writer()
+    if isinstance(writer, WriterClient):
+        writer.submit(target, change, seq)
+    else:
+        writer.submit(target, snapshot, seq)
+
+
+@_resource
+def start_change_feed() -> ChangeFeed:
+    """
+    Start following the changes other processes store.
+
+    Their operations are read from the op-log after the last known
+    version, when a realtime event says a document changed or, without
+    realtime, every CHANGE_POLL_SECONDS. Each delta is applied to the
+    shared read cache in place, so open sessions pick up the change on
+    their next rerun without a reload. Further in-process subscribers can
+    register on the returned feed.
+
+    Arguments:
+        None
+
+    Returns:
+        ChangeFeed -- The feed shared by all sessions.
+    """
+    feed = ChangeFeed()
+    feed.subscribe(_apply_delta)
+    source = get_change_source()
+    poller = Poller(get_backend(), feed, source)
+    if source is not None:
+        source.subscribe(OPS_TABLE, poller.notify)
+    poller.start()
+    if source is not None:
+        source.start()
+    registry.gauge("grocery_change_deltas_total",
+                   "Deltas of other writers received by the change feed.",
+                   lambda: feed.published, kind="counter")
+    registry.gauge("grocery_change_polls_total",
+                   "Op-log reads looking for changes of other writers.",
+                   lambda: poller.polls, kind="counter")
+    registry.gauge("grocery_change_realtime_connected",
+                   "1 while realtime change events are received.",
+                   lambda: int(getattr(source, "connected", False)))
+    return feed
+
+
+def _apply_delta(delta: Delta) -> None:
+    """
+    Apply the operations another writer stored to the op-log state and
+    the cached document.
+
+    Arguments:
+        delta -- The operations and the versions they move between.
+
+    Returns:
+        None
+    """
+    _get_oplogs()[delta.doc].observe(delta.base, delta.ops)
+    _read_cache.apply(delta.doc, delta.base, delta.version,
+                      partial(_patch, delta.doc, delta.ops))
+
+
+def _patch(doc: str, ops: list[dict[str, Any]], document: Any,
+           version: int) -> Any:
+    """
+    Return a cached document with the operations after its version.
+
+    Arguments:
+        doc -- "list" or "groceries".
+        ops -- The operations of a delta.
+        document -- The cached list or frozen catalog.
+        version -- Version of the cached document.
+
+    Returns:
+        Any -- The new list or frozen catalog.
+    """
+    fresh = [op for op in ops if op["seq"] > version]
+    if doc == "list":
+        return tuple(apply_ops(list(document), fresh))
+    groceries = document.copy()
+    # Runs of adds to one category, e.g. from an import, are sorted in once
+    for (kind, category), run in groupby(fresh,
+                                         key=itemgetter("op", "category")):
+        items = [op["item"] for op in run]
+        if kind == "add" and category in CATEGORIES:
+            groceries.add_many(category, items)
+        elif kind == "remove":
+            for item in items:
+                if groceries.category_of(item) == category:
+                    groceries.remove(item)
+    return groceries.freeze()
+
+
+# Reads
+def read_list() -> tuple[str, ...]:
+    """
+    Return the grocery list from the read cache, loading it if needed.
+
+    The list is a snapshot shared by all sessions of this process.
+
+    Arguments:
+        None
+
+    Returns:
+        tuple[str, ...] -- The shared grocery list.
+
+    Raises:
+        Exception -- If the list cannot be loaded.
+
+    Example:
+        >>> read_list()
+        ('Milk', 'Bread', 'Eggs')
+    """
+    return _read_list(_get_oplogs()["list"])
+
+
+def _read_list(list_log: OpLog) -> tuple[str, ...]:
+    return _read_cache.get("list", partial(_load_list, list_log),
+                           list_log.probe)
+
+
+def _unstored(doc: str) -> list[dict[str, Any]]:
+    """
+    Return the journaled operations of a document not yet stored.
+
+    Read them before the document: an entry confirmed in between is
+    already in the document read, and applying it again is harmless.
+
+    Arguments:
+        doc -- "list" or "groceries".
+
+    Returns:
+        list[dict[str, Any]] -- The operations, oldest first.
+    """
+    try:
+        journal = _get_journal()
+    except Exception as e:
+        # Nothing can be published without it, so nothing is unstored
+        logger.warning("Reading %s without the journal: %s", doc, e)
+        return []
+    return [op for entry in journal.entries(doc) for op in entry]
+
+
+def _load_list(list_log: OpLog) -> tuple[tuple[str, ...], int]:
+    """
+    Load the grocery list from storage for the read cache.
+
+    The changes this process journaled but did not store yet are applied
+    again, so a reload does not drop them from the shared list before
+    they are written.
+
+    Arguments:
+        list_log -- The op-log of the list.
+
+    Returns:
+        tuple[tuple[str, ...], int] -- The canonical names and the version.
+    """
+    unstored = _unstored("list")
+    grocery_list, version = list_log.load()
+    return tuple(apply_ops(grocery_list, unstored)), version
+
+
+def read_groceries() -> Catalog:
+    """
+    Return the catalog from the read cache, loading it if needed.
+
+    The catalog is a frozen snapshot shared by all sessions of this
+    process.
+
+    Arguments:
+        None
+
+    Returns:
+        Catalog -- The shared frozen catalog.
+
+    Raises:
+        Exception -- If the catalog cannot be loaded.
+    """
+    return _read_groceries(_get_oplogs()["groceries"])
+
+
+def _read_groceries(groceries_log: OpLog) -> Catalog:
+    return _read_cache.get("groceries",
+                           partial(_load_groceries, groceries_log),
+                           groceries_log.probe)
+
+
+def _load_groceries(groceries_log: OpLog) -> tuple[Catalog, int]:
+    """
+    Load the groceries catalog from storage for the read cache.
+
+    Like the list, the catalog keeps the changes not yet stored.
+
+    Arguments:
+        groceries_log -- The op-log of the groceries.
+
+    Returns:
+        tuple[Catalog, int] -- The frozen groceries in CATEGORIES order
+            and their version.
+    """
+    unstored = _unstored("groceries")
+    raw_groceries, version = groceries_log.load()
+    raw_groceries = apply_ops(raw_groceries, unstored)
+    groceries = Catalog({cat: raw_groceries.get(cat, [])
+                         for cat in CATEGORIES})
+    return groceries.freeze(), version
+
+
+def peek(doc: str) -> Any:
+    """
+    Return the shared snapshot of a document without accessing storage.
+
+    Arguments:
+        doc -- "list" or "groceries".
+
+    Returns:
+        Any -- The cached list or catalog, None if not loaded yet.
+    """
+    return _read_cache.peek(doc)
+
+
+def suggest(limit: int, listed: tuple[str, ...] | None = None
+            ) -> list[ItemStats]:
+    """
+    Return the most frequently bought items that are not on the list.
+
+    Arguments:
+        limit -- Maximum number of suggestions.
+
+    Keyword Arguments:
+        listed -- The list to leave out, default: None (the shared list)
+
+    Returns:
+        list[ItemStats] -- The suggestions, items due first.
+    """
+    return _get_history().suggest(read_list() if listed is None
+                                  else listed, limit)
+
+
+# Writes
+def _write_document(doc: str, document: Any, base: int | None) -> int:
+    """
+    Write a document to its op-log and move the read cache past the write.
+
+    If the operations after base were compacted away, so the write cannot
+    be rebased, the stored document is reloaded and the changes this
+    process journaled but did not store yet are applied to it again.
+    Items other writers removed meanwhile therefore stay removed.
+
+    Arguments:
+        doc -- "list" or "groceries".
+        document -- The document to write.
+        base -- Version document was derived from.
+
+    Returns:
+        int -- Number of operations written.
+    """
+    doc_log = _get_oplogs()[doc]
+    version = doc_log.version
+    try:
+        written = doc_log.write(document, base)
+    except RebaseConflict as e:
+        logger.warning("%s, reapplying our changes to the stored %s", e,
+                       doc)
+        unstored = _unstored(doc)
+        stored, version = doc_log.load()
+        written = doc_log.write(apply_ops(stored, unstored), version)
+        # The cached document predates the reload
+        _read_cache.advance(doc, None, None)
+        return written
+    _read_cache.advance(doc, version, None if doc_log.merged
+                        else doc_log.version)
+    return written
+
+
+def write_list(snapshot: tuple[list[str], int | None]) -> None:
+    """
+    Save the changes to the grocery list to the storage op-log.
+
+    The list is rebased onto the changes other writers stored after the
+    version it was derived from, so their edits are kept.
+
+    Arguments:
+        snapshot -- The list of groceries to save and its base version.
+
+    Returns:
+        None
+
+    Raises:
+        Exception -- If the write fails, so the write-behind engine
+            retries it.
+    """
+    try:
+        grocery_list, base = snapshot
+        logger.debug("Writing list: %s", summarize(grocery_list))
+        written = _write_document("list", grocery_list, base)
+        logger.info("Wrote %d list operations", written)
+    except Exception as e:
+        logger.error("Error in write_list: %s", e)
+        raise
+
+
+def write_groceries(snapshot: tuple[dict[str, list[str]], int | None]
+                    ) -> None:
+    """
+    Write the changes to the groceries dictionary to the storage op-log.
+
+    The catalog is rebased onto the changes other writers stored after
+    the version it was derived from, so their edits are kept.
+
+    Arguments:
+        snapshot -- The groceries dictionary to write and its base version.
+
+    Returns:
+        None
+
+    Raises:
+        Exception -- If the write fails, so the write-behind engine
+            retries it.
+    """
+    try:
+        groceries, base = snapshot
+        logger.debug("Writing groceries: %s", summarize(groceries))
+        _write_document("groceries", groceries, base)
+    except Exception as e:
+        logger.error("Error in write_groceries: %s", e)
+        raise
+
+
+def write_history(_: None = None) -> None:
+    """
+    Append the recorded purchases to the storage purchase history.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+
+    Raises:
+        Exception -- If the write fails, so the write-behind engine
+            retries it.
+    """
+    try:
+        written = _get_history().flush()
+        logger.info("Wrote %d purchases", written)
+    except Exception as e:
+        logger.error("Error in write_history: %s", e)
+        raise
+
+
+def publish_list(change: Callable[[tuple[str, ...]], tuple[str, ...]],
+                 current: tuple[str, ...] | None = None
+                 ) -> tuple[str, ...]:
+    """
+    Publish a changed grocery list to all sessions and queue its write.
+
+    The item operations of the change are journaled, and the call returns
+    once they are on local disk.
+
+    Arguments:
+        change -- Returns the new list from the current shared list.
+
+    Keyword Arguments:
+        current -- The caller's last known list, used if the shared list
+            is not cached, default: None (read it through the cache)
+
+    Returns:
+        tuple[str, ...] -- The published list.
+    """
+    journal = _get_journal()
+    if current is None:
+        current = read_list()
+    ops, seqs = [], []
+
+    def journaled(shared: tuple[str, ...]) -> tuple[str, ...]:
+        grocery_list = change(shared)
+        ops.extend(diff_list(list(shared), list(grocery_list)))
+        # Journaled with the update, so a reload of the list includes it
+        if ops:
+            seqs.append(journal.append("list", ops))
+        return grocery_list
+
+    with _publish_lock:
+        grocery_list, base = _read_cache.update("list", journaled, current)
+        if ops:
+            _queue_write("list", (list(grocery_list), base), ops, seqs[0])
+    if ops:
+        journal.commit(seqs[0])
+    return grocery_list
+
+
+def publish_groceries(change: Callable[[Catalog], Any],
+                      current: Catalog | None = None) -> Catalog:
+    """
+    Publish a changed catalog to all sessions and queue its write.
+
+    The change is applied to a copy of the current shared catalog, which
+    is then frozen and replaces it, so sessions still rendering the old
+    snapshot are not affected. The operations of the change are
+    journaled, and the call returns once they are on local disk.
+
+    Arguments:
+        change -- Changes the catalog copy in place.
+
+    Keyword Arguments:
+        current -- The caller's last known catalog, used if the shared
+            catalog is not cached, default: None (read it through the
+            cache)
+
+    Returns:
+        Catalog -- The published catalog.
+    """
+    journal = _get_journal()
+    if current is None:
+        current = read_groceries()
+    ops, documents, seqs = [], [], []
+
+    def copy_on_write(shared: Catalog) -> Catalog:
+        groceries = shared.copy()
+        change(groceries)
+        documents.append(groceries.to_dict())
+        ops.extend(diff_groceries(shared.to_dict(), documents[-1]))
+        if ops:
+            seqs.append(journal.append("groceries", ops))
+        return groceries.freeze()
+
+    with _publish_lock:
+        groceries, base = _read_cache.update("groceries", copy_on_write,
+                                             current)
+        if ops:
+            _queue_write("groceries", (documents[-1], base), ops, seqs[0])
+    if ops:
+        journal.commit(seqs[0])
+    return groceries
+
+
+def add_to_list(groceries: list[str],
+                current: tuple[str, ...] | None = None) -> tuple[str, ...]:
+    """
+    Add grocery items to the grocery list, skipping those already listed.
+
+    Arguments:
+        groceries -- The grocery items to add.
+
+    Keyword Arguments:
+        current -- The caller's last known list, default: None
+
+    Returns:
+        tuple[str, ...] -- The published list.
+    """
+    def add(grocery_list: tuple[str, ...]) -> tuple[str, ...]:
+        listed = {normalize(item): item for item in grocery_list}
+        for grocery in groceries:
+            listed.setdefault(normalize(grocery), canonical_name(grocery))
+        return tuple(listed.values())
+
+    return publish_list(add, current)
+
+
+def remove_from_list(groceries: list[str],
+                     current: tuple[str, ...] | None = None
+                     ) -> tuple[str, ...]:
+    """
+    Remove grocery items from the grocery list.
+
+    Arguments:
+        groceries -- The grocery items to remove.
+
+    Keyword Arguments:
+        current -- The caller's last known list, default: None
+
+    Returns:
+        tuple[str, ...] -- The published list.
+    """
+    removed = {normalize(grocery) for grocery in groceries}
+    return publish_list(lambda grocery_list: tuple(
+        item for item in grocery_list if normalize(item) not in removed),
+        current)
+
+
+def check_off(groceries: list[str],
+              current: tuple[str, ...] | None = None) -> tuple[str, ...]:
+    """
+    Remove bought grocery items from the list and record the purchases.
+
+    The purchases are journaled with the removal and share its commit.
+
+    Arguments:
+        groceries -- The grocery items that were bought.
+
+    Keyword Arguments:
+        current -- The caller's last known list, default: None
+
+    Returns:
+        tuple[str, ...] -- The published list.
+    """
+    journal = _get_journal()
+    history = _get_history()
+    # Purchases are recorded under the listed name, whatever the casing
+    listed = {normalize(item): item
+              for item in (read_list() if current is None else current)}
+    # The writer service stores the purchases instead of the local history
+    store = _start_writer_client() is None
+    seq = None
+    for grocery in groceries:
+        item = listed.get(normalize(grocery), canonical_name(grocery))
+        purchase = {"item": item, "at": time.time(), "id": uuid.uuid4().hex}
+        seq = journal.append("history", purchase)
+        history.record(item, purchase["at"], store=store, key=purchase["id"])
+        _queue_write("history", None, purchase, seq)
+    grocery_list = remove_from_list(groceries, current)
+    if seq is not None:
+        journal.commit(seq)
+    return grocery_list
+
+
+def add_groceries(items: list[tuple[str, str]],
+                  current: Catalog | None = None) -> Catalog:
+    """
+    Add items to catalog categories in one published change.
+
+    Names are stored in canonical form; items already in the catalog
+    keep their category.
+
+    Arguments:
+        items -- (category, item) pairs to add.
+
+    Keyword Arguments:
+        current -- The caller's last known catalog, default: None
+
+    Returns:
+        Catalog -- The published catalog.
+
+    Raises:
+        ValueError -- If a category is not one of CATEGORIES.
+    """
+    unknown = sorted({category for category, _ in items
+                      if category not in CATEGORIES})
+    if unknown:
+        raise ValueError(f"Unknown categories: {', '.join(unknown)}")
+
+    def add(groceries: Catalog) -> None:
+        for category, item in items:
+            groceries.add(category, canonical_name(item))
+
+    return publish_groceries(add, current)
+
+
+def remove_groceries(items: list[str],
+                     current: Catalog | None = None) -> Catalog:
+    """
+    Remove items from the catalog in one published change.
+
+    Arguments:
+        items -- Names of the items to remove, in any casing.
+
+    Keyword Arguments:
+        current -- The caller's last known catalog, default: None
+
+    Returns:
+        Catalog -- The published catalog.
+    """
+    def remove(groceries: Catalog) -> None:
+        for item in items:
+            groceries.remove(item)
+
+    return publish_groceries(remove, current)
+
+
+# Write Queue and Statistics
+def flush_writes(timeout: float | None = None) -> bool:
+    """
+    Wait until all queued writes have reached storage.
+
+    Keyword Arguments:
+        timeout -- Seconds to wait, default: None (wait forever)
+
+    Returns:
+        bool -- True if all writes completed before the timeout.
+    """
+    return _get_writer().flush(timeout)
+
+
+def read_cache_stats() -> dict[str, int]:
+    """
+    Return the hit and miss counts of the shared read cache.
+
+    Arguments:
+        None
+
+    Returns:
+        dict[str, int] -- Counts of hits, revalidations and misses.
+    """
+    return _read_cache.stats()
+
+
+def storage_stats() -> dict:
+    """
+    Return the circuit breaker state and call counts of the storage layer.
+
+    Arguments:
+        None
+
+    Returns:
+        dict -- Breaker state, consecutive failures, times opened, call,
+            failure, retry, timeout and short-circuit counts, and the
+            number of failed background writes.
+    """
+    backend = get_backend()
+    stats = backend.stats() if hasattr(backend, "stats") else {}
+    return {**stats, "failed_writes": _get_writer().failed}
+
+
+def pending_writes() -> int:
+    """
+    Return the number of documents with writes not yet sent to storage.
+
+    Arguments:
+        None
+
+    Returns:
+        int -- Number of pending documents.
+    """
+    return _get_writer().pending()
+
+
+_read_cache = _get_read_cache()
@@ -1,16 +1,52 @@
-import streamlit as st
-from supabase import create_client, Client
-from typing import Optional
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+from config import CHANGE_REALTIME, SQLITE_PATH, STORAGE_BACKEND
+from storage import StorageBackend, SupabaseBackend, SQLiteBackend
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from changes import SupabaseRealtime
+
+
+def get_secret(name: str) -> str:
+    """
+    Get a Supabase credential from the environment or Streamlit secrets.
+
+    The environment variable of the same name wins. Streamlit is only
+    imported when the environment does not set it, so the core and the
+    JSON API run without Streamlit installed.
+
+    Arguments:
+        name -- "SUPABASE_URL" or "SUPABASE_KEY".
+
+    Returns:
+        str -- The credential.
+
+    Raises:
+        KeyError -- If neither the environment nor the secrets set it.
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+    try:
+        import streamlit as st
+    except ImportError:
+        raise KeyError(f"{name} is not set in the environment") from None
+    return st.secrets[name]
 
 
 class SupabaseClient:
     """
     Singleton class for Supabase client.
+
+    The supabase package is only imported when the client is first
+    requested, so importing this module stays cheap.
     """
-    _instance: Optional[Client] = None
+    _instance: Optional["Client"] = None
 
     @classmethod
-    def get_client(cls) -> Client:
+    def get_client(cls) -> "Client":
         """
         Get or create Supabase client instance.
 
@@ -21,11 +57,118 @@ class SupabaseClient:
             Client -- Supabase client instance.
         """
         if cls._instance is None:
-            supabase_url: str = st.secrets["SUPABASE_URL"]
-            supabase_key: str = st.secrets["SUPABASE_KEY"]
+            from supabase import create_client
+            supabase_url = get_secret("SUPABASE_URL")
+            supabase_key = get_secret("SUPABASE_KEY")
             cls._instance = create_client(supabase_url, supabase_key)
         return cls._instance
 
 
-# Create a single instance to be imported by other modules
-supabase = SupabaseClient.get_client()
+_inner: Optional[StorageBackend] = None
+_backend: Optional[StorageBackend] = None
+_log_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def _get_inner() -> StorageBackend:
+    """
+    Create the storage backend selected by configuration, unwrapped.
+    The lock must be held.
+
+    Arguments:
+        None
+
+    Returns:
+        StorageBackend -- The configured storage backend.
+
+    Raises:
+        ValueError -- If the configured backend is unknown.
+    """
+    global _inner
+    if _inner is None:
+        kind = os.environ.get("GROCERY_STORAGE_BACKEND", STORAGE_BACKEND)
+        if kind == "sqlite":
+            _inner = SQLiteBackend(
+                os.environ.get("GROCERY_SQLITE_PATH", SQLITE_PATH))
+        elif kind == "supabase":
+            _inner = SupabaseBackend(SupabaseClient.get_client())
+        else:
+            raise ValueError(f"Unknown storage backend: {kind}")
+    return _inner
+
+
+def get_backend() -> StorageBackend:
+    """
+    Get or create the storage backend selected by configuration.
+
+    The GROCERY_STORAGE_BACKEND environment variable ("supabase" or
+    "sqlite") overrides config.STORAGE_BACKEND, and GROCERY_SQLITE_PATH
+    overrides config.SQLITE_PATH. The backend is created on first use and
+    wrapped in a ResilientBackend for deadlines, retries and a circuit
+    breaker.
+
+    Arguments:
+        None
+
+    Returns:
+        StorageBackend -- The configured storage backend.
+
+    Raises:
+        ValueError -- If the configured backend is unknown.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            # Imported here, resilience logs through logger_config
+            from resilience import ResilientBackend
+            _backend = ResilientBackend(_get_inner())
+        return _backend
+
+
+def get_log_backend() -> StorageBackend:
+    """
+    Get or create the storage backend the remote log handler writes to.
+
+    It shares the connection of get_backend() but has its own circuit
+    breaker, so failing or slow log inserts cannot open the circuit of
+    the list and catalog reads and writes.
+
+    Arguments:
+        None
+
+    Returns:
+        StorageBackend -- The configured storage backend for logs.
+
+    Raises:
+        ValueError -- If the configured backend is unknown.
+    """
+    global _log_backend
+    with _backend_lock:
+        if _log_backend is None:
+            from resilience import ResilientBackend
+            _log_backend = ResilientBackend(_get_inner(), name="log")
+        return _log_backend
+
+
+def get_change_source() -> Optional["SupabaseRealtime"]:
+    """
+    Create the realtime source of op-log inserts, if storage is Supabase.
+
+    Disabled by config.CHANGE_REALTIME, or by setting the
+    GROCERY_REALTIME environment variable to "0". Without a source,
+    changes from other processes are found by polling.
+
+    Arguments:
+        None
+
+    Returns:
+        SupabaseRealtime | None -- The unstarted source, or None.
+    """
+    kind = os.environ.get("GROCERY_STORAGE_BACKEND", STORAGE_BACKEND)
+    enabled = os.environ.get("GROCERY_REALTIME", "1" if CHANGE_REALTIME
+                             else "0") != "0"
+    if kind != "supabase" or not enabled:
+        return None
+    from changes import SupabaseRealtime
+    return SupabaseRealtime(get_secret("SUPABASE_URL"),
+                            get_secret("SUPABASE_KEY"))
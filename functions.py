@@ -1,143 +1,158 @@
-import streamlit as st
-import threading
-import queue
+import os
 import time
-from typing import Callable
-from database import supabase
-from config import CATEGORIES, SUPABASE_DEFAULT_TABLE, SUPABASE_GROCERY_TABLE
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer
+import streamlit as st
+import core
+from catalog import Catalog, canonical_name
+from config import (API_HOST, API_PORT, CATEGORIES, CATEGORY_PAGE_SIZE,
+                    CHANGE_CHECK_SECONDS, METRICS_HOST, METRICS_PORT,
+                    SEARCH_RESULT_LIMIT, STARTUP_FETCH_TIMEOUT_SECONDS,
+                    SUGGESTION_LIMIT)
+# Write queue and statistics, shared with the JSON API
+from core import (flush_writes, pending_writes, read_cache_stats,  # noqa
+                  storage_stats)
 from logger_config import get_logger
+from metrics import registry, start_http_server
 
 logger = get_logger(__name__)
 
-# Create thread-safe queues for pending writes
-_list_write_queue = queue.Queue()
-_groceries_write_queue = queue.Queue()
+_SCRIPT_RUN_SECONDS = registry.histogram(
+    "grocery_script_run_seconds", "Duration of main.py reruns.")
+
 
 @st.cache_resource
-def _start_write_workers() -> tuple[queue.Queue, queue.Queue]:
+def _get_fetch_pool() -> ThreadPoolExecutor:
     """
-    Start background write worker threads.
-    Uses st.cache_resource to ensure threads are only started once.
+    Create the thread pool that reads the list and groceries concurrently.
+    Uses st.cache_resource so all sessions share the same threads.
 
     Returns:
-        tuple[queue.Queue, queue.Queue] -- The list and groceries write queues.
+        ThreadPoolExecutor -- Pool with one thread per document.
     """
-    list_queue = queue.Queue()
-    groceries_queue = queue.Queue()
-
-    threading.Thread(
-        target=_write_worker,
-        args=(list_queue, write_list),
-        daemon=True
-    ).start()
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="fetch")
 
-    threading.Thread(
-        target=_write_worker,
-        args=(groceries_queue, write_groceries),
-        daemon=True
-    ).start()
 
-    logger.info("Write worker threads started.")
-    return list_queue, groceries_queue
-
-def _write_worker(write_queue: queue.Queue,
-                  write_func: Callable[[list[str]], None]) -> None:
+@st.cache_resource
+def start_metrics_server() -> ThreadingHTTPServer | None:
     """
-    Worker that processes writes from the queue.
+    Serve the metrics in Prometheus text format at /metrics.
 
-    Arguments:
-        write_queue -- The queue to read from
-        write_func -- The function to call for writing
+    The GROCERY_METRICS_PORT environment variable overrides
+    config.METRICS_PORT; without a port no endpoint is started.
+    Uses st.cache_resource so one server is started per process.
 
-    Returns:
+    Arguments:
         None
-    """
-    logger.info(f"Starting write worker for {write_func.__name__}")
-    while True:
-        try:
-            logger.info(f"Worker {write_func.__name__} waiting for data...")
-            data = write_queue.get()
-            logger.info(f"Worker {write_func.__name__} received data: {data}")
-            if data is not None:
-                write_func(data)
-            write_queue.task_done()
-        except Exception as e:
-            logger.error(f"Error in write worker {write_func.__name__}: {e}")
-        time.sleep(0.5)  # Small delay to prevent busy-waiting
 
+    Returns:
+        ThreadingHTTPServer | None -- The running server, None if disabled
+            or the port could not be bound.
 
-# Core File Operation Functions
+    Example:
+        >>> start_metrics_server()
+        # curl http://127.0.0.1:9108/metrics
+    """
+    port = os.environ.get("GROCERY_METRICS_PORT", METRICS_PORT)
+    if port in (None, ""):
+        return None
+    try:
+        server = start_http_server(int(port), METRICS_HOST)
+    except OSError as e:
+        logger.error("Error in start_metrics_server: %s", e)
+        return None
+    logger.info("Serving metrics on %s:%s/metrics", METRICS_HOST, port)
+    return server
 
 
-def get_list() -> list[str]:
+@st.cache_resource
+def start_api_server() -> ThreadingHTTPServer | None:
     """
-    Retrieve the grocery list from Supabase.
+    Serve the JSON API from this process, sharing its cache and writes.
+
+    The GROCERY_API_PORT environment variable overrides config.API_PORT;
+    without a port no API is started. Uses st.cache_resource so one
+    server is started per process.
 
     Arguments:
         None
 
     Returns:
-        list[str] -- A list of grocery items with proper title casing.
-                  Returns empty list if no data or error occurs.
-
-    Raises:
-        Shows Streamlit error message if database operation fails.
+        ThreadingHTTPServer | None -- The running server, None if disabled
+            or the port could not be bound.
 
     Example:
-        >>> get_list()
-        ['Milk', 'Bread', 'Eggs']
+        >>> start_api_server()
+        # curl http://127.0.0.1:8600/list
     """
+    port = os.environ.get("GROCERY_API_PORT", API_PORT)
+    if port in (None, ""):
+        return None
+    # Imported here, api is only needed when the API is enabled
+    import api
     try:
-        with st.spinner('Loading grocery list...'):
-            response = supabase.table(
-                SUPABASE_GROCERY_TABLE).select("*").execute()
-            if response.data:
-                # Extract the "groceries" list from the JSON
-                groceries = response.data[0]["groceries"]
-                # Return the list with proper title casing
-                return [better_title(item) for item in groceries]
-            else:
-                return []
-    except Exception as e:
-        logger.error(f"Error in get_list: {e}")
-        st.error(f"Error in get_list: {str(e)}")
-        return []
+        server = api.start_server(int(port), API_HOST)
+    except OSError as e:
+        logger.error("Error in start_api_server: %s", e)
+        return None
+    logger.info("Serving the JSON API on %s:%s", API_HOST, port)
+    return server
 
 
-def write_list(grocery_list: list[str]) -> None:
+def record_script_run(seconds: float) -> None:
     """
-    Save the grocery list to Supabase.
+    Record the duration of a rerun of main.py.
 
     Arguments:
-        grocery_list -- The list of groceries to save.
+        seconds -- Wall time of the rerun.
 
     Returns:
         None
+    """
+    _SCRIPT_RUN_SECONDS.observe(seconds)
+
+
+# Core File Operation Functions
+def get_list() -> tuple[str, ...]:
+    """
+    Retrieve the grocery list from storage.
+
+    The list is a snapshot shared by all sessions of this process.
+
+    Arguments:
+        None
+
+    Returns:
+        tuple[str, ...] -- The grocery items with proper title casing.
+                  Returns an empty tuple if no data or error occurs.
 
     Raises:
         Shows Streamlit error message if database operation fails.
+
+    Example:
+        >>> get_list()
+        ('Milk', 'Bread', 'Eggs')
     """
     try:
-        logger.info(f"Attempting to write list: {grocery_list}")
-        response = supabase.table(SUPABASE_GROCERY_TABLE).upsert({
-            'id': 1,  # Use a constant ID for the single record
-            'groceries': grocery_list
-        }).execute()
-        logger.info(f"Write response: {response}")
+        with st.spinner('Loading grocery list...'):
+            return core.read_list()
     except Exception as e:
-        logger.error(f"Error in write_list: {e}")
-        st.error(f"Error in write_list: {str(e)}")
+        logger.error("Error in get_list: %s", e)
+        st.error(f"Error in get_list: {str(e)}")
+        return ()
 
 
-def get_groceries() -> dict[str, list[str]]:
+def get_groceries() -> Catalog:
     """
-    Read a supabase table and return a dictionary with categories as keys and lists of grocery items as values.
+    Read the storage backend and return a catalog with categories as keys and sorted lists of grocery items as values.
+
+    The catalog is a frozen snapshot shared by all sessions of this process.
 
     Arguments:
         None
 
     Returns:
-        dict[str, list[str]] -- A dictionary with categories as keys and lists of grocery items as values.
+        Catalog -- A catalog with categories as keys and sorted lists of grocery items as values.
 
     Raises:
         Shows Streamlit error message if database operation fails.
@@ -147,75 +162,102 @@ def get_groceries() -> dict[str, list[str]]:
         {'Fresh Produce': ['Apples', 'Bananas'], 'Meat & Seafood': ['Chicken', 'Fish']}
     """  # noqa
     try:
-        response = supabase.table(SUPABASE_DEFAULT_TABLE).select("*").execute()
-        if response.data:
-            raw_groceries = response.data[0]['groceries']
-            # Create dictionary maintaining CATEGORIES order
-            groceries = {cat: sorted(better_title(item) for item in
-                                     raw_groceries.get(cat, []))
-                         for cat in CATEGORIES}
-            return groceries
-        else:
-            return {cat: [] for cat in CATEGORIES}
+        return core.read_groceries()
     except Exception as e:
-        logger.error(f"Error in get_groceries: {e}")
+        logger.error("Error in get_groceries: %s", e)
         st.error(f"Error in get_groceries: {str(e)}")
-        return {cat: [] for cat in CATEGORIES}
+        return Catalog().freeze()
 
 
-def write_groceries(groceries: dict[str, list[str]]) -> None:
+def load_documents(timeout: float = STARTUP_FETCH_TIMEOUT_SECONDS) -> None:
     """
-    Write the groceries dictionary to a supabase table.
+    Read the grocery list and the catalog concurrently into session state.
 
-    Arguments:
-        groceries -- The groceries dictionary to write.
+    Both reads are issued at once on the fetch pool, so a cold start
+    costs the slower of the two round-trips instead of their sum. Each
+    document is stored as soon as it arrives. A document that fails or
+    is not ready within the timeout keeps the session's previous
+    snapshot, or is empty on the first run. Its read carries on in the
+    background and fills the read cache for the next rerun.
+
+    Keyword Arguments:
+        timeout -- Seconds to wait for both documents,
+            default: STARTUP_FETCH_TIMEOUT_SECONDS
 
     Returns:
         None
 
     Raises:
-        Shows Streamlit error message if database operation fails.
+        Shows Streamlit error message if a read fails or times out.
     """
     try:
-        supabase.table(SUPABASE_DEFAULT_TABLE).upsert({
-            'id': 1,  # Use a constant ID for the single record
-            'groceries': groceries
-        }).execute()
+        # Replays changes a crashed process left, before they are read
+        core.recover()
     except Exception as e:
-        logger.error(f"Error in write_groceries: {e}")
-        st.error(f"Error in write_groceries: {str(e)}")
+        logger.error("Error in load_documents (journal): %s", e)
+        st.error(f"Error replaying unsaved changes: {str(e)}")
+    pool = _get_fetch_pool()
+    futures = {pool.submit(core.read_list): "grocery_list",
+               pool.submit(core.read_groceries): "groceries"}
+    try:
+        with st.spinner('Loading groceries...'):
+            for future in as_completed(futures, timeout=timeout):
+                key = futures[future]
+                try:
+                    st.session_state[key] = future.result()
+                except Exception as e:
+                    logger.error("Error in load_documents (%s): %s", key, e)
+                    st.error(f"Error in load_documents ({key}): {str(e)}")
+    except TimeoutError:
+        missing = [key for future, key in futures.items()
+                   if not future.done()]
+        logger.error("Timed out after %ss loading %s", timeout, missing)
+        st.error(f"Timed out loading {', '.join(missing)}, "
+                 "showing the last known data")
+    st.session_state.setdefault("grocery_list", ())
+    st.session_state.setdefault("groceries", Catalog().freeze())
+
+
+def add_to_list(groceries: list[str]) -> None:
+    """
+    Add grocery items to the grocery list, skipping those already listed.
+
+    Arguments:
+        groceries -- The grocery items to add.
+
+    Returns:
+        None
+    """
+    st.session_state["grocery_list"] = core.add_to_list(
+        groceries, st.session_state["grocery_list"])
 
 
-def background_write_list() -> None:
+def remove_from_list(grocery: str) -> None:
     """
-    Queue a write operation for the grocery list.
+    Remove a grocery item from the grocery list.
 
     Arguments:
-        None
+        grocery -- The grocery item to remove.
 
     Returns:
         None
     """
-    logger.info("Adding to list write queue...")
-    grocery_list = st.session_state["grocery_list"]
-    _list_write_queue.put(grocery_list)
-    logger.info(f"Queue size after put: {_list_write_queue.qsize()}")
+    st.session_state["grocery_list"] = core.remove_from_list(
+        [grocery], st.session_state["grocery_list"])
 
 
-def background_write_groceries() -> None:
+def check_off(grocery: str) -> None:
     """
-    Queue a write operation for the groceries dictionary.
+    Remove a bought grocery item from the list and record the purchase.
 
     Arguments:
-        None
+        grocery -- The grocery item that was bought.
 
     Returns:
         None
     """
-    logger.info("Adding to groceries write queue...")
-    groceries = st.session_state["groceries"]
-    _groceries_write_queue.put(groceries)
-    logger.info(f"Queue size after put: {_groceries_write_queue.qsize()}")
+    st.session_state["grocery_list"] = core.check_off(
+        [grocery], st.session_state["grocery_list"])
 
 
 # Grocery Management Functions
@@ -229,15 +271,12 @@ def add_default_groceries() -> None:
     Returns:
         None
     """
-    groceries = st.session_state["groceries"]
     category = st.session_state["category"]
     if "new_grocery" in st.session_state:
-        grocery = st.session_state["new_grocery"]
-        if not groceries[category]:
-            st.session_state["groceries"][category] = []
-        if grocery not in groceries[category]:
-            st.session_state["groceries"][category].append(
-                grocery.title())
+        grocery = canonical_name(st.session_state["new_grocery"])
+        st.session_state["groceries"] = core.publish_groceries(
+            lambda groceries: groceries.add(category, grocery),
+            st.session_state["groceries"])
 
 
 def remove_groceries() -> None:
@@ -251,11 +290,15 @@ def remove_groceries() -> None:
         None
     """
     added_groceries = st.session_state["added_groceries"]
-    groceries = st.session_state["groceries"]
-    for grocery in added_groceries:
-        for key in groceries.keys():
-            if grocery.strip() in groceries[key]:
-                st.session_state["groceries"][key].remove(grocery.strip())
+
+    def remove(groceries: Catalog) -> None:
+        for item_id in added_groceries:
+            grocery = groceries.item_of(item_id)
+            if grocery is not None:
+                groceries.remove(grocery)
+
+    st.session_state["groceries"] = core.publish_groceries(
+        remove, st.session_state["groceries"])
     st.session_state["added_groceries"].clear()
 
 
@@ -285,9 +328,13 @@ def process_grocery_input(categories: list[str] = CATEGORIES) -> None:
 
 
 # UI Display Functions
+@st.fragment
 def display_grocery_category(category: str) -> None:
     """
-    Display the grocery category and items as checkboxes
+    Display the grocery category and items as checkboxes.
+
+    Runs as a fragment, so ticking a checkbox only reruns this category.
+    Categories with more than CATEGORY_PAGE_SIZE items are paginated.
 
     Arguments:
         category: the name of the category to be displayed
@@ -295,7 +342,7 @@ def display_grocery_category(category: str) -> None:
     Returns:
         None
     """
-    added_groceries = st.session_state["added_groceries"]
+    selected = st.session_state["added_groceries"]
     groceries = st.session_state["groceries"]
     if category in groceries:
         # Clean up the category name for the anchor
@@ -315,11 +362,136 @@ def display_grocery_category(category: str) -> None:
             unsafe_allow_html=True
         )
 
-        # Display the grocery items
-        for grocery in groceries[category]:
-            checkbox = st.checkbox(grocery, key=f"{category}_{grocery}")
-            if checkbox:
-                added_groceries.append(grocery)
+        # Display one page of the grocery items
+        items = groceries[category]
+        pages = -(-len(items) // CATEGORY_PAGE_SIZE)
+        page = 1
+        if pages > 1:
+            page = st.number_input(f"Page (of {pages})", min_value=1,
+                                   max_value=pages, key=f"page_{anchor}")
+        start = (page - 1) * CATEGORY_PAGE_SIZE
+        for grocery in items[start:start + CATEGORY_PAGE_SIZE]:
+            item_id = groceries.item_id(grocery)
+            key = item_key(item_id)
+            st.checkbox(grocery, key=key, value=item_id in selected,
+                        on_change=toggle_grocery, args=(key, item_id))
+
+
+@st.fragment
+def display_search_results(query: str) -> None:
+    """
+    Display the catalog items matching a search query as checkboxes.
+
+    Arguments:
+        query: the text typed in the search box
+
+    Returns:
+        None
+    """
+    selected = st.session_state["added_groceries"]
+    groceries = st.session_state["groceries"]
+    matches = groceries.search(query, SEARCH_RESULT_LIMIT)
+    if not matches:
+        st.caption("No matching groceries")
+    for category, grocery in matches:
+        item_id = groceries.item_id(grocery)
+        key = item_key(item_id)
+        st.checkbox(grocery, key=key, value=item_id in selected,
+                    help=category, on_change=toggle_grocery,
+                    args=(key, item_id))
+
+
+@st.fragment(run_every=CHANGE_CHECK_SECONDS)
+def watch_changes() -> None:
+    """
+    Rerun the session when the shared list or catalog has changed.
+
+    Runs as a fragment every CHANGE_CHECK_SECONDS, so an idle session
+    shows changes made by other sessions and processes. A check compares
+    the session's snapshots with the shared ones in memory; the change
+    feed keeps those current without reloading them from storage.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    try:
+        core.start_change_feed()
+    except Exception as e:
+        logger.error("Error in watch_changes: %s", e)
+        return
+    for key, doc in (("grocery_list", "list"), ("groceries", "groceries")):
+        shared = core.peek(doc)
+        if shared is not None and shared is not st.session_state.get(key):
+            st.rerun()
+
+
+def display_suggestions() -> None:
+    """
+    Display the most frequently bought items that are not on the list.
+
+    Items whose typical reorder interval has passed are shown first.
+    Served from the purchase aggregate, the history is not read.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+    suggestions = core.suggest(SUGGESTION_LIMIT,
+                               st.session_state["grocery_list"])
+    if not suggestions:
+        return
+    now = time.time()
+    suggestions.sort(key=lambda stats: not stats.due(now))
+    groceries = st.session_state["groceries"]
+    st.markdown("##### Suggested for this trip")
+    columns = st.columns(min(len(suggestions), 4))
+    for i, stats in enumerate(suggestions):
+        interval = stats.interval()
+        usually = "" if interval is None \
+            else f", usually every {interval / 86400:.0f} days"
+        columns[i % len(columns)].button(
+            f"+ {stats.item}",
+            key=item_key(groceries.item_id(stats.item), "suggest"),
+            help=f"Bought {stats.count} times{usually}",
+            on_click=add_to_list, args=([stats.item],))
+
+
+def toggle_grocery(key: str, item_id: int) -> None:
+    """
+    Add or remove a grocery item from the selection when its checkbox changes.
+
+    Arguments:
+        key -- The checkbox key
+        item_id -- The ID of the grocery item of the checkbox
+
+    Returns:
+        None
+    """
+    if st.session_state[key]:
+        st.session_state["added_groceries"].add(item_id)
+    else:
+        st.session_state["added_groceries"].discard(item_id)
+
+
+def selected_groceries() -> list[str]:
+    """
+    Return the names of the selected grocery items.
+
+    Arguments:
+        None
+
+    Returns:
+        list[str] -- The selected items still in the catalog, sorted.
+    """
+    groceries = st.session_state["groceries"]
+    names = (groceries.item_of(item_id)
+             for item_id in st.session_state["added_groceries"])
+    return sorted(name for name in names if name is not None)
 
 
 def split_categories(categories: list[str] = CATEGORIES) -> tuple[list[str],
@@ -368,34 +540,32 @@ def split_categories(categories: list[str] = CATEGORIES) -> tuple[list[str],
 
 
 # Utility Functions
-def better_title(text: str) -> str:
+def item_key(item_id: int, widget: str = "item") -> str:
     """
-    Custom title function that properly handles apostrophes.
+    Return the widget key of a grocery item.
 
     Arguments:
-        text -- The text to be formatted
+        item_id -- The ID of the grocery item.
+
+    Keyword Arguments:
+        widget -- Prefix telling the widgets of one item apart,
+            default: "item"
 
     Returns:
-        str -- The formatted text
+        str -- The widget key.
 
     Example:
-        >>> better_title("sam's club")
-        "Sam's Club"
+        >>> item_key(42)
+        'item_42'
     """
-    exceptions = ["'s", "'t", "'ll", "'re", "'ve", "'m", "'d"]
-    words = text.title().split()
-
-    for i, word in enumerate(words):
-        for exception in exceptions:
-            if exception.title() in word:
-                words[i] = word.replace(exception.title(), exception)
-
-    return " ".join(words)
+    return f"{widget}_{item_id}"
 
 
 def clear_session_state() -> None:
     """
-    Clear the session state for added groceries.
+    Clear the checkboxes of the added groceries.
+
+    Only the keys of the selected items are touched.
 
     Arguments:
         None
@@ -403,11 +573,10 @@ def clear_session_state() -> None:
     Returns:
         None
     """
-    added_groceries = st.session_state["added_groceries"]
-    keys_to_clear = [key for key in st.session_state.keys() if any(
-        grocery.strip() in key for grocery in added_groceries)]
-    for key in keys_to_clear:
-        st.session_state[key] = False
+    for item_id in st.session_state["added_groceries"]:
+        key = item_key(item_id)
+        if key in st.session_state:
+            st.session_state[key] = False
 
 
 def clean_category_name(category: str) -> str:
@@ -430,8 +599,3 @@ def clean_category_name(category: str) -> str:
     category = category.replace("&", "")
     category = category.replace("--", "-")
     return category
-
-
-# Start worker threads
-
-_list_write_queue, _groceries_write_queue = _start_write_workers()
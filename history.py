@@ -0,0 +1,300 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterable
+from catalog import normalize
+from config import HISTORY_HALF_LIFE_DAYS
+from storage import StorageBackend
+
+
+def purchase_row(item: str, at: float,
+                 key: str | None = None) -> dict[str, Any]:
+    """
+    Build the stored row of a purchase.
+
+    Arguments:
+        item (str) -- Item name.
+        at (float) -- Unix time of the purchase.
+
+    Keyword Arguments:
+        key (str | None) -- Unique id of the purchase, so storing it again
+            is a no-op, default: None (stored every time)
+
+    Returns:
+        dict[str, Any] -- The item, the ISO 8601 UTC time it was bought
+            and its id.
+
+    Example:
+        >>> purchase_row("Milk", 0, "b1f3")
+        {'item': 'Milk', 'bought_at': '1970-01-01T00:00:00+00:00',
+         'purchase_id': 'b1f3'}
+    """
+    return {"item": item,
+            "bought_at": datetime.fromtimestamp(at, timezone.utc).isoformat(),
+            "purchase_id": key}
+
+
+@dataclass
+class ItemStats:
+    """
+    Aggregated purchases of one item.
+
+    Attributes:
+        item: Item name as last checked off.
+        count: Number of purchases.
+        score: Time-decayed purchase count, scaled to the reference time
+            of the history it belongs to.
+        first_bought: Unix time of the first purchase.
+        last_bought: Unix time of the latest purchase.
+    """
+    item: str
+    count: int
+    score: float
+    first_bought: float
+    last_bought: float
+
+    def interval(self) -> float | None:
+        """
+        Return the typical number of seconds between two purchases.
+
+        Arguments:
+            None
+
+        Returns:
+            float | None -- Mean reorder interval, None if bought once.
+        """
+        if self.count < 2:
+            return None
+        return (self.last_bought - self.first_bought) / (self.count - 1)
+
+    def due(self, now: float) -> bool:
+        """
+        Check whether the typical reorder interval has passed.
+
+        Arguments:
+            now (float) -- Unix time to check at.
+
+        Returns:
+            bool -- True if the item is due to be bought again.
+        """
+        interval = self.interval()
+        return interval is not None and now - self.last_bought >= interval
+
+
+class PurchaseHistory:
+    """
+    Append-only purchase history with an incrementally updated aggregate.
+
+    Every check-off is folded into per-item statistics as it happens and
+    queued for storage, where flush() appends the queued purchases in one
+    request. The history is read from storage once per process; renders
+    only read the aggregate.
+
+    Frequencies decay exponentially with a half-life. All items decay at
+    the same rate, so their order never changes with time alone and the
+    ranking is kept sorted incrementally instead of being recomputed.
+
+    Methods:
+        record(item, at) -- Record that an item was bought.
+        flush() -- Append the queued purchases to storage.
+        stats(item) -- Aggregated purchases of an item.
+        frequency(item, now) -- Decayed purchase count of an item.
+        suggest(exclude, limit) -- Most frequently bought items.
+
+    Attributes:
+        half_life: Seconds after which a purchase counts half.
+    """
+
+    def __init__(self, backend: StorageBackend,
+                 half_life_days: float = HISTORY_HALF_LIFE_DAYS) -> None:
+        """
+        Initialize the history, it is read from storage on first use.
+
+        Arguments:
+            backend (StorageBackend) -- Storage for the purchases.
+
+        Keyword Arguments:
+            half_life_days (float) -- Days after which a purchase counts
+                half, default: HISTORY_HALF_LIFE_DAYS
+
+        Returns:
+            None
+
+        Example:
+            >>> history = PurchaseHistory(get_backend())
+        """
+        self.backend = backend
+        self.half_life = half_life_days * 86400
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Scores are stored as weights relative to this time
+        self._reference = time.time()
+        # Normalized name -> statistics
+        self._stats: dict[str, ItemStats] = {}
+        # (-score, normalized name), highest score first
+        self._ranking: list[tuple[float, str]] = []
+        self._queued: list[dict[str, Any]] = []
+        # Ids of the purchases folded in, so a replayed one counts once
+        self._keys: set[str] = set()
+
+    def _weight(self, at: float) -> float:
+        return 2.0 ** ((at - self._reference) / self.half_life)
+
+    def _fold(self, item: str, at: float) -> None:
+        """
+        Add one purchase to the aggregate. The lock must be held.
+
+        Arguments:
+            item (str) -- Item name.
+            at (float) -- Unix time of the purchase.
+
+        Returns:
+            None
+        """
+        key = normalize(item)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ItemStats(item, 0, 0.0, at, at)
+        else:
+            del self._ranking[bisect_left(self._ranking,
+                                          (-stats.score, key))]
+        stats.item = item
+        stats.count += 1
+        stats.score += self._weight(at)
+        stats.first_bought = min(stats.first_bought, at)
+        stats.last_bought = max(stats.last_bought, at)
+        insort(self._ranking, (-stats.score, key))
+
+    def _ensure_loaded(self) -> None:
+        # Read the stored history once, the lock must be held
+        if self._loaded:
+            return
+        for row in self.backend.read_history():
+            if row.get("purchase_id"):
+                self._keys.add(row["purchase_id"])
+            bought_at = datetime.fromisoformat(row["bought_at"])
+            self._fold(row["item"], bought_at.timestamp())
+        self._loaded = True
+
+    def record(self, item: str, at: float | None = None,
+               store: bool = True, key: str | None = None) -> None:
+        """
+        Record that an item was bought.
+
+        A purchase whose key was recorded before, such as one replayed
+        from the journal after it was stored, is ignored.
+
+        Arguments:
+            item (str) -- Item name.
+
+        Keyword Arguments:
+            at (float | None) -- Unix time of the purchase,
+                default: None (now)
+            store (bool) -- Queue the purchase for flush(), False when
+                it is stored by someone else, default: True
+            key (str | None) -- Unique id of the purchase, default: None
+
+        Returns:
+            None
+        """
+        at = time.time() if at is None else at
+        with self._lock:
+            self._ensure_loaded()
+            if key is not None:
+                if key in self._keys:
+                    return
+                self._keys.add(key)
+            self._fold(item, at)
+            if store:
+                self._queued.append(purchase_row(item, at, key))
+
+    def flush(self) -> int:
+        """
+        Append the queued purchases to storage in one request.
+
+        Purchases stay queued if the request fails.
+
+        Arguments:
+            None
+
+        Returns:
+            int -- Number of purchases written.
+        """
+        with self._lock:
+            entries, self._queued = self._queued, []
+        if not entries:
+            return 0
+        try:
+            self.backend.append_history(entries)
+        except Exception:
+            with self._lock:
+                self._queued[:0] = entries
+            raise
+        return len(entries)
+
+    def stats(self, item: str) -> ItemStats | None:
+        """
+        Return the aggregated purchases of an item.
+
+        Arguments:
+            item (str) -- Item name, in any case or spacing.
+
+        Returns:
+            ItemStats | None -- The statistics, None if never bought.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._stats.get(normalize(item))
+
+    def frequency(self, item: str, now: float | None = None) -> float:
+        """
+        Return the decayed purchase count of an item.
+
+        Arguments:
+            item (str) -- Item name, in any case or spacing.
+
+        Keyword Arguments:
+            now (float | None) -- Unix time to decay to,
+                default: None (now)
+
+        Returns:
+            float -- Purchases weighted by age, 0.0 if never bought.
+        """
+        stats = self.stats(item)
+        if stats is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return stats.score / self._weight(now)
+
+    def suggest(self, exclude: Iterable[str] = (),
+                limit: int = 8) -> list[ItemStats]:
+        """
+        Return the most frequently bought items.
+
+        Walks the precomputed ranking, so the cost depends on limit and
+        the number of excluded items, not on the size of the history.
+
+        Keyword Arguments:
+            exclude (Iterable[str]) -- Item names to leave out, such as
+                those already on the list, default: ()
+            limit (int) -- Maximum number of items, default: 8
+
+        Returns:
+            list[ItemStats] -- Statistics of the items, most frequent first.
+
+        Example:
+            >>> [stats.item for stats in history.suggest(["Milk"], 2)]
+            ['Bread', 'Eggs']
+        """
+        skip = {normalize(item) for item in exclude}
+        suggestions = []
+        with self._lock:
+            self._ensure_loaded()
+            for _, key in self._ranking:
+                if len(suggestions) == limit:
+                    break
+                if key not in skip:
+                    suggestions.append(self._stats[key])
+        return suggestions
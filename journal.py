@@ -0,0 +1,412 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, TextIO
+from config import JOURNAL_COMMIT_WINDOW_SECONDS, JOURNAL_COMPACT_BYTES
+from logger_config import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows, where one process uses the journal
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+class Journal:
+    """
+    Local append-only write-ahead journal for changes not yet in storage.
+
+    Every change is appended as one JSON line before it is acknowledged.
+    Appending only buffers the line; commit() waits until it is on disk.
+    Commits are grouped: one caller fsyncs everything buffered so far
+    while the others wait for it, so concurrent changes share a single
+    fsync. Once storage confirms a target's changes up to a sequence
+    number, a confirmation line is written (without fsync) and the file
+    is truncated as soon as nothing is left unconfirmed, or rewritten with
+    only the unconfirmed entries when it grows past compact_bytes.
+
+    Each process owns its journal file through an exclusive lock on a
+    ".lock" file next to it. The first process takes the path itself; a
+    process that finds it locked takes the first free of path.1, path.2
+    and so on, so processes sharing a working directory never replay or
+    truncate each other's entries.
+
+    On open, the entries of an earlier process that were never confirmed
+    are kept for replay(), both from the file taken and from any other
+    journal file of the path that no running process holds. Those are
+    moved into the file taken and removed. A torn line left by a crash
+    ends the journal. A lost confirmation only means an entry is replayed
+    twice, so journaled changes must be safe to apply again.
+
+    Methods:
+        replay() -- Unconfirmed entries found when the journal was opened.
+        append(target, data) -- Buffer an entry, returning its sequence.
+        commit(seq) -- Wait until an entry is on disk.
+        confirm(target, seq) -- Drop a target's entries up to seq.
+        pending() -- Number of unconfirmed entries.
+        entries(target) -- Data of a target's unconfirmed entries.
+        close() -- Close the file.
+
+    Attributes:
+        path: Journal file taken, None to keep entries in memory only.
+        commit_window: Seconds a committer waits for others to join.
+        compact_bytes: File size above which it is rewritten.
+        syncs: Number of fsyncs made.
+    """
+
+    def __init__(self, path: str | None,
+                 commit_window: float = JOURNAL_COMMIT_WINDOW_SECONDS,
+                 compact_bytes: int = JOURNAL_COMPACT_BYTES) -> None:
+        """
+        Open the journal and read the entries left by earlier processes.
+
+        Arguments:
+            path (str | None) -- Journal file, None to keep entries in
+                memory only. If another process holds it, the first free
+                numbered file next to it is taken instead.
+
+        Keyword Arguments:
+            commit_window (float) -- Seconds a committer waits for others
+                to join its fsync, default: JOURNAL_COMMIT_WINDOW_SECONDS
+            compact_bytes (int) -- File size above which it is rewritten,
+                default: JOURNAL_COMPACT_BYTES
+
+        Returns:
+            None
+
+        Example:
+            >>> journal = Journal("write_journal.jsonl")
+        """
+        self.path = path
+        self.commit_window = commit_window
+        self.compact_bytes = compact_bytes
+        self.syncs = 0
+        self._cond = threading.Condition()
+        # Sequence number -> (target, data) of unconfirmed entries
+        self._entries: dict[int, tuple[str, Any]] = {}
+        self._seq = 0
+        self._synced = 0
+        self._syncing = False
+        self._size = 0
+        self._file: TextIO | None = None
+        self._lock: TextIO | None = None
+        if path is not None:
+            self.path, self._lock = self._claim(path)
+            self._entries, self._seq = self._read(self.path)
+            orphans = self._orphans(path)
+            try:
+                for orphan, _ in orphans:
+                    for target, data in self._read(orphan)[0].values():
+                        self._seq += 1
+                        self._entries[self._seq] = (target, data)
+                self._synced = self._seq
+                self._rewrite()
+                # Only once their entries are durable in this journal
+                for orphan, _ in orphans:
+                    os.remove(orphan)
+            finally:
+                for _, lock in orphans:
+                    lock.close()
+        self._recovered = [(seq, target, data)
+                           for seq, (target, data) in self._entries.items()]
+        if self._recovered:
+            logger.info("Journal has %d unconfirmed entries to replay",
+                        len(self._recovered))
+
+    @staticmethod
+    def _try_lock(path: str) -> TextIO | None:
+        """
+        Take the exclusive lock of a journal file without waiting.
+
+        Arguments:
+            path (str) -- Journal file.
+
+        Returns:
+            TextIO | None -- The open lock file holding the lock, None if
+                another process holds it.
+        """
+        lock = open(f"{path}.lock", "a", encoding="utf-8")
+        if fcntl is None:
+            return lock
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    def _claim(self, path: str) -> tuple[str, TextIO]:
+        """
+        Take the first journal file of a path no other process holds.
+
+        Arguments:
+            path (str) -- Configured journal file.
+
+        Returns:
+            tuple[str, TextIO] -- The file taken and its held lock file.
+        """
+        slot = 0
+        while True:
+            candidate = path if slot == 0 else f"{path}.{slot}"
+            lock = self._try_lock(candidate)
+            if lock is not None:
+                if slot:
+                    logger.info("Journal %s is in use, writing to %s",
+                                path, candidate)
+                return candidate, lock
+            slot += 1
+
+    def _orphans(self, path: str) -> list[tuple[str, TextIO]]:
+        """
+        Lock the journal files of a path that no running process holds.
+
+        Arguments:
+            path (str) -- Configured journal file.
+
+        Returns:
+            list[tuple[str, TextIO]] -- Each orphaned file and its held
+                lock file, excluding the file taken.
+        """
+        directory = os.path.dirname(path) or "."
+        pattern = re.compile(re.escape(os.path.basename(path)) + r"(\.\d+)?")
+        orphans = []
+        for name in sorted(os.listdir(directory)):
+            orphan = os.path.join(os.path.dirname(path), name)
+            if not pattern.fullmatch(name) or orphan == self.path:
+                continue
+            lock = self._try_lock(orphan)
+            if lock is not None:
+                orphans.append((orphan, lock))
+        return orphans
+
+    @classmethod
+    def _read(cls, path: str) -> tuple[dict[int, tuple[str, Any]], int]:
+        """
+        Load the unconfirmed entries of a journal file.
+
+        Arguments:
+            path (str) -- Journal file.
+
+        Returns:
+            tuple[dict[int, tuple[str, Any]], int] -- Target and data of
+                each unconfirmed entry by sequence number, and the last
+                sequence number in the file.
+        """
+        entries: dict[int, tuple[str, Any]] = {}
+        last = 0
+        if not os.path.exists(path):
+            return entries, last
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Journal ends in a torn entry, ignored")
+                    break
+                last = max(last, record["seq"])
+                if "confirm" in record:
+                    cls._drop(entries, record["confirm"], record["upto"])
+                else:
+                    entries[record["seq"]] = (record["target"],
+                                              record["data"])
+        return entries, last
+
+    def _rewrite(self) -> None:
+        """
+        Replace the file with one holding only the unconfirmed entries.
+        The lock must be held, or the journal not yet shared.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        if self._file is not None:
+            self._file.close()
+        temp = f"{self.path}.tmp"
+        self._size = 0
+        with open(temp, "w", encoding="utf-8") as file:
+            for seq, (target, data) in self._entries.items():
+                self._size += file.write(self._line({
+                    "seq": seq, "target": target, "data": data}))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.path)
+        self._sync_directory()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _sync_directory(self) -> None:
+        # Makes the rename durable, where the platform allows it
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)),
+                         os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _line(record: dict[str, Any]) -> str:
+        return json.dumps(record, separators=(",", ":")) + "\n"
+
+    @staticmethod
+    def _drop(entries: dict[int, tuple[str, Any]], target: str,
+              upto: int) -> None:
+        # Forget a target's entries up to a sequence number
+        for seq in [seq for seq, (name, _) in entries.items()
+                    if name == target and seq <= upto]:
+            del entries[seq]
+
+    def replay(self) -> list[tuple[int, str, Any]]:
+        """
+        Return the unconfirmed entries found when the journal was opened.
+
+        Arguments:
+            None
+
+        Returns:
+            list[tuple[int, str, Any]] -- Sequence number, target and data
+                of each entry, oldest first.
+        """
+        return list(self._recovered)
+
+    def append(self, target: str, data: Any) -> int:
+        """
+        Buffer an entry for a target. Call commit() before acknowledging it.
+
+        Arguments:
+            target (str) -- Name of the target, e.g. "list".
+            data (Any) -- JSON-serializable change.
+
+        Returns:
+            int -- Sequence number of the entry.
+
+        Example:
+            >>> journal.commit(journal.append("list", ops))
+        """
+        with self._cond:
+            self._seq += 1
+            seq = self._seq
+            self._entries[seq] = (target, data)
+            if self._file is not None:
+                self._size += self._file.write(self._line({
+                    "seq": seq, "target": target, "data": data}))
+        return seq
+
+    def commit(self, seq: int) -> None:
+        """
+        Wait until an entry and all entries before it are on disk.
+
+        Arguments:
+            seq (int) -- Sequence number returned by append().
+
+        Returns:
+            None
+
+        Raises:
+            OSError -- If the journal cannot be synced.
+        """
+        if self.path is None:
+            return
+        while True:
+            with self._cond:
+                while self._syncing and self._synced < seq:
+                    self._cond.wait()
+                if self._synced >= seq:
+                    return
+                self._syncing = True
+            synced = None
+            try:
+                if self.commit_window:
+                    time.sleep(self.commit_window)
+                with self._cond:
+                    self._file.flush()
+                    synced, fd = self._seq, self._file.fileno()
+                os.fsync(fd)
+                self.syncs += 1
+            finally:
+                with self._cond:
+                    if synced is not None:
+                        self._synced = max(self._synced, synced)
+                    self._syncing = False
+                    self._cond.notify_all()
+
+    def confirm(self, target: str, seq: int) -> None:
+        """
+        Drop a target's entries up to seq, once storage has them.
+
+        Arguments:
+            target (str) -- Name of the target.
+            seq (int) -- Newest sequence number storage confirmed.
+
+        Returns:
+            None
+        """
+        with self._cond:
+            self._drop(self._entries, target, seq)
+            if self._file is None:
+                return
+            if not self._entries:
+                self._file.flush()
+                self._file.truncate(0)
+                self._size = 0
+            # Not while a committer is syncing the current file
+            elif self._size > self.compact_bytes and not self._syncing:
+                self._rewrite()
+            else:
+                self._size += self._file.write(self._line({
+                    "seq": seq, "confirm": target, "upto": seq}))
+                self._file.flush()
+
+    def pending(self) -> int:
+        """
+        Return the number of entries storage has not confirmed.
+
+        Arguments:
+            None
+
+        Returns:
+            int -- Unconfirmed entries.
+        """
+        with self._cond:
+            return len(self._entries)
+
+    def entries(self, target: str) -> list[Any]:
+        """
+        Return the data of a target's unconfirmed entries.
+
+        Arguments:
+            target (str) -- Name of the target.
+
+        Returns:
+            list[Any] -- The data of each entry, oldest first.
+        """
+        with self._cond:
+            return [data for name, data in self._entries.values()
+                    if name == target]
+
+    def close(self) -> None:
+        """
+        Close the journal file and release it to other processes.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._cond:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock is not None:
+                self._lock.close()
+                self._lock = None
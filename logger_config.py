@@ -1,36 +1,77 @@
 import logging
+import threading
+import time
+import zlib
+from collections import deque
 from datetime import datetime
-from supabase import Client
-from database import supabase
+from typing import Any
+from config import (LOG_BATCH_SIZE, LOG_BUFFER_CAPACITY, LOG_DEDUP_SECONDS,
+                    LOG_FLUSH_INTERVAL_SECONDS, LOG_LEVELS, LOG_RATE_BURST,
+                    LOG_RATE_PER_SECOND)
+from database import get_log_backend
+from storage import StorageBackend
 
 
-class SupabaseHandler(logging.Handler):
+class StorageHandler(logging.Handler):
     """
-    Custom logging handler that writes logs to Supabase.
+    Custom logging handler that writes logs to the storage backend.
+
+    Records are formatted on the calling thread and appended to a bounded
+    in-memory buffer. A daemon thread drains the buffer as multi-row
+    inserts whenever batch_size records are waiting or flush_interval
+    seconds have passed, so logging never blocks on the network. The
+    thread is started, and the backend created, by the first record.
+
+    Overflow policy: when the buffer is full the oldest record is dropped.
+    The number of dropped records is written as a WARNING entry with the
+    next batch. Remaining records are flushed by logging.shutdown() when
+    the interpreter exits.
 
     Methods:
-        emit(record) -- Writes the log record to Supabase.
+        emit(record) -- Buffers the log record.
         format(record) -- Formats the log record.
+        flush() -- Writes all buffered records now.
+        close() -- Flushes and stops the background thread.
 
     Attributes:
-        supabase: Supabase client instance.
+        backend: Storage backend instance, None until first needed.
+        dropped: Number of records dropped because the buffer was full.
     """
 
-    def __init__(self, supabase_client: Client) -> None:
+    def __init__(self, storage_backend: StorageBackend | None = None,
+                 capacity: int = LOG_BUFFER_CAPACITY,
+                 batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS) -> None:
         """
-        Initialize the SupabaseHandler with a Supabase client instance.
+        Initialize the StorageHandler with a storage backend.
 
-        Arguments:
-            supabase_client (Client) -- Supabase client instance.
+        Keyword Arguments:
+            storage_backend (StorageBackend | None) -- Storage backend
+                instance, default: None (database.get_log_backend() on first
+                use)
+            capacity (int) -- Maximum buffered records,
+                default: LOG_BUFFER_CAPACITY
+            batch_size (int) -- Records per insert, default: LOG_BATCH_SIZE
+            flush_interval (float) -- Seconds between flushes,
+                default: LOG_FLUSH_INTERVAL_SECONDS
 
         Returns:
             None
 
         Example:
-            >>> supabase_handler = SupabaseHandler(supabase_client)
+            >>> storage_handler = StorageHandler()
         """
         super().__init__()
-        self.supabase = supabase_client
+        self.backend = storage_backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer: deque[dict] = deque()
+        self._capacity = capacity
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._thread: threading.Thread | None = None
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -46,7 +87,7 @@ class SupabaseHandler(logging.Handler):
 
     def emit(self, record):
         """
-        Write the log record to Supabase.
+        Append the log record to the buffer without blocking.
 
         Arguments:
             record (logging.LogRecord) -- Log record to be written.
@@ -63,22 +104,322 @@ class SupabaseHandler(logging.Handler):
                 'line_no': record.lineno,
                 'module': record.module
             }
-            self.supabase.table('log_entries').insert(log_entry).execute()
+            with self._cond:
+                if self._thread is None and not self._closed:
+                    self._thread = threading.Thread(
+                        target=self._run, name="storage-log-handler",
+                        daemon=True)
+                    self._thread.start()
+                if len(self._buffer) >= self._capacity:
+                    self._buffer.popleft()
+                    self.dropped += 1
+                self._buffer.append(log_entry)
+                if len(self._buffer) >= self.batch_size:
+                    self._cond.notify()
         except Exception as e:
-            print(f"Failed to write log to Supabase: {e}")
+            print(f"Failed to buffer log for storage: {e}")
+
+    def _take(self) -> list[dict]:
+        """
+        Remove all buffered records, adding a dropped-count entry if needed.
+
+        Arguments:
+            None
+
+        Returns:
+            list[dict] -- The log entries to insert.
+        """
+        with self._cond:
+            entries = list(self._buffer)
+            self._buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            entries.insert(0, {
+                'timestamp': datetime.now().isoformat(),
+                'level': 'WARNING',
+                'message': f"Dropped {dropped} log records, buffer full",
+                'function': '_take',
+                'line_no': 0,
+                'module': __name__
+            })
+        return entries
+
+    def _send(self, entries: list[dict]) -> None:
+        """
+        Insert log entries in batches of batch_size rows.
+
+        Arguments:
+            entries (list[dict]) -- The log entries to insert.
+
+        Returns:
+            None
+        """
+        with self._send_lock:
+            if self.backend is None:
+                try:
+                    self.backend = get_log_backend()
+                except Exception as e:
+                    print(f"Failed to create storage backend for logs: {e}")
+                    return
+            for i in range(0, len(entries), self.batch_size):
+                try:
+                    self.backend.insert_logs(entries[i:i + self.batch_size])
+                except Exception as e:
+                    print(f"Failed to write logs to storage: {e}")
+                    self._restore(entries[i:])
+                    return
+
+    def _restore(self, entries: list[dict]) -> None:
+        """
+        Put unsent entries back in front of the buffer for the next flush.
+
+        Entries beyond the buffer capacity are counted as dropped.
+
+        Arguments:
+            entries (list[dict]) -- The log entries that were not sent.
+
+        Returns:
+            None
+        """
+        with self._cond:
+            room = max(self._capacity - len(self._buffer), 0)
+            kept = entries[-room:] if room else []
+            self.dropped += len(entries) - len(kept)
+            self._buffer.extendleft(reversed(kept))
+
+    def _run(self) -> None:
+        """
+        Background loop that drains the buffer by size or interval.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            entries = self._take()
+            if entries:
+                self._send(entries)
+
+    def flush(self) -> None:
+        """
+        Write all buffered records to storage on the calling thread.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        entries = self._take()
+        if entries:
+            self._send(entries)
+
+    def close(self) -> None:
+        """
+        Stop the background thread and flush the remaining records.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.flush()
+        super().close()
+
+
+class PayloadSummary:
+    """
+    Log argument that stands for a list or catalog by its size and a
+    checksum. The summary is only computed if the record is emitted.
+    """
+
+    def __init__(self, payload: Any) -> None:
+        self.payload = payload
+
+    def __str__(self) -> str:
+        payload = self.payload
+        if isinstance(payload, dict):
+            items = [f"{key}:{item}" for key, values in payload.items()
+                     for item in values]
+            size = f"{len(payload)} categories, {len(items)} items"
+        elif isinstance(payload, (list, tuple, set, frozenset)):
+            items = [str(item) for item in payload]
+            size = f"{len(items)} items"
+        else:
+            return f"<{type(payload).__name__}>"
+        checksum = zlib.crc32("\n".join(items).encode())
+        return f"{size} #{checksum:08x}"
+
+
+def summarize(payload: Any) -> PayloadSummary:
+    """
+    Return a lazy summary of a payload to log instead of the payload.
+
+    Arguments:
+        payload -- A grocery list, catalog dictionary or other object.
+
+    Returns:
+        PayloadSummary -- Formats as the size and a CRC-32 checksum.
+
+    Example:
+        >>> logger.info("Writing list: %s", summarize(["Milk", "Eggs"]))
+        INFO:functions:Writing list: 2 items #6007228b
+    """
+    return PayloadSummary(payload)
+
+
+class LogPolicy(logging.Filter):
+    """
+    Logging filter that rate limits messages and deduplicates warnings.
+
+    Rate limit: every message template of a logger has a token bucket of
+    burst records that refills at rate records per second. Records beyond
+    it are dropped and counted, and the next one that passes reports how
+    many were suppressed.
+
+    Deduplication: a WARNING or higher record with the same text as one
+    passed less than dedup_seconds ago is dropped and counted. The first
+    one after the window reports how often it repeated.
+
+    Attributes:
+        rate: Records per second each template may log on average.
+        burst: Records a template may log at once.
+        dedup_seconds: Window in which repeated warnings are dropped.
+    """
+
+    def __init__(self, rate: float = LOG_RATE_PER_SECOND,
+                 burst: int = LOG_RATE_BURST,
+                 dedup_seconds: float = LOG_DEDUP_SECONDS) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.dedup_seconds = dedup_seconds
+        self._lock = threading.Lock()
+        # Template -> [tokens, last refill time, suppressed records]
+        self._buckets: dict[Any, list] = {}
+        # Message text -> [time it was last passed, repeats since]
+        self._seen: dict[str, list] = {}
+
+    def _notes(self, record: logging.LogRecord, suppressed: int,
+               repeated: int) -> None:
+        # Appends the counts to the message, formatting it now
+        notes = []
+        if repeated:
+            notes.append(f"repeated {repeated} times in the last "
+                         f"{self.dedup_seconds:g}s")
+        if suppressed:
+            notes.append(f"{suppressed} similar messages suppressed")
+        if notes:
+            record.msg = f"{record.getMessage()} ({', '.join(notes)})"
+            record.args = None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Decide whether a record is logged.
+
+        Arguments:
+            record (logging.LogRecord) -- The record.
+
+        Returns:
+            bool -- False to drop the record.
+        """
+        now = time.monotonic()
+        repeated = 0
+        with self._lock:
+            if record.levelno >= logging.WARNING and self.dedup_seconds:
+                text = record.getMessage()
+                seen = self._seen.get(text)
+                if seen is not None and now - seen[0] < self.dedup_seconds:
+                    seen[1] += 1
+                    return False
+                repeated = seen[1] if seen is not None else 0
+                if len(self._seen) > 1000:
+                    self._seen = {key: value for key, value
+                                  in self._seen.items()
+                                  if now - value[0] < self.dedup_seconds}
+                self._seen[text] = [now, 0]
+            if record.msg not in self._buckets and len(self._buckets) > 1000:
+                # Forget idle templates, their buckets would be full
+                self._buckets = {key: value for key, value
+                                 in self._buckets.items() if value[2]}
+            bucket = self._buckets.setdefault(record.msg,
+                                              [self.burst, now, 0])
+            bucket[0] = min(self.burst,
+                            bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        self._notes(record, suppressed, repeated)
+        return True
 
 
 # Configure root logger
 logging.basicConfig(level=logging.INFO)
 root_logger = logging.getLogger()
 
-# Add Supabase handler to the root logger
-supabase_handler = SupabaseHandler(supabase)
-supabase_handler.setLevel(logging.ERROR)
-root_logger.addHandler(supabase_handler)
+# Add storage handler to the root logger, it connects on the first error
+storage_handler = StorageHandler()
+storage_handler.setLevel(logging.ERROR)
+root_logger.addHandler(storage_handler)
 
 # Function to get logger for each module
 
 
-def get_logger(name: str) -> logging.Logger:
-    return logging.getLogger(name)
+def get_logger(name: str, level: int | str | None = None,
+               rate: float | None = None, burst: int | None = None,
+               dedup_seconds: float | None = None) -> logging.Logger:
+    """
+    Get the logger of a module with the logging policy applied.
+
+    Arguments for a module that are not given keep their earlier value,
+    or come from config: its level from LOG_LEVELS, the rest from
+    LOG_RATE_PER_SECOND, LOG_RATE_BURST and LOG_DEDUP_SECONDS.
+
+    Arguments:
+        name (str) -- Logger name, usually __name__.
+
+    Keyword Arguments:
+        level (int | str | None) -- Minimum level, default: None
+        rate (float | None) -- Records per second per message template,
+            default: None
+        burst (int | None) -- Records a template may log at once,
+            default: None
+        dedup_seconds (float | None) -- Window in which repeated warnings
+            are dropped, 0 to disable, default: None
+
+    Returns:
+        logging.Logger -- The module's logger.
+
+    Example:
+        >>> logger = get_logger(__name__, rate=0.2, burst=5)
+    """
+    logger = logging.getLogger(name)
+    level = level if level is not None else LOG_LEVELS.get(name)
+    if level is not None:
+        logger.setLevel(level)
+    policy = next((log_filter for log_filter in logger.filters
+                   if isinstance(log_filter, LogPolicy)), None)
+    if policy is None:
+        policy = LogPolicy()
+        logger.addFilter(policy)
+    if rate is not None:
+        policy.rate = rate
+    if burst is not None:
+        policy.burst = burst
+    if dedup_seconds is not None:
+        policy.dedup_seconds = dedup_seconds
+    return logger
@@ -1,3 +1,4 @@
+import time
 import streamlit as st
 import functions
 from typing import Literal
@@ -8,6 +9,9 @@ from styles import MOBILE_STYLES
 
 logger = get_logger(__name__)
 
+# Start of this rerun, recorded in the metrics at the end of the script
+run_start = time.perf_counter()
+
 
 # Set the page title, icon, and layout
 st.set_page_config(page_title="Grocery List", page_icon="🛒", layout="wide")
@@ -18,15 +22,21 @@ st.markdown('<div id="top" style="position: relative; \
             unsafe_allow_html=True)
 
 
+# Serve the metrics endpoint and the JSON API if a port is configured
+functions.start_metrics_server()
+functions.start_api_server()
+
 # Initialize data on app start
 if "expander_state" not in st.session_state:
     st.session_state["expander_state"] = False
-if "grocery_list" not in st.session_state:
-    st.session_state["grocery_list"] = functions.get_list()
-if "groceries" not in st.session_state:
-    st.session_state["groceries"] = functions.get_groceries()
+# The list and groceries are snapshots shared by all sessions, refreshed on
+# every rerun. A session only owns its selection.
+functions.load_documents()
+# Reruns this session when another session or process changes them
+functions.watch_changes()
+# IDs of the checked catalog items
 if "added_groceries" not in st.session_state:
-    st.session_state["added_groceries"] = []
+    st.session_state["added_groceries"] = set()
 categories_col1, categories_col2, categories_col3 = \
     functions.split_categories(st.session_state["groceries"])
 
@@ -52,32 +62,23 @@ def update_groceries(mode: Literal["list", "groceries"],
         None
     """
     try:
-        grocery_list = st.session_state["grocery_list"]
-        added_groceries = st.session_state["added_groceries"]
-
         if mode == "list":
             if remove:
-                st.session_state["grocery_list"].remove(item)
-                functions.background_write_list()
+                functions.check_off(item)
             else:
-                for grocery in added_groceries:
-                    if grocery not in grocery_list:
-                        st.session_state["grocery_list"].append(
-                            grocery.title())
-                functions.background_write_list()
+                functions.add_to_list(functions.selected_groceries())
                 functions.clear_session_state()
                 st.session_state["added_groceries"].clear()
 
         elif mode == "groceries":
             if remove:
+                functions.clear_session_state()
                 functions.remove_groceries()
-                functions.background_write_groceries()
             else:
                 functions.process_grocery_input()
-                functions.background_write_groceries()
 
     except Exception as e:
-        logger.error(f"Error in update_groceries: {e}")
+        logger.error("Error in update_groceries: %s", e)
         st.error(f"Error in update_groceries: {str(e)}")
 
 
@@ -101,30 +102,38 @@ with st.expander(label="Add grocery item",
                                       on_change=update_groceries,
                                       args=("groceries", False))  # noqa
 
-    # Links to navigate the categories
-    index_links = " | ".join([
-        f"[{category}](#{functions.clean_category_name(category)})"
-        for category in CATEGORIES])
-    st.markdown(index_links)
+    # Search box, shows only the matching items instead of the full grid
+    search_query = st.text_input(label="Search",
+                                 placeholder="Search groceries",
+                                 key="search_query")
 
     # Add custom CSS for mobile-friendly layout
     st.markdown(MOBILE_STYLES, unsafe_allow_html=True)
 
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        # Show the first third of the default grocery list with checkboxes
-        for category in categories_col1:
-            functions.display_grocery_category(category)
-
-    with col2:
-        # Show the second third of the default grocery list with checkboxes
-        for category in categories_col2:
-            functions.display_grocery_category(category)
-
-    with col3:
-        # Show the last third of the default grocery list with checkboxes
-        for category in categories_col3:
-            functions.display_grocery_category(category)
+    if search_query:
+        functions.display_search_results(search_query)
+    else:
+        # Links to navigate the categories
+        index_links = " | ".join([
+            f"[{category}](#{functions.clean_category_name(category)})"
+            for category in CATEGORIES])
+        st.markdown(index_links)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            # Show the first third of the default grocery list with checkboxes
+            for category in categories_col1:
+                functions.display_grocery_category(category)
+
+        with col2:
+            # Show the second third of the default grocery list with checkboxes
+            for category in categories_col2:
+                functions.display_grocery_category(category)
+
+        with col3:
+            # Show the last third of the default grocery list with checkboxes
+            for category in categories_col3:
+                functions.display_grocery_category(category)
 
     col4, col5 = st.columns([0.01, 0.01])
     with col4:
@@ -139,9 +148,16 @@ with st.expander(label="Add grocery item",
 # Display the grocery list
 st.title("Groceries")
 
+functions.display_suggestions()
+
+groceries = st.session_state["groceries"]
 for grocery in st.session_state["grocery_list"]:
-    checkbox = st.checkbox(grocery, key=grocery)
+    checkbox = st.checkbox(grocery, key=functions.item_key(
+        groceries.item_id(grocery), "list"))
     if checkbox:
         st.session_state["expander_state"] = False
         update_groceries("list", True, grocery)
+        functions.record_script_run(time.perf_counter() - run_start)
         st.rerun()
+
+functions.record_script_run(time.perf_counter() - run_start)
@@ -0,0 +1,234 @@
+import threading
+from collections import Counter
+from copy import deepcopy
+from typing import Any
+
+
+class MemoryResponse:
+    """
+    Minimal stand-in for a postgrest API response.
+
+    Attributes:
+        data: List of rows returned by the query.
+    """
+
+    def __init__(self, data: list[dict[str, Any]]) -> None:
+        self.data = data
+
+
+class MemoryQuery:
+    """
+    Chainable query against one in-memory table.
+
+    Supports the subset of the supabase-py query builder used by this app:
+    select, insert, upsert, update and delete, filtered with eq, in_, gt,
+    gte, lt and lte, and shaped with order and limit.
+    """
+
+    def __init__(self, client: "MemoryClient", table: str) -> None:
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._payload: Any = None
+        self._filters: list[tuple[str, str, Any]] = []
+        self._order: tuple[str, bool] | None = None
+        self._limit: int | None = None
+        self._on_conflict = ""
+        self._ignore_duplicates = False
+
+    def select(self, columns: str = "*") -> "MemoryQuery":
+        self._action = "select"
+        return self
+
+    def insert(self, rows: dict | list[dict]) -> "MemoryQuery":
+        self._action, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows: dict | list[dict], on_conflict: str = "",
+               ignore_duplicates: bool = False) -> "MemoryQuery":
+        self._action, self._payload = "upsert", rows
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: dict) -> "MemoryQuery":
+        self._action, self._payload = "update", values
+        return self
+
+    def delete(self) -> "MemoryQuery":
+        self._action = "delete"
+        return self
+
+    def eq(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append((column, "eq", value))
+        return self
+
+    def gt(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append((column, "gt", value))
+        return self
+
+    def gte(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append((column, "gte", value))
+        return self
+
+    def lt(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append((column, "lt", value))
+        return self
+
+    def lte(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append((column, "lte", value))
+        return self
+
+    def in_(self, column: str, values: list[Any]) -> "MemoryQuery":
+        self._filters.append((column, "in", values))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "MemoryQuery":
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int) -> "MemoryQuery":
+        self._limit = count
+        return self
+
+    def _matches(self, row: dict[str, Any]) -> bool:
+        for column, op, value in self._filters:
+            current = row.get(column)
+            if op == "eq" and not current == value:
+                return False
+            if op == "in" and current not in value:
+                return False
+            if op != "eq" and current is None:
+                return False
+            if op == "gt" and not current > value:
+                return False
+            if op == "gte" and not current >= value:
+                return False
+            if op == "lt" and not current < value:
+                return False
+            if op == "lte" and not current <= value:
+                return False
+        return True
+
+    def execute(self) -> MemoryResponse:
+        """
+        Run the query against the client's tables.
+
+        Arguments:
+            None
+
+        Returns:
+            MemoryResponse -- Deep copies of the affected or selected rows.
+        """
+        return self._client._execute(self)
+
+
+class MemoryClient:
+    """
+    In-process stand-in for the Supabase client, for tests and benchmarks.
+
+    Tables are lists of dict rows created on first use. Rows without a
+    primary key get the next integer key, like a serial column.
+
+    Methods:
+        table(name) -- Start a query against a table.
+        rows(name) -- Copy of all rows in a table.
+
+    Attributes:
+        calls: Counter of executed queries by (table, action).
+    """
+
+    def __init__(self, primary_keys: dict[str, str] | None = None,
+                 bus: Any = None) -> None:
+        """
+        Initialize an empty set of tables.
+
+        Keyword Arguments:
+            primary_keys (dict[str, str] | None) -- Primary key column per
+                table, default: None ("id" for every table)
+            bus (Any) -- LocalBus receiving every inserted row, like
+                Supabase realtime events, default: None
+
+        Returns:
+            None
+
+        Example:
+            >>> client = MemoryClient({"grocery_ops": "seq"})
+        """
+        self._primary_keys = primary_keys or {}
+        self._tables: dict[str, list[dict[str, Any]]] = {}
+        self._next_key: Counter = Counter()
+        self._lock = threading.Lock()
+        self._bus = bus
+        self.calls: Counter = Counter()
+
+    def table(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    def rows(self, name: str) -> list[dict[str, Any]]:
+        with self._lock:
+            return deepcopy(self._tables.get(name, []))
+
+    def _store(self, table: str, row: dict[str, Any], replace: bool,
+               ignore: bool = False, on_conflict: str = ""
+               ) -> dict[str, Any] | None:
+        key = self._primary_keys.get(table, "id")
+        rows = self._tables.setdefault(table, [])
+        row = deepcopy(row)
+        if row.get(key) is None:
+            self._next_key[table] += 1
+            row[key] = self._next_key[table]
+        else:
+            self._next_key[table] = max(self._next_key[table], row[key])
+        # A unique column conflicts like the primary key, except on NULL
+        match = on_conflict or key
+        for i, existing in enumerate(rows):
+            if row.get(match) is not None \
+                    and existing.get(match) == row[match]:
+                if ignore:
+                    return None
+                if not replace:
+                    raise ValueError(f"Duplicate key {row[key]} in {table}")
+                rows[i] = {**existing, **row}
+                return rows[i]
+        rows.append(row)
+        return row
+
+    def _execute(self, query: MemoryQuery) -> MemoryResponse:
+        response = self._run(query)
+        # Upserts that ignore duplicates only return the inserted rows
+        if self._bus is not None and (query._action == "insert"
+                                      or query._ignore_duplicates):
+            for row in response.data:
+                self._bus.publish(query._table, row)
+        return response
+
+    def _run(self, query: MemoryQuery) -> MemoryResponse:
+        with self._lock:
+            self.calls[(query._table, query._action)] += 1
+            rows = self._tables.setdefault(query._table, [])
+            if query._action in ("insert", "upsert"):
+                payload = query._payload
+                payload = payload if isinstance(payload, list) else [payload]
+                result = [self._store(query._table, row,
+                                      replace=query._action == "upsert",
+                                      ignore=query._ignore_duplicates,
+                                      on_conflict=query._on_conflict)
+                          for row in payload]
+                result = [row for row in result if row is not None]
+            elif query._action == "update":
+                result = [row for row in rows if query._matches(row)]
+                for row in result:
+                    row.update(deepcopy(query._payload))
+            elif query._action == "delete":
+                result = [row for row in rows if query._matches(row)]
+                self._tables[query._table] = [
+                    row for row in rows if not query._matches(row)]
+            else:
+                result = [row for row in rows if query._matches(row)]
+                if query._order is not None:
+                    column, desc = query._order
+                    result.sort(key=lambda row: row.get(column), reverse=desc)
+                if query._limit is not None:
+                    result = result[:query._limit]
+            return MemoryResponse(deepcopy(result))
@@ -0,0 +1,272 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...],
+            extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+
+    Methods:
+        inc(*labels, amount) -- Add to the counter of a label combination.
+    """
+
+    def __init__(self, name: str, help_text: str,
+                 labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """
+        Add to the counter of a label combination.
+
+        Arguments:
+            *labels -- One value per label name, in order.
+
+        Keyword Arguments:
+            amount -- Amount to add, default: 1.0
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, key)} {value:g}"
+                for key, value in values]
+
+
+class Histogram:
+    """
+    Histogram of observations in fixed buckets, with optional labels.
+
+    Observing costs one bisect and three additions under a lock.
+
+    Methods:
+        observe(value, *labels) -- Record an observation.
+    """
+
+    def __init__(self, name: str, help_text: str,
+                 labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Record an observation.
+
+        Arguments:
+            value -- The observed value, e.g. seconds.
+            *labels -- One value per label name, in order.
+
+        Returns:
+            None
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total, count))
+                            for key, (counts, total, count)
+                            in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),),
+                                     counts):
+                cumulative += bucket
+                le = 'le="+Inf"' if bound == float("inf") \
+                    else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket"
+                             f"{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} "
+                         f"{total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} "
+                         f"{count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose value is read from a function at export time,
+    so it costs nothing on the hot path.
+    """
+
+    def __init__(self, name: str, help_text: str,
+                 func: Callable[[], float], kind: str = "gauge") -> None:
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        return [f"{self.name} {float(self.func()):g}"]
+
+
+class Registry:
+    """
+    Collection of metrics exported together in Prometheus text format.
+
+    Methods:
+        counter(name, help_text, labels) -- Create or get a counter.
+        histogram(name, help_text, labels, buckets) -- Create or get a
+            histogram.
+        gauge(name, help_text, func, kind) -- Register a callback metric.
+        render() -- All metrics in Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram | CallbackMetric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, factory: Callable):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+
+    def counter(self, name: str, help_text: str,
+                labels: tuple[str, ...] = ()) -> Counter:
+        return self._get(name, lambda: Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str,
+                  labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS
+                  ) -> Histogram:
+        return self._get(name, lambda: Histogram(name, help_text, labels,
+                                                 buckets))
+
+    def gauge(self, name: str, help_text: str, func: Callable[[], float],
+              kind: str = "gauge") -> None:
+        """
+        Register a metric read from a function, replacing any earlier one.
+
+        Arguments:
+            name -- Metric name.
+            help_text -- Description for the HELP line.
+            func -- Returns the current value.
+
+        Keyword Arguments:
+            kind -- Prometheus type, "gauge" or "counter", default: "gauge"
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._metrics[name] = CallbackMetric(name, help_text, func, kind)
+
+    def render(self) -> str:
+        """
+        Return all metrics in the Prometheus text exposition format.
+
+        Arguments:
+            None
+
+        Returns:
+            str -- The exposition text.
+
+        Example:
+            >>> registry.render().splitlines()[:2]
+            ['# HELP grocery_write_queue_depth ...', '# TYPE ... gauge']
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for name, metric in metrics:
+            kind = metric.kind if isinstance(metric, CallbackMetric) \
+                else type(metric).__name__.lower()
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {name} failed: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of this process
+registry = Registry()
+
+
+def start_http_server(port: int, host: str = "127.0.0.1",
+                      source: Registry = registry) -> ThreadingHTTPServer:
+    """
+    Serve the metrics at /metrics from a daemon thread.
+
+    Arguments:
+        port -- Port to listen on.
+
+    Keyword Arguments:
+        host -- Address to bind, default: "127.0.0.1"
+        source -- Registry to export, default: registry
+
+    Returns:
+        ThreadingHTTPServer -- The running server.
+
+    Raises:
+        OSError -- If the port cannot be bound.
+
+    Example:
+        >>> start_http_server(9108)
+        # curl http://127.0.0.1:9108/metrics
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = source.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http",
+                     daemon=True).start()
+    return server
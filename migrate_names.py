@@ -0,0 +1,68 @@
+import argparse
+import json
+from catalog import canonical_groceries, canonical_name
+from database import get_backend
+from logger_config import get_logger
+from oplog import OpLog
+from storage import StorageBackend
+
+logger = get_logger(__name__)
+
+
+def migrate(backend: StorageBackend) -> dict[str, int]:
+    """
+    Rewrite the stored list and catalog with canonical names.
+
+    Arguments:
+        backend -- The storage backend to migrate.
+
+    Returns:
+        dict[str, int] -- Number of operations written per document.
+    """
+    written = {}
+    for doc in ("list", "groceries"):
+        oplog = OpLog(backend, doc)
+        document, _ = oplog.load()
+        if doc == "list":
+            canonical = list(dict.fromkeys(canonical_name(item)
+                                           for item in document))
+        else:
+            canonical = canonical_groceries(document)
+        written[doc] = oplog.write(canonical)
+        if written[doc]:
+            oplog.compact()
+        logger.info("Migrated %s: %d operations written", doc, written[doc])
+    return written
+
+
+def migrate_seed_file(path: str) -> None:
+    """
+    Rewrite a groceries JSON seed file with canonical names.
+
+    Arguments:
+        path -- Path of the JSON file.
+
+    Returns:
+        None
+    """
+    with open(path, encoding="utf-8") as f:
+        groceries = json.load(f)
+    # Keep the file's layout of one category per line
+    lines = [f"{json.dumps(cat)}:"
+             f"{json.dumps(items, ensure_ascii=False, separators=(',', ':'))}"
+             for cat, items in canonical_groceries(groceries).items()]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rewrite the item names of the stored grocery list "
+        "and catalog in canonical form, dropping duplicates, and compact "
+        "both documents. Run once on data that predates canonical names.")
+    parser.add_argument("--seed-file",
+                        help="also rewrite this groceries JSON file")
+    args = parser.parse_args()
+    print(migrate(get_backend()))
+    if args.seed_file:
+        migrate_seed_file(args.seed_file)
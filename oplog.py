@@ -0,0 +1,488 @@
+import threading
+import uuid
+from typing import Any
+from config import (OPLOG_CAS_ATTEMPTS, OPLOG_COMPACT_THRESHOLD,
+                    OPLOG_RETAIN_OPS)
+from logger_config import get_logger
+from storage import StorageBackend
+
+logger = get_logger(__name__)
+
+
+class RebaseConflict(Exception):
+    """
+    Raised when a write cannot be rebased because the operations stored
+    after its base version were compacted away.
+    """
+
+
+def diff_list(old: list[str], new: list[str]) -> list[dict[str, Any]]:
+    """
+    Compute the item operations that turn one grocery list into another.
+
+    Arguments:
+        old -- The list as last persisted.
+        new -- The list to persist.
+
+    Returns:
+        list[dict[str, Any]] -- Remove operations followed by add operations.
+
+    Example:
+        >>> diff_list(["Milk", "Eggs"], ["Milk", "Bread"])
+        [{'op': 'remove', 'category': None, 'item': 'Eggs'},
+         {'op': 'add', 'category': None, 'item': 'Bread'}]
+    """
+    old_items, new_items = set(old), set(new)
+    ops = [{"op": "remove", "category": None, "item": item}
+           for item in dict.fromkeys(old) if item not in new_items]
+    ops += [{"op": "add", "category": None, "item": item}
+            for item in dict.fromkeys(new) if item not in old_items]
+    return ops
+
+
+def diff_groceries(old: dict[str, list[str]],
+                   new: dict[str, list[str]]) -> list[dict[str, Any]]:
+    """
+    Compute the category and item operations between two catalogs.
+
+    Arguments:
+        old -- The catalog as last persisted.
+        new -- The catalog to persist.
+
+    Returns:
+        list[dict[str, Any]] -- Operations in the order they must be applied.
+
+    Example:
+        >>> diff_groceries({"Beverages": ["Tea"]}, {"Beverages": ["Coffee"]})
+        [{'op': 'remove', 'category': 'Beverages', 'item': 'Tea'},
+         {'op': 'add', 'category': 'Beverages', 'item': 'Coffee'}]
+    """
+    ops = [{"op": "remove_category", "category": cat, "item": None}
+           for cat in old if cat not in new]
+    for cat, items in new.items():
+        if cat not in old:
+            ops.append({"op": "add_category", "category": cat, "item": None})
+        ops += [{**op, "category": cat}
+                for op in diff_list(old.get(cat, []), items)]
+    return ops
+
+
+def with_op_ids(ops: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Give each operation without an op_id a new one.
+
+    Storage stores an operation with a given op_id only once, so the
+    operations can be sent again after a lost response.
+
+    Arguments:
+        ops -- Operations as produced by diff_list or diff_groceries.
+
+    Returns:
+        list[dict[str, Any]] -- The operations, each with an op_id.
+    """
+    return [op if op.get("op_id") else {**op, "op_id": uuid.uuid4().hex}
+            for op in ops]
+
+
+def apply_ops(document: Any, ops: list[dict[str, Any]]) -> Any:
+    """
+    Replay operations on a copy of a list or catalog document.
+
+    Arguments:
+        document -- A grocery list or a catalog dictionary.
+        ops -- Operations as produced by diff_list or diff_groceries.
+
+    Returns:
+        Any -- The updated copy of the document.
+    """
+    # Items are replayed in insertion-ordered dicts, so each operation
+    # takes constant time however long the lists are
+    if isinstance(document, dict):
+        result = {cat: dict.fromkeys(items) for cat, items in document.items()}
+        for op in ops:
+            cat = op["category"]
+            if op["op"] == "add_category":
+                result.setdefault(cat, {})
+            elif op["op"] == "remove_category":
+                result.pop(cat, None)
+            elif op["op"] == "add":
+                result.setdefault(cat, {})[op["item"]] = None
+            elif op["op"] == "remove" and cat in result:
+                result[cat].pop(op["item"], None)
+        return {cat: list(items) for cat, items in result.items()}
+
+    items = dict.fromkeys(document)
+    for op in ops:
+        if op["op"] == "add":
+            items[op["item"]] = None
+        elif op["op"] == "remove":
+            items.pop(op["item"], None)
+    return list(items)
+
+
+class OpLog:
+    """
+    Delta persistence for one single-row document.
+
+    Each write appends only the item operations since the last persisted
+    state to the op-log table. Reads replay the operations on top of the
+    compacted snapshot, and every OPLOG_COMPACT_THRESHOLD operations the
+    snapshot is rewritten and older operations are deleted.
+
+    The sequence number of the newest operation doubles as the document
+    version. Compaction keeps that operation so the version survives.
+
+    Writers never lock each other out. A write names the version its
+    document was derived from and is rebased onto the operations other
+    writers stored since, so it only adds and removes the items it
+    changed itself. If the operations after that version were compacted
+    away the write is refused with RebaseConflict, and the caller reloads
+    the document and applies its own changes again. The snapshot row is
+    replaced with a compare-and-swap on its version, so concurrent
+    compactions cannot overwrite each other.
+
+    Methods:
+        load() -- Read the current document and its version.
+        probe() -- Read only the current version.
+        write(document, base) -- Persist a new version of the document.
+        append(ops) -- Persist operations computed elsewhere.
+        observe(base, ops) -- Follow operations another writer stored.
+        compact() -- Fold the op-log into the snapshot row.
+
+    Attributes:
+        doc: Document name, "list" or "groceries".
+        version: Version this process last read or wrote, None if unknown.
+        merged: True if the last write also took in operations of other
+            writers, so version is ahead of the written document.
+        rebases: Number of writes rebased onto other writers' operations.
+        conflicts: Number of snapshot swaps lost to another writer.
+        stale: Number of writes refused because their base was compacted.
+    """
+
+    def __init__(self, backend: StorageBackend, doc: str,
+                 compact_threshold: int = OPLOG_COMPACT_THRESHOLD) -> None:
+        """
+        Initialize the op-log for a document.
+
+        Arguments:
+            backend (StorageBackend) -- Storage for the document.
+            doc (str) -- Document name, "list" or "groceries".
+
+        Keyword Arguments:
+            compact_threshold (int) -- Operations between compactions,
+                default: OPLOG_COMPACT_THRESHOLD
+
+        Returns:
+            None
+
+        Example:
+            >>> list_log = OpLog(backend, "list")
+        """
+        self.backend = backend
+        self.doc = doc
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._last: Any = None
+        self._pending_ops = 0
+        # Sequence numbers of our operations not yet folded into a snapshot
+        self._own: set[int] = set()
+        self.version: int | None = None
+        self.merged = False
+        self.rebases = 0
+        self.conflicts = 0
+        self.stale = 0
+
+    def _empty(self) -> Any:
+        return {} if self.doc == "groceries" else []
+
+    def _read(self) -> tuple[Any, int, int, int]:
+        """
+        Read the snapshot row and replay the operations recorded after it.
+
+        A compaction only deletes operations the snapshot it replaces
+        already held, so one compaction between reading the snapshot and
+        its operations is harmless. After more of them the operations
+        may be incomplete, and the read is repeated from the new
+        snapshot.
+
+        Arguments:
+            None
+
+        Returns:
+            tuple[Any, int, int, int] -- The document, the last applied
+                sequence number, the number of replayed operations and
+                the sequence number of the snapshot row.
+        """
+        while True:
+            document, snapshot = self.backend.read_document(self.doc) \
+                or (self._empty(), 0)
+            ops = self.backend.read_ops(self.doc, snapshot)
+            # Compactions between the reads delete the operation at the
+            # snapshot we got before any after it
+            if self._reaches(snapshot):
+                break
+        seq = ops[-1]["seq"] if ops else snapshot
+        if ops:
+            document = apply_ops(document, ops)
+        return document, seq, len(ops), snapshot
+
+    def load(self) -> tuple[Any, int]:
+        """
+        Read the current document from the snapshot and the op-log.
+
+        Arguments:
+            None
+
+        Returns:
+            tuple[Any, int] -- The grocery list or catalog dictionary
+                and its version.
+        """
+        document, seq, replayed, _ = self._read()
+        with self._lock:
+            self._last = document
+            self._pending_ops = replayed
+            self.version = seq
+        return apply_ops(document, []), seq
+
+    def probe(self) -> int:
+        """
+        Read the current version without fetching the document.
+
+        Arguments:
+            None
+
+        Returns:
+            int -- Sequence number of the newest operation, 0 if none.
+        """
+        return self.backend.latest_seq(self.doc)
+
+    def write(self, document: Any, base: int | None = None) -> int:
+        """
+        Append the operations between the last persisted state and document.
+
+        When other writers stored operations after base, document is first
+        rebased onto them, so the diff keeps their adds and removes rather
+        than undoing them. Operations another writer inserts while ours are
+        sent are folded in afterwards. If the operations after base were
+        compacted away nothing is written, since the document cannot be
+        told apart from the changes of other writers.
+
+        Arguments:
+            document -- The new grocery list or catalog dictionary.
+
+        Keyword Arguments:
+            base -- Version document was derived from, default: None
+                (the persisted state of this op-log)
+
+        Returns:
+            int -- Number of operations written.
+
+        Raises:
+            RebaseConflict -- If base can no longer be rebased; reload the
+                document, apply the changes again and write that.
+
+        Example:
+            >>> list_log.write(["Milk", "Bread"], base=41)
+            1
+        """
+        with self._lock:
+            self.merged = False
+            if self._last is None:
+                self._last, self.version, self._pending_ops, _ = self._read()
+            if base is not None and self.version is not None \
+                    and base < self.version:
+                document = self._rebase(document, base)
+            diff = diff_groceries if self.doc == "groceries" else diff_list
+            ops = diff(self._last, document)
+            if ops:
+                self._store(ops, apply_ops(document, []))
+            compact = self._pending_ops >= self.compact_threshold
+        if compact:
+            self.compact()
+        return len(ops)
+
+    def append(self, ops: list[dict[str, Any]]) -> int:
+        """
+        Append operations computed elsewhere, such as by another process.
+
+        Arguments:
+            ops -- Operations as produced by diff_list or diff_groceries.
+
+        Returns:
+            int -- Number of operations written.
+        """
+        if not ops:
+            return 0
+        with self._lock:
+            self.merged = False
+            self._store(ops, None if self._last is None
+                        else apply_ops(self._last, ops))
+            compact = self._pending_ops >= self.compact_threshold
+        if compact:
+            self.compact()
+        return len(ops)
+
+    def _store(self, ops: list[dict[str, Any]], document: Any) -> None:
+        """
+        Insert operations and move the persisted state to document.
+
+        If another writer inserted operations between our version and
+        ours, they are read back and applied as well, so the persisted
+        state matches storage again. Called with the lock held.
+
+        Arguments:
+            ops -- The operations to insert.
+            document -- The persisted state after them, None if unknown.
+
+        Returns:
+            None
+        """
+        previous, version = self._last, self.version
+        seqs = self.backend.append_ops(self.doc, ops)
+        self._own.update(seqs)
+        self._last = document
+        self._pending_ops += len(ops)
+        self.version = self._next_version(min(seqs), max(seqs))
+        if self.version is not None or version is None or document is None:
+            return
+        try:
+            stored = self.backend.read_ops(self.doc, version)
+        except Exception as e:
+            # Our operations are stored, the next load catches up
+            logger.warning("Could not read back %s operations: %s",
+                           self.doc, e)
+            return
+        self._last = apply_ops(previous, stored)
+        self._pending_ops += len(stored) - len(ops)
+        self.version = stored[-1]["seq"]
+        self.merged = True
+
+    def _rebase(self, document: Any, base: int) -> Any:
+        """
+        Apply to document the operations other writers stored after base.
+
+        Our own operations are skipped, document already holds their
+        effect or a later change of the same items. Called with the lock
+        held.
+
+        Arguments:
+            document -- The document derived from version base.
+            base -- Version document was derived from.
+
+        Returns:
+            Any -- The rebased document.
+
+        Raises:
+            RebaseConflict -- If the operations after base were compacted.
+        """
+        stored = self.backend.read_ops(self.doc, base)
+        # Checked after the read, compaction may delete while it runs
+        if not self._reaches(base):
+            self.stale += 1
+            raise RebaseConflict(f"Operations after {self.doc} version "
+                                 f"{base} were compacted")
+        self.rebases += 1
+        theirs = [op for op in stored if op["seq"] <= self.version
+                  and op["seq"] not in self._own]
+        return apply_ops(document, theirs)
+
+    def observe(self, base: int, ops: list[dict[str, Any]]) -> None:
+        """
+        Fold operations another writer stored into the persisted state, so
+        the next write neither repeats them nor loses track of the version.
+
+        Only applied when this op-log is at least at base, so no earlier
+        operation is missing; otherwise the next write reads storage.
+
+        Arguments:
+            base -- Version the operations apply on.
+            ops -- The operations with their "seq", oldest first.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._last is None or self.version is None \
+                    or self.version < base:
+                return
+            fresh = [op for op in ops if op["seq"] > self.version]
+            if fresh:
+                self._last = apply_ops(self._last, fresh)
+                self._pending_ops += len(fresh)
+                self.version = fresh[-1]["seq"]
+
+    def _next_version(self, first: int, last: int) -> int | None:
+        """
+        Version after our insert, or None if another writer got in between.
+
+        Arguments:
+            first (int) -- Sequence number of our first inserted operation.
+            last (int) -- Sequence number of our last inserted operation.
+
+        Returns:
+            int | None -- The new version, None when it cannot be trusted.
+        """
+        if self.version is None:
+            return None
+        # Operations sent again were stored before, at their old numbers
+        if first <= self.version:
+            return None
+        if self.backend.has_ops_between(self.doc, self.version, first):
+            return None
+        return last
+
+    def _reaches(self, base: int) -> bool:
+        """
+        Whether the op-log still holds every operation after base.
+
+        Arguments:
+            base -- A version of the document.
+
+        Returns:
+            bool -- True if no operation after base was deleted.
+        """
+        if base:
+            return self.backend.has_ops_between(self.doc, base - 1, base + 1)
+        # Nothing is deleted before the first compaction
+        stored = self.backend.read_document(self.doc)
+        return stored is None or stored[1] == 0
+
+    def compact(self) -> None:
+        """
+        Rewrite the snapshot row and delete the operations folded into it.
+
+        The snapshot is replaced with a compare-and-swap on the version it
+        was read at, so when writers compact at the same time only one
+        succeeds and the others re-read and retry. Only operations the
+        replaced snapshot already held are deleted, so a reader that just
+        fetched it can still replay everything after it, and the newest
+        OPLOG_RETAIN_OPS operations of the document are kept for writes to
+        rebase on.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        for _ in range(OPLOG_CAS_ATTEMPTS):
+            with self._lock:
+                document, seq, replayed, snapshot = self._read()
+                if not replayed:
+                    return
+                if self.backend.swap_document(self.doc, document, seq,
+                                              snapshot):
+                    kept = min(snapshot, self.backend.nth_latest_seq(
+                        self.doc, OPLOG_RETAIN_OPS))
+                    self.backend.delete_ops(self.doc, kept)
+                    if self.version is not None and seq != self.version:
+                        self.merged = True
+                    self._last, self.version = document, seq
+                    self._pending_ops = 0
+                    self._own = {own for own in self._own if own >= kept}
+                    logger.info("Compacted %d %s operations.", replayed,
+                                self.doc)
+                    return
+                self.conflicts += 1
+        logger.warning("Gave up compacting %s after %d conflicts",
+                       self.doc, OPLOG_CAS_ATTEMPTS)
@@ -0,0 +1,414 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable
+from config import (BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS,
+                    READ_DEADLINE_SECONDS, RETRY_ATTEMPTS,
+                    RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS,
+                    WRITE_DEADLINE_SECONDS)
+from logger_config import get_logger
+from metrics import registry
+from oplog import with_op_ids
+from storage import StorageBackend
+
+logger = get_logger(__name__)
+
+_CALL_SECONDS = registry.histogram(
+    "grocery_storage_call_seconds",
+    "Latency of storage calls including retries, by operation.", ("op",))
+_CALLS = registry.counter(
+    "grocery_storage_calls_total",
+    "Storage calls by operation, kind (read or write) and outcome.",
+    ("op", "kind", "outcome"))
+_ATTEMPT_ERRORS = registry.counter(
+    "grocery_storage_attempt_errors_total",
+    "Failed storage attempts by operation and error type.", ("op", "error"))
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the backend while the circuit is open.
+    """
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a backend call does not finish within its deadline.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker that stops calls to a failing backend.
+
+    Closed: calls go through, consecutive failures are counted. After
+    failure_threshold failures in a row the circuit opens and calls fail
+    fast for reset_timeout seconds. It is then half-open: one trial call
+    goes through, and closes the circuit on success or opens it again on
+    failure.
+
+    Methods:
+        allow() -- Whether a call may go through now.
+        record_success() -- Report a successful call.
+        record_failure() -- Report a failed call.
+
+    Attributes:
+        failure_threshold: Consecutive failures that open the circuit.
+        reset_timeout: Seconds the circuit stays open.
+        opened: Number of times the circuit has opened.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_SECONDS) -> None:
+        """
+        Initialize a closed circuit.
+
+        Keyword Arguments:
+            failure_threshold (int) -- Consecutive failures that open the
+                circuit, default: BREAKER_FAILURE_THRESHOLD
+            reset_timeout (float) -- Seconds the circuit stays open,
+                default: BREAKER_RESET_SECONDS
+
+        Returns:
+            None
+
+        Example:
+            >>> breaker = CircuitBreaker(failure_threshold=5)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.opened = 0
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """
+        Current state: "closed", "open" or "half_open".
+        """
+        with self._lock:
+            return self._state(time.monotonic())
+
+    @property
+    def failures(self) -> int:
+        """
+        Number of consecutive failed calls.
+        """
+        return self._failures
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if now - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go through, claiming the half-open trial.
+
+        Arguments:
+            None
+
+        Returns:
+            bool -- False while the circuit is open.
+        """
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Report a successful call, closing the circuit.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Storage circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        """
+        Report a failed call, opening the circuit at the threshold.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._failures += 1
+            reopen = self._trial
+            self._trial = False
+            if reopen or (self._opened_at is None
+                          and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                logger.error("Storage circuit opened after %d failures",
+                             self._failures)
+
+
+class ResilientBackend(StorageBackend):
+    """
+    Storage backend wrapper that applies deadlines, retries and a breaker.
+
+    Every call runs on a worker thread and is abandoned when it misses its
+    deadline. Idempotent calls are retried with jittered exponential
+    backoff: reads, snapshot upserts, deletes, op-log appends and history
+    appends. Appended operations are given an op_id unless they have one
+    and purchases carry their id, and storage skips those already stored,
+    so a retry after a lost response stores nothing twice. Log appends
+    are not retried, since a retry after a lost response would record
+    them twice, and neither are snapshot swaps: a retry of a swap that
+    committed would find its own version and report a conflict. A failed
+    swap is instead reported as done when the stored snapshot is at the
+    version it wrote. All calls share one circuit breaker, so while the
+    backend is down they fail fast with CircuitOpenError and readers fall
+    back to their cached data.
+
+    Every call is recorded in the metrics registry: its latency, whether
+    it is a read or a write, and its outcome.
+
+    Methods:
+        stats() -- Breaker state and call counts for monitoring.
+
+    Attributes:
+        inner: The wrapped backend.
+        name: Name of the breaker in metrics, e.g. "storage".
+        breaker: The circuit breaker shared by all calls.
+    """
+
+    _IDEMPOTENT = frozenset({"read_document", "read_ops", "latest_seq",
+                             "nth_latest_seq", "has_ops_between",
+                             "append_ops", "write_document", "delete_ops",
+                             "append_history", "read_history"})
+    _WRITES = frozenset({"append_ops", "write_document", "swap_document",
+                         "delete_ops", "append_history", "insert_logs"})
+
+    def __init__(self, inner: StorageBackend,
+                 breaker: CircuitBreaker | None = None,
+                 attempts: int = RETRY_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY_SECONDS,
+                 max_delay: float = RETRY_MAX_DELAY_SECONDS,
+                 read_deadline: float = READ_DEADLINE_SECONDS,
+                 write_deadline: float = WRITE_DEADLINE_SECONDS,
+                 name: str = "storage") -> None:
+        """
+        Wrap a backend.
+
+        Arguments:
+            inner (StorageBackend) -- The backend to call.
+
+        Keyword Arguments:
+            breaker (CircuitBreaker | None) -- Breaker to use,
+                default: None (a new one)
+            attempts (int) -- Tries per idempotent call,
+                default: RETRY_ATTEMPTS
+            base_delay (float) -- Backoff before the first retry,
+                default: RETRY_BASE_DELAY_SECONDS
+            max_delay (float) -- Maximum backoff,
+                default: RETRY_MAX_DELAY_SECONDS
+            read_deadline (float) -- Seconds per read call,
+                default: READ_DEADLINE_SECONDS
+            write_deadline (float) -- Seconds per write call,
+                default: WRITE_DEADLINE_SECONDS
+            name (str) -- Name of the breaker in metrics, so wrappers with
+                their own breaker are told apart, default: "storage"
+
+        Returns:
+            None
+
+        Example:
+            >>> backend = ResilientBackend(SupabaseBackend(client))
+        """
+        self.inner = inner
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.read_deadline = read_deadline
+        self.write_deadline = write_deadline
+        self._pool = ThreadPoolExecutor(max_workers=8,
+                                        thread_name_prefix="storage")
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "failures": 0, "retries": 0,
+                        "timeouts": 0, "short_circuited": 0}
+        registry.gauge(f"grocery_{name}_breaker_open",
+                       f"1 while the {name} circuit is open or half-open.",
+                       lambda: self.breaker.state != CircuitBreaker.CLOSED)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def _attempt(self, func: Callable[..., Any], args: tuple,
+                 deadline: float) -> Any:
+        """
+        Make one call on a worker thread, waiting at most deadline seconds.
+
+        Arguments:
+            func (Callable) -- Bound method of the inner backend.
+            args (tuple) -- Its arguments.
+            deadline (float) -- Seconds to wait.
+
+        Returns:
+            Any -- The result of the call.
+
+        Raises:
+            DeadlineExceeded -- If the call did not finish in time.
+        """
+        try:
+            future = self._pool.submit(func, *args)
+        except RuntimeError:
+            # Worker threads cannot start once the interpreter is exiting,
+            # when logging.shutdown() still flushes the last log records
+            return func(*args)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout:
+            self._count("timeouts")
+            raise DeadlineExceeded(
+                f"{func.__name__} exceeded {deadline}s") from None
+
+    def _call(self, name: str, *args: Any) -> Any:
+        """
+        Call the inner backend with deadline, retries and the breaker.
+
+        Arguments:
+            name (str) -- Name of the StorageBackend method.
+            *args -- Its arguments.
+
+        Returns:
+            Any -- The result of the call.
+
+        Raises:
+            CircuitOpenError -- If the circuit is open.
+            Exception -- The last error once retries are exhausted.
+        """
+        func = getattr(self.inner, name)
+        write = name in self._WRITES
+        deadline = self.write_deadline if write else self.read_deadline
+        attempts = self.attempts if name in self._IDEMPOTENT else 1
+        kind = "write" if write else "read"
+        self._count("calls")
+        start = time.perf_counter()
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                _CALLS.inc(name, kind, "short_circuited")
+                raise CircuitOpenError(f"Storage unavailable, {name} "
+                                       "not attempted")
+            try:
+                result = self._attempt(func, args, deadline)
+            except Exception as e:
+                self.breaker.record_failure()
+                self._count("failures")
+                _ATTEMPT_ERRORS.inc(name, type(e).__name__)
+                if attempt + 1 == attempts:
+                    _CALL_SECONDS.observe(time.perf_counter() - start, name)
+                    _CALLS.inc(name, kind, "error")
+                    raise
+                # Full jitter keeps retrying sessions from synchronizing
+                delay = random.uniform(0, min(self.max_delay,
+                                              self.base_delay * 2 ** attempt))
+                logger.warning("Retrying %s in %.2fs: %s", name, delay, e)
+                self._count("retries")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                _CALL_SECONDS.observe(time.perf_counter() - start, name)
+                _CALLS.inc(name, kind, "ok")
+                return result
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Return the breaker state and call counts since startup.
+
+        Arguments:
+            None
+
+        Returns:
+            dict[str, Any] -- Breaker state, consecutive failures, times
+                opened, and counts of calls, failed attempts, retries,
+                timeouts and short-circuited calls.
+
+        Example:
+            >>> backend.stats()["breaker"]
+            'closed'
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        return {"breaker": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "opened": self.breaker.opened, **counts}
+
+    def read_document(self, doc):
+        return self._call("read_document", doc)
+
+    def read_ops(self, doc, after):
+        return self._call("read_ops", doc, after)
+
+    def latest_seq(self, doc):
+        return self._call("latest_seq", doc)
+
+    def nth_latest_seq(self, doc, n):
+        return self._call("nth_latest_seq", doc, n)
+
+    def has_ops_between(self, doc, after, before):
+        return self._call("has_ops_between", doc, after, before)
+
+    def append_ops(self, doc, ops):
+        # Every try inserts the same ids, so only the first is stored
+        return self._call("append_ops", doc, with_op_ids(ops))
+
+    def write_document(self, doc, document, seq):
+        return self._call("write_document", doc, document, seq)
+
+    def swap_document(self, doc, document, seq, expected):
+        try:
+            return self._call("swap_document", doc, document, seq, expected)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            # The swap may have committed before its response was lost
+            try:
+                stored = self._call("read_document", doc)
+            except Exception:
+                stored = None
+            if stored is not None and stored[1] == seq:
+                return True
+            raise
+
+    def delete_ops(self, doc, before):
+        return self._call("delete_ops", doc, before)
+
+    def append_history(self, entries):
+        return self._call("append_history", entries)
+
+    def read_history(self, after=0):
+        return self._call("read_history", after)
+
+    def insert_logs(self, entries):
+        return self._call("insert_logs", entries)
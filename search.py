@@ -0,0 +1,297 @@
+import re
+from collections import deque
+
+# Key under which a trie node stores the items whose word ends there
+_ITEMS = ""
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a name or query into case-folded words.
+
+    Arguments:
+        text -- The text to split.
+
+    Returns:
+        list[str] -- The words in order.
+
+    Example:
+        >>> tokenize("Sam's Mini-Mozzarella")
+        ["sam's", 'mini', 'mozzarella']
+    """
+    return _WORD.findall(text.casefold())
+
+
+class SearchIndex:
+    """
+    Typeahead index over item names.
+
+    A trie over the words of every name answers prefix queries by walking
+    to the node of the query word and collecting items breadth-first, so
+    the work is bounded by the number of results, not the catalog size.
+    When that finds nothing, a walk of the trie that allows one edit finds
+    words within edit distance 1 of the query prefix.
+
+    Copies share the trie. An index changes the nodes only it refers to
+    in place, and copies the others along the path of a changed word
+    first, so a change after copy() costs the length of the name rather
+    than the size of the index.
+
+    Methods:
+        add(item) -- Index an item name.
+        remove(item) -- Remove an item name.
+        search(query, limit) -- Ranked matching names.
+        copy() -- Copy of the index sharing the trie.
+    """
+
+    # Items collected per result before ranking
+    CANDIDATES_PER_RESULT = 5
+
+    def __init__(self, items: list[str] | None = None) -> None:
+        """
+        Initialize the index, optionally with item names.
+
+        Keyword Arguments:
+            items -- Names to index, default: None
+
+        Returns:
+            None
+
+        Example:
+            >>> index = SearchIndex(["Milk", "Lactose Free Milk"])
+            >>> index.search("mil")
+            ['Milk', 'Lactose Free Milk']
+        """
+        # Nodes map characters to child nodes, and _ITEMS to the
+        # case-folded and stored names of the items whose word ends there
+        self._root: dict = {}
+        self._size = 0
+        # Ids of the nodes no copy refers to, which may change in place
+        self._owned: set[int] = {id(self._root)}
+        for item in items or []:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _own(self, parent: dict | None, char: str = "") -> dict:
+        """
+        Return a node this index may change, copying a shared one first.
+
+        Arguments:
+            parent -- Owned parent of the node, None for the root.
+
+        Keyword Arguments:
+            char -- Character of the node under parent, default: ""
+
+        Returns:
+            dict -- The owned node, created if missing.
+        """
+        node = self._root if parent is None else parent.get(char)
+        if node is not None and id(node) in self._owned:
+            return node
+        node = {} if node is None else {
+            key: dict(child) if key == _ITEMS else child
+            for key, child in node.items()}
+        if parent is None:
+            self._root = node
+        else:
+            parent[char] = node
+        self._owned.add(id(node))
+        return node
+
+    def _contains(self, key: str, words: list[str]) -> bool:
+        node = self._node(words[0]) if words else None
+        return node is not None and key in node.get(_ITEMS, ())
+
+    def add(self, item: str) -> None:
+        """
+        Index an item name.
+
+        Arguments:
+            item -- The item name.
+
+        Returns:
+            None
+        """
+        name = item.strip()
+        key = name.casefold()
+        words = tokenize(key)
+        if not words or self._contains(key, words):
+            return
+        root = self._own(None)
+        for word in set(words):
+            node = root
+            for char in word:
+                node = self._own(node, char)
+            node.setdefault(_ITEMS, {})[key] = name
+        self._size += 1
+
+    def remove(self, item: str) -> None:
+        """
+        Remove an item name, pruning trie nodes left empty.
+
+        Arguments:
+            item -- The item name, in any case or spacing.
+
+        Returns:
+            None
+        """
+        key = item.strip().casefold()
+        words = tokenize(key)
+        if not self._contains(key, words):
+            return
+        root = self._own(None)
+        for word in set(words):
+            path = [root]
+            for char in word:
+                path.append(self._own(path[-1], char))
+            del path[-1][_ITEMS][key]
+            if not path[-1][_ITEMS]:
+                del path[-1][_ITEMS]
+            for depth in range(len(word), 0, -1):
+                if path[depth]:
+                    break
+                self._owned.discard(id(path[depth]))
+                del path[depth - 1][word[depth - 1]]
+        self._size -= 1
+
+    def _node(self, prefix: str) -> dict | None:
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy_nodes(self, node: dict, word: str, i: int = 0,
+                     edits: int = 1) -> list[dict]:
+        """
+        Find the trie nodes reached by word with at most one edit.
+
+        Arguments:
+            node -- The node to continue from.
+            word -- The query word.
+
+        Keyword Arguments:
+            i -- Position in word, default: 0
+            edits -- Edits still allowed, default: 1
+
+        Returns:
+            list[dict] -- Nodes whose path is within the edit budget.
+        """
+        if i == len(word):
+            return [node]
+        found = []
+        child = node.get(word[i])
+        if child is not None:
+            found += self._fuzzy_nodes(child, word, i + 1, edits)
+        if edits:
+            # Extra character in the query
+            found += self._fuzzy_nodes(node, word, i + 1, 0)
+            for char, child in node.items():
+                if char == _ITEMS:
+                    continue
+                # Wrong character, or a missing one, in the query
+                if char != word[i]:
+                    found += self._fuzzy_nodes(child, word, i + 1, 0)
+                found += self._fuzzy_nodes(child, word, i, 0)
+        return found
+
+    def _collect(self, nodes: list[dict], limit: int) -> dict[str, str]:
+        """
+        Collect items below nodes, shortest completions first.
+
+        Arguments:
+            nodes -- The nodes to start from.
+            limit -- Maximum number of items.
+
+        Returns:
+            dict[str, str] -- Stored names by case-folded name.
+        """
+        found: dict[str, str] = {}
+        queue = deque(nodes)
+        while queue:
+            node = queue.popleft()
+            for key, name in node.get(_ITEMS, {}).items():
+                found[key] = name
+                if len(found) >= limit:
+                    return found
+            queue.extend(child for char, child in node.items()
+                         if char != _ITEMS)
+        return found
+
+    def search(self, query: str, limit: int = 10) -> list[str]:
+        """
+        Return the names matching a query, best matches first.
+
+        Every query word must prefix a word of the name. Names equal to or
+        starting with the query rank first, then shorter names. Typo
+        matches are only returned when no name matches this way.
+
+        Arguments:
+            query -- The text typed so far.
+
+        Keyword Arguments:
+            limit -- Maximum number of names, default: 10
+
+        Returns:
+            list[str] -- The stored names of the matching items.
+        """
+        text = query.strip().casefold()
+        words = tokenize(text)
+        if not words:
+            return []
+        # The longest word is the most selective one to walk the trie with
+        anchor = max(words, key=len)
+        others = list(words)
+        others.remove(anchor)
+        wanted = limit * self.CANDIDATES_PER_RESULT
+        node = self._node(anchor)
+        names = self._collect([node], wanted) if node else {}
+        matches = [key for key in names if self._matches_all(key, others)]
+        if matches:
+            def rank(key: str) -> tuple[int, int, str]:
+                tier = 0 if key == text else 1 if key.startswith(text) else 2
+                return tier, len(key), key
+
+            ranked = sorted(matches, key=rank)
+        elif len(anchor) >= 3:
+            nodes = list({id(node): node for node in
+                          self._fuzzy_nodes(self._root, anchor)}.values())
+            names = self._collect(nodes, wanted)
+            ranked = sorted((key for key in names
+                             if self._matches_all(key, others)),
+                            key=lambda key: (len(key), key))
+        else:
+            return []
+        return [names[key] for key in ranked[:limit]]
+
+    @staticmethod
+    def _matches_all(key: str, words: list[str]) -> bool:
+        if not words:
+            return True
+        name_words = tokenize(key)
+        return all(any(name_word.startswith(word) for name_word in name_words)
+                   for word in words)
+
+    def copy(self) -> "SearchIndex":
+        """
+        Return a copy of the index that shares the trie.
+
+        Neither index changes the shared nodes in place afterwards, so the
+        copy is independent and costs constant time.
+
+        Arguments:
+            None
+
+        Returns:
+            SearchIndex -- The copy.
+        """
+        index = SearchIndex.__new__(SearchIndex)
+        index._root = self._root
+        index._size = self._size
+        index._owned = set()
+        self._owned = set()
+        return index
@@ -0,0 +1,510 @@
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+from config import (SUPABASE_DEFAULT_TABLE, SUPABASE_GROCERY_TABLE,
+                    SUPABASE_HISTORY_TABLE, SUPABASE_OPS_TABLE)
+
+# Document name -> Supabase table holding its compacted snapshot
+DOCUMENT_TABLES = {"list": SUPABASE_GROCERY_TABLE,
+                   "groceries": SUPABASE_DEFAULT_TABLE}
+
+
+class StorageBackend(ABC):
+    """
+    Storage operations used by the op-log and the remote log handler.
+
+    Documents ("list" and "groceries") are stored as a compacted snapshot
+    plus an op-log of item operations with increasing sequence numbers.
+
+    Methods:
+        read_document(doc) -- Snapshot of a document and its op sequence.
+        read_ops(doc, after) -- Operations recorded after a sequence number.
+        latest_seq(doc) -- Sequence number of the newest operation.
+        nth_latest_seq(doc, n) -- Sequence number of the nth newest one.
+        has_ops_between(doc, after, before) -- Any operation in a range.
+        append_ops(doc, ops) -- Record operations, returning their numbers.
+        write_document(doc, document, seq) -- Replace the snapshot.
+        swap_document(doc, document, seq, expected) -- Replace the snapshot
+            if it is still at a version.
+        delete_ops(doc, before) -- Delete operations before a number.
+        append_history(entries) -- Record checked-off items.
+        read_history(after) -- Purchases recorded after a number.
+        insert_logs(entries) -- Insert log entries.
+    """
+
+    @abstractmethod
+    def read_document(self, doc: str) -> tuple[Any, int] | None:
+        """
+        Read the compacted snapshot of a document.
+
+        Arguments:
+            doc (str) -- Document name, "list" or "groceries".
+
+        Returns:
+            tuple[Any, int] | None -- The snapshot and the sequence number
+                of the last operation folded into it, None if missing.
+        """
+
+    @abstractmethod
+    def read_ops(self, doc: str, after: int) -> list[dict[str, Any]]:
+        """
+        Read the operations of a document recorded after a sequence number.
+
+        Arguments:
+            doc (str) -- Document name.
+            after (int) -- Exclusive lower bound of the sequence numbers.
+
+        Returns:
+            list[dict[str, Any]] -- Operations in sequence order.
+        """
+
+    @abstractmethod
+    def latest_seq(self, doc: str) -> int:
+        """
+        Return the sequence number of the newest operation of a document.
+
+        Arguments:
+            doc (str) -- Document name.
+
+        Returns:
+            int -- The sequence number, 0 if there are no operations.
+        """
+
+    @abstractmethod
+    def nth_latest_seq(self, doc: str, n: int) -> int:
+        """
+        Return the sequence number of the nth newest operation of a document.
+
+        Arguments:
+            doc (str) -- Document name.
+            n (int) -- Position from the newest operation, 1 for it.
+
+        Returns:
+            int -- The sequence number, 0 if there are fewer operations.
+        """
+
+    @abstractmethod
+    def has_ops_between(self, doc: str, after: int, before: int) -> bool:
+        """
+        Check for operations strictly between two sequence numbers.
+
+        Arguments:
+            doc (str) -- Document name.
+            after (int) -- Exclusive lower bound.
+            before (int) -- Exclusive upper bound.
+
+        Returns:
+            bool -- True if at least one operation exists in the range.
+        """
+
+    @abstractmethod
+    def append_ops(self, doc: str, ops: list[dict[str, Any]]) -> list[int]:
+        """
+        Record operations for a document.
+
+        An operation with an op_id is stored once: if that op_id is
+        already stored, as when a lost response is retried, it is not
+        inserted again and its stored sequence number is returned.
+
+        Arguments:
+            doc (str) -- Document name.
+            ops (list[dict[str, Any]]) -- Operations with op, category
+                and item keys, and optionally an op_id.
+
+        Returns:
+            list[int] -- Sequence numbers of the operations.
+        """
+
+    @abstractmethod
+    def write_document(self, doc: str, document: Any, seq: int) -> None:
+        """
+        Replace the compacted snapshot of a document.
+
+        Arguments:
+            doc (str) -- Document name.
+            document (Any) -- The full document.
+            seq (int) -- Last operation folded into the snapshot.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def swap_document(self, doc: str, document: Any, seq: int,
+                      expected: int) -> bool:
+        """
+        Replace the compacted snapshot of a document if it is still at the
+        expected version, as one conditional write (compare-and-swap).
+
+        Arguments:
+            doc (str) -- Document name.
+            document (Any) -- The full document.
+            seq (int) -- Last operation folded into the snapshot.
+            expected (int) -- Sequence number the stored snapshot must
+                have, 0 for a missing snapshot.
+
+        Returns:
+            bool -- False if another writer replaced the snapshot first.
+        """
+
+    @abstractmethod
+    def delete_ops(self, doc: str, before: int) -> None:
+        """
+        Delete the operations of a document before a sequence number.
+
+        Arguments:
+            doc (str) -- Document name.
+            before (int) -- Exclusive upper bound.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def append_history(self, entries: list[dict[str, Any]]) -> None:
+        """
+        Append purchases to the purchase history in a single request.
+
+        Purchases whose purchase_id is already stored are skipped, so a
+        purchase sent again after a lost response is recorded once.
+
+        Arguments:
+            entries (list[dict[str, Any]]) -- Rows with item, bought_at
+                (ISO 8601 timestamp) and purchase_id keys.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def read_history(self, after: int = 0) -> list[dict[str, Any]]:
+        """
+        Read the purchases recorded after a sequence number.
+
+        Arguments:
+            after (int) -- Exclusive lower bound of the sequence numbers,
+                default: 0
+
+        Returns:
+            list[dict[str, Any]] -- Rows with seq, item and bought_at keys
+                in sequence order.
+        """
+
+    @abstractmethod
+    def insert_logs(self, entries: list[dict[str, Any]]) -> None:
+        """
+        Insert log entries in a single request.
+
+        Arguments:
+            entries (list[dict[str, Any]]) -- Rows for the log table.
+
+        Returns:
+            None
+        """
+
+
+class SupabaseBackend(StorageBackend):
+    """
+    Storage backend on the hosted Supabase tables.
+
+    Also accepts a MemoryClient, which stands in for the Supabase client
+    in tests and benchmarks.
+
+    Attributes:
+        client: Supabase client instance.
+    """
+
+    def __init__(self, client: Any) -> None:
+        """
+        Initialize the backend with a Supabase client.
+
+        Arguments:
+            client (Any) -- Supabase client or a MemoryClient stand-in.
+
+        Returns:
+            None
+
+        Example:
+            >>> backend = SupabaseBackend(SupabaseClient.get_client())
+        """
+        self.client = client
+
+    def read_document(self, doc: str) -> tuple[Any, int] | None:
+        response = self.client.table(DOCUMENT_TABLES[doc]).select("*") \
+            .eq("id", 1).execute()
+        if not response.data:
+            return None
+        return response.data[0]["groceries"], \
+            response.data[0].get("op_seq") or 0
+
+    def read_ops(self, doc: str, after: int) -> list[dict[str, Any]]:
+        return self.client.table(SUPABASE_OPS_TABLE).select("*") \
+            .eq("doc", doc).gt("seq", after).order("seq").execute().data
+
+    def latest_seq(self, doc: str) -> int:
+        response = self.client.table(SUPABASE_OPS_TABLE).select("seq") \
+            .eq("doc", doc).order("seq", desc=True).limit(1).execute()
+        return response.data[0]["seq"] if response.data else 0
+
+    def nth_latest_seq(self, doc: str, n: int) -> int:
+        response = self.client.table(SUPABASE_OPS_TABLE).select("seq") \
+            .eq("doc", doc).order("seq", desc=True).limit(n).execute()
+        return response.data[-1]["seq"] if len(response.data) == n else 0
+
+    def has_ops_between(self, doc: str, after: int, before: int) -> bool:
+        response = self.client.table(SUPABASE_OPS_TABLE).select("seq") \
+            .eq("doc", doc).gt("seq", after).lt("seq", before) \
+            .limit(1).execute()
+        return bool(response.data)
+
+    def append_ops(self, doc: str, ops: list[dict[str, Any]]) -> list[int]:
+        table = self.client.table
+        response = table(SUPABASE_OPS_TABLE).upsert(
+            [{"doc": doc, **op} for op in ops], on_conflict="op_id",
+            ignore_duplicates=True).execute()
+        if len(response.data) == len(ops):
+            return [row["seq"] for row in response.data]
+        # Skipped rows were stored by an earlier try of the same insert
+        response = table(SUPABASE_OPS_TABLE).select("seq") \
+            .in_("op_id", [op["op_id"] for op in ops]).order("seq").execute()
+        return [row["seq"] for row in response.data]
+
+    def write_document(self, doc: str, document: Any, seq: int) -> None:
+        self.client.table(DOCUMENT_TABLES[doc]).upsert({
+            'id': 1,  # Use a constant ID for the single record
+            'groceries': document,
+            'op_seq': seq
+        }).execute()
+
+    def swap_document(self, doc: str, document: Any, seq: int,
+                      expected: int) -> bool:
+        table = self.client.table
+        response = table(DOCUMENT_TABLES[doc]).update({
+            'groceries': document, 'op_seq': seq
+        }).eq("id", 1).eq("op_seq", expected).execute()
+        if response.data or expected:
+            return bool(response.data)
+        # No snapshot yet, only the first of concurrent inserts wins
+        response = table(DOCUMENT_TABLES[doc]).upsert({
+            'id': 1, 'groceries': document, 'op_seq': seq
+        }, ignore_duplicates=True).execute()
+        return bool(response.data)
+
+    def delete_ops(self, doc: str, before: int) -> None:
+        self.client.table(SUPABASE_OPS_TABLE).delete() \
+            .eq("doc", doc).lt("seq", before).execute()
+
+    def append_history(self, entries: list[dict[str, Any]]) -> None:
+        self.client.table(SUPABASE_HISTORY_TABLE).upsert(
+            entries, on_conflict="purchase_id",
+            ignore_duplicates=True).execute()
+
+    def read_history(self, after: int = 0) -> list[dict[str, Any]]:
+        return self.client.table(SUPABASE_HISTORY_TABLE).select("*") \
+            .gt("seq", after).order("seq").execute().data
+
+    def insert_logs(self, entries: list[dict[str, Any]]) -> None:
+        self.client.table('log_entries').insert(entries).execute()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Storage backend on a local SQLite database.
+
+    Uses WAL journaling so readers in other processes never block the
+    writer, and fixed parameterized statements that sqlite3 keeps
+    prepared in its statement cache. A path of ":memory:" gives a
+    throwaway database for tests and benchmarks.
+
+    Attributes:
+        path: Path of the database file.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            doc TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            op_seq INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS grocery_ops (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc TEXT NOT NULL,
+            op TEXT NOT NULL,
+            category TEXT,
+            item TEXT,
+            op_id TEXT UNIQUE
+        );
+        CREATE INDEX IF NOT EXISTS grocery_ops_doc_seq
+            ON grocery_ops (doc, seq);
+        CREATE TABLE IF NOT EXISTS purchase_history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            item TEXT NOT NULL,
+            bought_at TEXT NOT NULL,
+            purchase_id TEXT UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS log_entries (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            level TEXT,
+            message TEXT,
+            function TEXT,
+            line_no INTEGER,
+            module TEXT
+        );
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the database and create the tables if needed.
+
+        Arguments:
+            path (str) -- Database file, or ":memory:".
+
+        Returns:
+            None
+
+        Example:
+            >>> backend = SQLiteBackend("groceries.db")
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None,
+                                     cached_statements=64)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        # Databases created before purchases and operations had ids
+        for table, column in (("purchase_history", "purchase_id"),
+                              ("grocery_ops", "op_id")):
+            columns = {row["name"] for row in self._conn.execute(
+                f"PRAGMA table_info({table})")}
+            if column not in columns:
+                self._conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} TEXT")
+                self._conn.execute(
+                    f"CREATE UNIQUE INDEX {table}_{column} "
+                    f"ON {table} ({column})")
+
+    def read_document(self, doc: str) -> tuple[Any, int] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, op_seq FROM documents WHERE doc = ?",
+                (doc,)).fetchone()
+        return None if row is None else (json.loads(row["body"]),
+                                         row["op_seq"])
+
+    def read_ops(self, doc: str, after: int) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, doc, op, category, item FROM grocery_ops "
+                "WHERE doc = ? AND seq > ? ORDER BY seq",
+                (doc, after)).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_seq(self, doc: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(seq) FROM grocery_ops WHERE doc = ?",
+                (doc,)).fetchone()
+        return row[0] or 0
+
+    def nth_latest_seq(self, doc: str, n: int) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seq FROM grocery_ops WHERE doc = ? "
+                "ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                (doc, n - 1)).fetchone()
+        return row[0] if row else 0
+
+    def has_ops_between(self, doc: str, after: int, before: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM grocery_ops "
+                "WHERE doc = ? AND seq > ? AND seq < ? LIMIT 1",
+                (doc, after, before)).fetchone()
+        return row is not None
+
+    def append_ops(self, doc: str, ops: list[dict[str, Any]]) -> list[int]:
+        seqs = []
+        with self._lock, self._transaction():
+            for op in ops:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO grocery_ops "
+                    "(doc, op, category, item, op_id) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (doc, op["op"], op["category"], op["item"],
+                     op.get("op_id")))
+                if cursor.rowcount:
+                    seqs.append(cursor.lastrowid)
+                else:
+                    seqs.append(self._conn.execute(
+                        "SELECT seq FROM grocery_ops WHERE op_id = ?",
+                        (op["op_id"],)).fetchone()[0])
+        return seqs
+
+    def write_document(self, doc: str, document: Any, seq: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (doc, body, op_seq) VALUES (?, ?, ?) "
+                "ON CONFLICT (doc) DO UPDATE SET body = excluded.body, "
+                "op_seq = excluded.op_seq",
+                (doc, json.dumps(document), seq))
+
+    def swap_document(self, doc: str, document: Any, seq: int,
+                      expected: int) -> bool:
+        body = json.dumps(document)
+        with self._lock:
+            swapped = self._conn.execute(
+                "UPDATE documents SET body = ?, op_seq = ? "
+                "WHERE doc = ? AND op_seq = ?",
+                (body, seq, doc, expected)).rowcount
+            if not swapped and not expected:
+                swapped = self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (doc, body, op_seq) "
+                    "VALUES (?, ?, ?)", (doc, body, seq)).rowcount
+        return swapped == 1
+
+    def delete_ops(self, doc: str, before: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM grocery_ops WHERE doc = ? AND seq < ?",
+                (doc, before))
+
+    def append_history(self, entries: list[dict[str, Any]]) -> None:
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO purchase_history "
+                "(item, bought_at, purchase_id) "
+                "VALUES (:item, :bought_at, :purchase_id)", entries)
+
+    def read_history(self, after: int = 0) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, item, bought_at, purchase_id "
+                "FROM purchase_history WHERE seq > ? ORDER BY seq",
+                (after,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def insert_logs(self, entries: list[dict[str, Any]]) -> None:
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                "INSERT INTO log_entries (timestamp, level, message, "
+                "function, line_no, module) VALUES (:timestamp, :level, "
+                ":message, :function, :line_no, :module)", entries)
+
+    def _transaction(self) -> "sqlite3.Connection":
+        """
+        Begin a transaction committed or rolled back by the with block.
+
+        Arguments:
+            None
+
+        Returns:
+            sqlite3.Connection -- The connection, used as context manager.
+        """
+        self._conn.execute("BEGIN")
+        return self._conn
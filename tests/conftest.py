@@ -0,0 +1,5 @@
+import os
+
+# Keep log records of the modules under test in a throwaway database
+os.environ.setdefault("GROCERY_STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("GROCERY_SQLITE_PATH", ":memory:")
@@ -0,0 +1,93 @@
+from cache import VersionedCache
+
+
+def _loaded(value, version, ttl=60.0):
+    cache = VersionedCache(ttl=ttl)
+    cache.get("list", lambda: (value, version), lambda: version)
+    return cache
+
+
+def _append(item):
+    return lambda value, version: value + [item]
+
+
+def test_apply_moves_an_entry_at_the_base_to_the_new_version():
+    cache = _loaded(["Milk"], 3)
+
+    assert cache.apply("list", 3, 5, _append("Eggs"))
+    assert cache.peek("list") == ["Milk", "Eggs"]
+    assert cache.stats()["deltas"] == 1
+
+
+def test_apply_skips_a_delta_the_entry_already_holds():
+    cache = _loaded(["Milk", "Eggs"], 5)
+
+    assert cache.apply("list", 3, 5, _append("Eggs"))
+    assert cache.peek("list") == ["Milk", "Eggs"]
+    assert cache.stats()["deltas"] == 0
+
+
+def test_apply_marks_an_entry_behind_the_base_stale():
+    cache = _loaded(["Milk"], 2)
+    reloads = []
+
+    assert not cache.apply("list", 3, 5, _append("Eggs"))
+    assert cache.peek("list") == ["Milk"]
+    value = cache.get("list", lambda: reloads.append(1) or (["Bread"], 5),
+                      lambda: 5)
+    assert value == ["Bread"]
+    assert reloads == [1]
+
+
+def test_apply_without_an_entry_does_nothing():
+    cache = VersionedCache()
+
+    assert not cache.apply("list", 0, 1, _append("Eggs"))
+    assert cache.peek("list") is None
+
+
+def test_advance_follows_our_own_write():
+    cache = _loaded(["Milk"], 3, ttl=0.0)
+    cache.update("list", lambda value: value + ["Eggs"], [])
+    cache.advance("list", 3, 4)
+
+    # The probe confirms version 4, so the published value is kept
+    value = cache.get("list", lambda: (["reloaded"], 4), lambda: 4)
+    assert value == ["Milk", "Eggs"]
+
+
+def test_advance_keeps_an_entry_a_delta_moved_past_the_write():
+    cache = _loaded(["Milk"], 3, ttl=0.0)
+    cache.apply("list", 3, 6, _append("Eggs"))
+    cache.advance("list", 3, 4)
+
+    value = cache.get("list", lambda: (["reloaded"], 6), lambda: 6)
+    assert value == ["Milk", "Eggs"]
+
+
+def test_advance_from_another_version_marks_the_entry_stale():
+    cache = _loaded(["Milk"], 3, ttl=60.0)
+    cache.advance("list", 2, 4)
+
+    # A stale entry is revalidated even within the TTL and reloaded,
+    # since its version is no longer known
+    value = cache.get("list", lambda: (["reloaded"], 4), lambda: 4)
+    assert value == ["reloaded"]
+
+
+def test_advance_to_an_unknown_version_marks_the_entry_stale():
+    cache = _loaded(["Milk"], 3)
+    cache.advance("list", 3, None)
+
+    value = cache.get("list", lambda: (["reloaded"], 7), lambda: 7)
+    assert value == ["reloaded"]
+
+
+def test_stale_entry_is_served_when_the_reload_fails():
+    cache = _loaded(["Milk"], 3, ttl=0.0)
+
+    def offline():
+        raise ConnectionError("offline")
+
+    assert cache.get("list", offline, offline) == ["Milk"]
+    assert cache.stats()["stale"] == 1
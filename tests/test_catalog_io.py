@@ -0,0 +1,86 @@
+import io
+import json
+
+import pytest
+
+import catalog_io
+import oplog
+from catalog_io import read_csv, read_json
+from oplog import OpLog
+from storage import SQLiteBackend
+
+CATALOG = {
+    "Dairy": ["Milk", "Crème fraîche", "Say \"cheese\""],
+    "Back\\slash": ["Tab\there", "Snowman ☃", "Emoji \U0001F95B"],
+    "Empty": [],
+    "Spaced out": ["  leading", "trailing  "],
+}
+
+
+def _rows(catalog):
+    return [(cat, item) for cat, items in catalog.items() for item in items]
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_strings_split_at_every_chunk_boundary(monkeypatch, ensure_ascii,
+                                               indent):
+    text = json.dumps(CATALOG, ensure_ascii=ensure_ascii, indent=indent)
+    for size in range(1, len(text) + 1):
+        monkeypatch.setattr(catalog_io, "IMPORT_READ_CHARS", size)
+        assert list(read_json(io.StringIO(text))) == _rows(CATALOG), size
+
+
+def test_long_string_spans_many_chunks(monkeypatch):
+    monkeypatch.setattr(catalog_io, "IMPORT_READ_CHARS", 7)
+    catalog = {"Bulk": ["x" * 1000 + "\\\"" + "y" * 1000]}
+
+    assert list(read_json(io.StringIO(json.dumps(catalog)))) == \
+        _rows(catalog)
+
+
+def test_empty_catalog_has_no_rows():
+    assert list(read_json(io.StringIO(" { } "))) == []
+
+
+@pytest.mark.parametrize("text", ['["Milk"]', '{"Dairy": "Milk"}',
+                                  '{"Dairy": ["Milk"', '{"Dairy": ["Mi',
+                                  '{"Dairy": [1]}', ''])
+def test_invalid_catalog_is_refused(monkeypatch, text):
+    monkeypatch.setattr(catalog_io, "IMPORT_READ_CHARS", 3)
+
+    with pytest.raises(ValueError):
+        list(read_json(io.StringIO(text)))
+
+
+def test_csv_rows_are_read_in_order():
+    text = "category,grocery_items\nDairy,Milk\nBakery,\"Bread, sliced\"\n"
+
+    assert list(read_csv(io.StringIO(text))) == [
+        ("Dairy", "Milk"), ("Bakery", "Bread, sliced")]
+
+
+def test_import_compacts_in_chunks(monkeypatch):
+    monkeypatch.setattr(catalog_io, "IMPORT_COMPACT_OPS", 4)
+    monkeypatch.setattr(oplog, "OPLOG_RETAIN_OPS", 1)
+    backend = SQLiteBackend(":memory:")
+    replayed = []
+    read_ops = backend.read_ops
+
+    def counted(doc, after):
+        ops = read_ops(doc, after)
+        replayed.append(len(ops))
+        return ops
+
+    monkeypatch.setattr(backend, "read_ops", counted)
+    rows = [("Dairy & Eggs", f"Item {i}") for i in range(10)]
+
+    counts = catalog_io.import_rows(backend, rows + rows[:3], batch_size=2)
+    assert counts == {"rows": 13, "added": 10, "duplicates": 3,
+                      "rejected": 0}
+    # No read holds more than a chunk of operations, and the op-log keeps
+    # only those after the previous compaction
+    assert max(replayed) <= 4
+    assert len(read_ops("groceries", 0)) <= 4
+    assert OpLog(backend, "groceries").load()[0]["Dairy & Eggs"] == \
+        sorted(item for _, item in rows)
@@ -0,0 +1,77 @@
+import pytest
+
+from changes import ChangeFeed, Poller
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def backend():
+    return SQLiteBackend(":memory:")
+
+
+def _add(backend, doc, item):
+    return backend.append_ops(doc, [{"op": "add", "category": None,
+                                     "item": item}])[0]
+
+
+def _hide(monkeypatch, backend, hidden):
+    # Stands in for inserts that took their numbers but are not committed
+    read_ops = backend.read_ops
+    monkeypatch.setattr(backend, "read_ops", lambda doc, after: [
+        op for op in read_ops(doc, after) if op["seq"] not in hidden])
+
+
+def _items(deltas):
+    return [op["item"] for delta in deltas for op in delta.ops]
+
+
+def _poller(backend):
+    feed = ChangeFeed()
+    deltas = []
+    feed.subscribe(deltas.append)
+    poller = Poller(backend, feed, gap_window=60.0)
+    poller._sync()
+    return poller, deltas
+
+
+def test_operation_committed_out_of_order_is_published(backend,
+                                                       monkeypatch):
+    poller, deltas = _poller(backend)
+    hidden = {_add(backend, "list", "Milk")}
+    _add(backend, "list", "Eggs")
+    _hide(monkeypatch, backend, hidden)
+
+    # Eggs waits for the number before it instead of moving past Milk
+    poller.poll()
+    assert deltas == []
+
+    hidden.clear()
+    poller.poll()
+    assert _items(deltas) == ["Milk", "Eggs"]
+    assert poller.feed.version("list") == 2
+    assert poller.skipped == 0
+
+
+def test_other_documents_fill_the_sequence(backend):
+    poller, deltas = _poller(backend)
+    _add(backend, "list", "Milk")
+    _add(backend, "groceries", "Tea")
+    _add(backend, "list", "Eggs")
+
+    poller.poll()
+    assert [(delta.doc, delta.base, delta.version) for delta in deltas] == \
+        [("list", 0, 3), ("groceries", 0, 2)]
+
+
+def test_missing_number_is_passed_over_after_the_gap_window(
+        backend, monkeypatch):
+    poller, deltas = _poller(backend)
+    _hide(monkeypatch, backend, {_add(backend, "list", "Milk")})
+    _add(backend, "list", "Eggs")
+    poller.poll()
+    assert deltas == []
+
+    poller.gap_window = 0.0
+    poller.poll()
+    assert _items(deltas) == ["Eggs"]
+    assert poller.skipped == 1
@@ -0,0 +1,156 @@
+import random
+import threading
+
+import pytest
+
+import core
+from cache import VersionedCache
+from catalog import Catalog
+from journal import Journal
+import oplog
+from oplog import OpLog, RebaseConflict
+from storage import SQLiteBackend
+from write_behind import WriteBehind
+
+
+def _wire(monkeypatch, backend, debounce=60.0, compact_threshold=1000):
+    """
+    Point the core at a database and a fresh journal, cache and
+    write-behind.
+    """
+    oplogs = {doc: OpLog(backend, doc, compact_threshold=compact_threshold)
+              for doc in ("list", "groceries")}
+    journal = Journal(None)
+    writer = WriteBehind({"list": core.write_list,
+                          "groceries": core.write_groceries,
+                          "history": core.write_history},
+                         debounce=debounce, max_delay=debounce * 4,
+                         max_retry_delay=0.05,
+                         on_written=core._confirm_write).start()
+    monkeypatch.setattr(core, "_get_oplogs", lambda: oplogs)
+    monkeypatch.setattr(core, "_get_journal", lambda: journal)
+    monkeypatch.setattr(core, "_start_writer_client", lambda: None)
+    monkeypatch.setattr(core, "_start_write_behind", lambda: writer)
+    monkeypatch.setattr(core, "_read_cache", VersionedCache(ttl=60))
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    # Writes are only sent by flush_writes()
+    backend = SQLiteBackend(":memory:")
+    _wire(monkeypatch, backend)
+    return backend
+
+
+def _stored(backend):
+    return OpLog(backend, "list").load()[0]
+
+
+def test_reload_keeps_changes_not_yet_written(backend):
+    OpLog(backend, "list").write(["Milk"])
+    core.add_to_list(["Eggs"])
+    other = OpLog(backend, "list")
+    other.write(other.load()[0] + ["Bread"])
+    core._read_cache.ttl = 0
+
+    # The probe sees the other writer's version and reloads the list
+    assert core.add_to_list(["Jam"]) == ("Milk", "Bread", "Eggs", "Jam")
+    assert core.flush_writes(timeout=5)
+    assert sorted(_stored(backend)) == ["Bread", "Eggs", "Jam", "Milk"]
+    assert core._get_journal().pending() == 0
+
+
+def test_delta_of_many_adds_patches_the_sorted_catalog():
+    catalog = Catalog({"Dairy & Eggs": ["Milk", "Eggs"],
+                       "Bread & Bakery": ["Butter"]}).freeze()
+    ops = [{"seq": seq, "op": op, "category": category, "item": item}
+           for seq, (op, category, item) in enumerate([
+               ("add", "Dairy & Eggs", "Cheese"),
+               ("add", "Dairy & Eggs", "Butter"),
+               ("add", "Dairy & Eggs", "Cream"),
+               ("remove", "Dairy & Eggs", "Eggs"),
+               ("add", "Dairy & Eggs", "Eggs")], 1)]
+
+    patched = core._patch("groceries", ops, catalog, 0)
+    assert patched["Dairy & Eggs"] == ["Butter", "Cheese", "Cream", "Eggs",
+                                       "Milk"]
+    assert patched["Bread & Bakery"] == []
+    assert catalog["Dairy & Eggs"] == ["Eggs", "Milk"]
+
+
+class OtherWriter(threading.Thread):
+    """
+    Another process adding and removing its own items through its own
+    op-log, reloading when its base was compacted.
+    """
+
+    def __init__(self, backend, writes):
+        super().__init__(daemon=True)
+        self.log = OpLog(backend, "list", compact_threshold=5)
+        self.writes = writes
+        self.rng = random.Random(1)
+        self.expected = set()
+        self.removed = set()
+
+    def run(self):
+        view, base = self.log.load()
+        for n in range(self.writes):
+            if self.expected and self.rng.random() < 0.3:
+                item = self.rng.choice(sorted(self.expected))
+                self.expected.discard(item)
+                self.removed.add(item)
+                view = [name for name in view if name != item]
+            else:
+                item = f"Other {n:03d}"
+                self.expected.add(item)
+                view = view + [item]
+            try:
+                self.log.write(view, base)
+            except RebaseConflict:
+                view, base = self.log.load()
+                view = [name for name in view if name not in self.removed]
+                view += sorted(self.expected - set(view))
+                self.log.write(view, base)
+            if self.rng.random() < 0.3:
+                view, base = self.log.load()
+
+
+def test_concurrent_publishes_and_other_writers_lose_nothing(monkeypatch):
+    monkeypatch.setattr(oplog, "OPLOG_RETAIN_OPS", 2)
+    backend = SQLiteBackend(":memory:")
+    _wire(monkeypatch, backend, debounce=0.001, compact_threshold=5)
+    # Every read probes storage and reloads after the other writer
+    core._read_cache.ttl = 0
+    other = OtherWriter(backend, 250)
+    expected, removed = set(), set()
+    lock = threading.Lock()
+
+    def session(name):
+        rng = random.Random(name)
+        mine = []
+        for n in range(100):
+            if mine and rng.random() < 0.3:
+                item = mine.pop(rng.randrange(len(mine)))
+                core.remove_from_list([item])
+                with lock:
+                    removed.add(item)
+            else:
+                item = f"{name} {n:03d}"
+                core.add_to_list([item])
+                mine.append(item)
+        with lock:
+            expected.update(mine)
+
+    sessions = [threading.Thread(target=session, args=(f"Session {i}",))
+                for i in range(4)]
+    other.start()
+    for thread in sessions:
+        thread.start()
+    for thread in sessions + [other]:
+        thread.join()
+    assert core.flush_writes(timeout=10)
+
+    stored = set(_stored(backend))
+    assert expected | other.expected <= stored
+    assert not stored & (removed | other.removed)
+    assert core._get_journal().pending() == 0
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+import journal as journal_module
+from journal import Journal
+
+needs_flock = pytest.mark.skipif(journal_module.fcntl is None,
+                                 reason="journal files are not locked")
+
+
+def test_unconfirmed_entries_are_replayed(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, commit_window=0)
+    first = journal.append("list", [{"op": "add", "item": "Milk"}])
+    second = journal.append("groceries", {"Dairy": ["Milk"]})
+    journal.commit(second)
+    journal.close()
+
+    reopened = Journal(path, commit_window=0)
+    assert reopened.replay() == [
+        (first, "list", [{"op": "add", "item": "Milk"}]),
+        (second, "groceries", {"Dairy": ["Milk"]})]
+    assert reopened.pending() == 2
+    reopened.close()
+
+
+def test_confirmed_entries_are_not_replayed(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, commit_window=0)
+    journal.append("list", ["Milk"])
+    journal.append("groceries", {"Dairy": ["Milk"]})
+    seq = journal.append("list", ["Eggs"])
+    journal.commit(seq)
+    journal.confirm("list", seq)
+    assert journal.entries("list") == []
+    assert journal.entries("groceries") == [{"Dairy": ["Milk"]}]
+    journal.close()
+
+    reopened = Journal(path, commit_window=0)
+    assert [target for _, target, _ in reopened.replay()] == ["groceries"]
+    reopened.close()
+
+
+def test_confirming_everything_truncates_the_file(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, commit_window=0)
+    journal.commit(journal.append("list", ["Milk"]))
+    journal.confirm("list", journal.append("list", ["Eggs"]))
+
+    assert journal.pending() == 0
+    assert os.path.getsize(path) == 0
+    journal.close()
+
+
+def test_oversized_journal_is_rewritten_with_unconfirmed_entries(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, commit_window=0, compact_bytes=200)
+    journal.append("groceries", {"Dairy": ["Milk"]})
+    for n in range(20):
+        seq = journal.append("list", [f"item {n}"])
+    journal.commit(seq)
+    journal.confirm("list", seq)
+
+    with open(path, encoding="utf-8") as file:
+        assert len(file.readlines()) == 1
+    journal.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path, commit_window=0)
+    journal.commit(journal.append("list", ["Milk"]))
+    journal.close()
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"seq": 2, "target": "li')
+
+    reopened = Journal(path, commit_window=0)
+    assert [data for _, _, data in reopened.replay()] == [["Milk"]]
+    reopened.close()
+
+
+@needs_flock
+def test_second_process_takes_its_own_file(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    first = Journal(path, commit_window=0)
+    first.commit(first.append("list", ["Milk"]))
+
+    second = Journal(path, commit_window=0)
+    assert second.path == f"{path}.1"
+    assert second.replay() == []
+    second.commit(second.append("list", ["Eggs"]))
+    second.confirm("list", 1)
+    assert first.pending() == 1
+    first.close()
+    second.close()
+
+
+@needs_flock
+def test_orphaned_files_are_adopted(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    first = Journal(path, commit_window=0)
+    second = Journal(path, commit_window=0)
+    first.commit(first.append("list", ["Milk"]))
+    second.commit(second.append("list", ["Eggs"]))
+    first.close()
+    second.close()
+
+    reopened = Journal(path, commit_window=0)
+    assert reopened.path == path
+    assert [data for _, _, data in reopened.replay()] == [["Milk"],
+                                                          ["Eggs"]]
+    assert not os.path.exists(f"{path}.1")
+    reopened.close()
+
+
+def test_memory_only_journal_keeps_entries(tmp_path):
+    journal = Journal(None)
+    journal.commit(journal.append("list", ["Milk"]))
+
+    assert journal.entries("list") == [["Milk"]]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,151 @@
+import pytest
+
+import oplog
+from memory_client import MemoryClient
+from oplog import OpLog, RebaseConflict
+from storage import SQLiteBackend, SupabaseBackend
+
+
+@pytest.fixture(params=["sqlite", "supabase"])
+def backend(request):
+    if request.param == "sqlite":
+        return SQLiteBackend(":memory:")
+    return SupabaseBackend(MemoryClient({"grocery_ops": "seq"}))
+
+
+def _follow(log):
+    # Stands in for the change feed delivering another writer's operations
+    log.observe(log.version, log.backend.read_ops(log.doc, log.version))
+
+
+def _seqs(backend, doc="list"):
+    return [op["seq"] for op in backend.read_ops(doc, 0)]
+
+
+def test_write_stores_only_the_changed_items(backend):
+    log = OpLog(backend, "list")
+    log.write(["Milk", "Eggs"])
+
+    assert log.write(["Milk", "Bread"]) == 2
+    assert OpLog(backend, "list").load() == (["Milk", "Bread"], 4)
+
+
+def test_stale_write_is_rebased_onto_other_writers(backend):
+    ours, theirs = OpLog(backend, "list"), OpLog(backend, "list")
+    theirs.write(["Milk", "Eggs"])
+    view, base = ours.load()
+    theirs.write(["Milk", "Butter"])
+    _follow(ours)
+
+    # Without the rebase the diff would drop Butter and bring Eggs back
+    ours.write(view + ["Bread"], base)
+    assert OpLog(backend, "list").load()[0] == ["Milk", "Butter", "Bread"]
+    assert ours.rebases == 1
+
+
+def test_compaction_keeps_operations_a_fetched_snapshot_needs(backend,
+                                                              monkeypatch):
+    monkeypatch.setattr(oplog, "OPLOG_RETAIN_OPS", 1)
+    log = OpLog(backend, "list")
+    log.write(["Milk", "Eggs"])
+    log.compact()
+    assert backend.read_document("list") == (["Milk", "Eggs"], 2)
+    assert _seqs(backend) == [1, 2]
+
+    log.write(["Milk", "Eggs", "Bread"])
+    log.compact()
+    # Operations the replaced snapshot held are deleted, not newer ones
+    assert _seqs(backend) == [2, 3]
+    assert OpLog(backend, "list").load() == (["Milk", "Eggs", "Bread"], 3)
+
+
+def test_write_based_on_a_compacted_version_is_refused(backend, monkeypatch):
+    monkeypatch.setattr(oplog, "OPLOG_RETAIN_OPS", 1)
+    ours, theirs = OpLog(backend, "list"), OpLog(backend, "list")
+    theirs.write(["Milk", "Eggs"])
+    view, base = ours.load()
+    for document in (["Milk"], ["Milk", "Bread"], ["Milk", "Bread", "Tea"]):
+        theirs.write(document)
+        _follow(ours)
+        theirs.compact()
+    assert base not in _seqs(backend)
+
+    # The removal of Eggs is gone from the op-log, a rebase would
+    # bring Eggs back
+    with pytest.raises(RebaseConflict):
+        ours.write(view + ["Butter"], base)
+    assert ours.stale == 1
+    assert OpLog(backend, "list").load()[0] == ["Milk", "Bread", "Tea"]
+
+    view, base = ours.load()
+    ours.write(view + ["Butter"], base)
+    assert OpLog(backend, "list").load()[0] == ["Milk", "Bread", "Tea",
+                                                "Butter"]
+
+
+def test_retained_operations_are_counted_per_document(backend, monkeypatch):
+    monkeypatch.setattr(oplog, "OPLOG_RETAIN_OPS", 3)
+    ours, theirs = OpLog(backend, "list"), OpLog(backend, "list")
+    catalog = OpLog(backend, "groceries")
+    theirs.write(["Milk", "Eggs"])
+    view, base = ours.load()
+    theirs.write(["Milk", "Eggs", "Bread"])
+    theirs.compact()
+    # Newer operations of another document do not push ours out
+    catalog.write({"Dairy": ["Milk", "Butter", "Cheese", "Yogurt"]})
+    theirs.write(["Milk", "Bread"])
+    theirs.compact()
+    assert base in _seqs(backend)
+    _follow(ours)
+
+    ours.write(view + ["Tea"], base)
+    assert OpLog(backend, "list").load()[0] == ["Milk", "Bread", "Tea"]
+    assert ours.stale == 0
+
+
+def test_losing_compaction_does_not_overwrite_the_snapshot(backend):
+    first, second = OpLog(backend, "list"), OpLog(backend, "list")
+    first.write(["Milk", "Eggs"])
+    second.load()
+    first.compact()
+    first.write(["Milk"])
+
+    # The second compaction re-reads and swaps on top of the first
+    second.compact()
+    assert backend.read_document("list") == (["Milk"], 3)
+    assert OpLog(backend, "list").load() == (["Milk"], 3)
+
+
+def test_operations_sent_again_do_not_move_the_version_back(backend):
+    log, other = OpLog(backend, "list"), OpLog(backend, "list")
+    log.load()
+    eggs = {"op": "add", "category": None, "item": "Eggs", "op_id": "a"}
+    log.append([eggs])
+    other.write([])
+
+    log.append([eggs, {"op": "add", "category": None, "item": "Jam",
+                       "op_id": "b"}])
+    assert log.version == backend.latest_seq("list")
+    # Eggs stays removed in the persisted state, so adding it is written
+    log.write(["Jam", "Eggs"])
+    assert OpLog(backend, "list").load()[0] == ["Jam", "Eggs"]
+
+
+def test_load_racing_compactions_rereads(backend, monkeypatch):
+    monkeypatch.setattr(oplog, "OPLOG_RETAIN_OPS", 1)
+    writer, reader = OpLog(backend, "list"), OpLog(backend, "list")
+    writer.write(["Milk"])
+    writer.compact()
+    read_document = backend.read_document
+
+    def compacted(doc):
+        # Compactions land between the snapshot and the op-log read
+        stored = read_document(doc)
+        monkeypatch.setattr(backend, "read_document", read_document)
+        for item in ("Eggs", "Bread", "Tea"):
+            writer.write(writer.load()[0] + [item])
+            writer.compact()
+        return stored
+
+    monkeypatch.setattr(backend, "read_document", compacted)
+    assert reader.load() == (["Milk", "Eggs", "Bread", "Tea"], 4)
@@ -0,0 +1,156 @@
+import pytest
+
+import resilience
+from memory_client import MemoryClient
+from resilience import CircuitBreaker, CircuitOpenError, ResilientBackend
+from storage import SupabaseBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.opened == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 1
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_opens_the_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    clock.now += 9
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+class Flaky(SupabaseBackend):
+    """
+    Backend whose reads fail a given number of times.
+    """
+
+    def __init__(self, failures):
+        super().__init__(MemoryClient({"grocery_ops": "seq"}))
+        self.failures = failures
+        self.calls = 0
+
+    def read_document(self, doc):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("offline")
+        return super().read_document(doc)
+
+
+def test_idempotent_calls_are_retried():
+    inner = Flaky(failures=2)
+    backend = ResilientBackend(inner, attempts=3, base_delay=0.001,
+                               breaker=CircuitBreaker(failure_threshold=5))
+
+    assert backend.read_document("list") is None
+    assert inner.calls == 3
+    assert backend.stats()["retries"] == 2
+    assert backend.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_fails_fast_without_calling_the_backend():
+    inner = Flaky(failures=10)
+    backend = ResilientBackend(inner, attempts=2, base_delay=0.001,
+                               breaker=CircuitBreaker(failure_threshold=2,
+                                                      reset_timeout=60))
+
+    with pytest.raises(ConnectionError):
+        backend.read_document("list")
+    with pytest.raises(CircuitOpenError):
+        backend.read_document("list")
+    assert inner.calls == 2
+    assert backend.stats()["short_circuited"] == 1
+
+
+def test_swap_whose_response_was_lost_reports_success():
+    class LostAck(SupabaseBackend):
+        def swap_document(self, doc, document, seq, expected):
+            super().swap_document(doc, document, seq, expected)
+            raise ConnectionError("connection reset")
+
+    inner = LostAck(MemoryClient({"grocery_ops": "seq"}))
+    inner.write_document("list", [], 0)
+    backend = ResilientBackend(inner)
+
+    assert backend.swap_document("list", ["Milk"], 4, 0)
+    assert inner.read_document("list") == (["Milk"], 4)
+
+
+def test_append_whose_response_was_lost_is_stored_once():
+    class LostAck(SupabaseBackend):
+        lost = 0
+
+        def append_ops(self, doc, ops):
+            seqs = super().append_ops(doc, ops)
+            if not self.lost:
+                self.lost += 1
+                raise ConnectionError("connection reset")
+            return seqs
+
+    inner = LostAck(MemoryClient({"grocery_ops": "seq"}))
+    backend = ResilientBackend(inner, attempts=3, base_delay=0.001)
+
+    assert backend.append_ops("list", [
+        {"op": "add", "category": None, "item": "Milk"}]) == [1]
+    assert [op["item"] for op in inner.read_ops("list", 0)] == ["Milk"]
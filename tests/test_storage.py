@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from memory_client import MemoryClient
+from storage import SQLiteBackend, SupabaseBackend
+
+
+@pytest.fixture(params=["sqlite", "supabase"])
+def backend(request):
+    if request.param == "sqlite":
+        return SQLiteBackend(":memory:")
+    return SupabaseBackend(MemoryClient({"grocery_ops": "seq"}))
+
+
+def _add(item, op_id=None):
+    op = {"op": "add", "category": None, "item": item}
+    return op if op_id is None else {**op, "op_id": op_id}
+
+
+def test_operations_with_a_stored_op_id_are_skipped(backend):
+    ops = [_add("Milk", "a"), _add("Eggs", "b")]
+    seqs = backend.append_ops("list", ops)
+    backend.append_ops("list", [_add("Bread", "c")])
+
+    assert backend.append_ops("list", ops) == seqs
+    assert [op["item"] for op in backend.read_ops("list", 0)] == [
+        "Milk", "Eggs", "Bread"]
+
+
+def test_operations_without_op_id_are_always_stored(backend):
+    backend.append_ops("list", [_add("Milk")])
+    backend.append_ops("list", [_add("Milk")])
+
+    assert len(backend.read_ops("list", 0)) == 2
+
+
+def test_database_without_op_ids_is_migrated(tmp_path):
+    path = str(tmp_path / "groceries.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE grocery_ops (seq INTEGER PRIMARY KEY "
+                 "AUTOINCREMENT, doc TEXT NOT NULL, op TEXT NOT NULL, "
+                 "category TEXT, item TEXT)")
+    conn.execute("INSERT INTO grocery_ops (doc, op, item) "
+                 "VALUES ('list', 'add', 'Milk')")
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(path)
+    seqs = backend.append_ops("list", [_add("Eggs", "a")])
+    assert backend.append_ops("list", [_add("Eggs", "a")]) == seqs
+    assert [op["item"] for op in backend.read_ops("list", 0)] == [
+        "Milk", "Eggs"]
@@ -0,0 +1,59 @@
+import pytest
+
+from write_behind import WriteBehind
+
+
+def test_submits_before_a_write_coalesce_into_the_latest():
+    written = []
+    engine = WriteBehind({"list": written.append}, debounce=0.01)
+    for snapshot in (["Milk"], ["Milk", "Eggs"], ["Eggs"]):
+        engine.submit("list", snapshot)
+
+    assert engine.pending() == 1
+    assert engine.start().flush(timeout=5)
+    assert written == [["Eggs"]]
+    assert engine.superseded == 2
+    assert engine.pending() == 0
+    assert engine.lag() == 0.0
+
+
+def test_targets_are_written_separately():
+    written = []
+    engine = WriteBehind({"list": lambda s: written.append(("list", s)),
+                          "groceries": lambda s: written.append(
+                              ("groceries", s))}, debounce=0.01)
+    engine.submit("list", ["Milk"])
+    engine.submit("groceries", {"Dairy": ["Milk"]})
+
+    assert engine.start().flush(timeout=5)
+    assert sorted(written) == [("groceries", {"Dairy": ["Milk"]}),
+                               ("list", ["Milk"])]
+    assert engine.superseded == 0
+
+
+def test_failed_write_is_retried_and_reports_its_token():
+    attempts = []
+    tokens = []
+
+    def write(snapshot):
+        attempts.append(snapshot)
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+
+    engine = WriteBehind({"list": write}, debounce=0.01,
+                         max_retry_delay=0.05,
+                         on_written=lambda target, token: tokens.append(
+                             (target, token)))
+    engine.submit("list", ["Milk"], token=7)
+
+    assert engine.start().flush(timeout=5)
+    assert attempts == [["Milk"], ["Milk"]]
+    assert engine.failed == 1
+    assert tokens == [("list", 7)]
+
+
+def test_unknown_target_is_refused():
+    engine = WriteBehind({"list": lambda snapshot: None})
+
+    with pytest.raises(KeyError):
+        engine.submit("groceries", {})
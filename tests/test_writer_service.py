@@ -0,0 +1,72 @@
+from memory_client import MemoryClient
+from oplog import OpLog
+from storage import SupabaseBackend
+from writer_service import WriterClient, WriterService
+
+
+class Connection:
+    def __init__(self):
+        self.acks = []
+
+    def send(self, message):
+        self.acks.extend(message["ack"])
+
+
+def _service(tmp_path):
+    backend = SupabaseBackend(MemoryClient({"grocery_ops": "seq",
+                                            "purchase_history": "seq"}))
+    return WriterService(backend, str(tmp_path / "writer.sock"))
+
+
+def _items(service):
+    return [op["item"] for op in service.backend.read_ops("list", 0)]
+
+
+def _add(item, op_id):
+    return [{"op": "add", "category": None, "item": item, "op_id": op_id}]
+
+
+def test_change_resent_while_queued_is_stored_once(tmp_path):
+    service = _service(tmp_path)
+    old, new = Connection(), Connection()
+    service.submit(old, 1, "list", _add("Eggs", "a"))
+    # The client reconnected before the first copy was stored
+    service.submit(new, 1, "list", _add("Eggs", "a"))
+    service.submit(new, 2, "list", _add("Jam", "b"))
+    service._store("list")
+
+    assert _items(service) == ["Eggs", "Jam"]
+    assert old.acks == [1] and new.acks == [1, 2]
+
+
+def test_change_resent_after_a_lost_ack_stays_undone(tmp_path):
+    service = _service(tmp_path)
+    service.submit(Connection(), 1, "list", _add("Eggs", "a"))
+    service._store("list")
+    other = OpLog(service.backend, "list")
+    other.write([])
+
+    service.submit(Connection(), 1, "list", _add("Eggs", "a"))
+    service.submit(Connection(), 2, "list", _add("Jam", "b"))
+    service._store("list")
+
+    assert OpLog(service.backend, "list").load()[0] == ["Jam"]
+    assert len(service.backend.read_ops("list", 0)) == 3
+
+
+def test_purchase_resent_while_queued_is_stored_once(tmp_path):
+    service = _service(tmp_path)
+    purchase = {"item": "Milk", "at": 0, "id": "p1"}
+    service.submit(Connection(), 1, "history", purchase)
+    service.submit(Connection(), 1, "history", purchase)
+    service._store("history")
+
+    assert len(service.backend.read_history()) == 1
+
+
+def test_client_gives_operations_ids_kept_for_resending(tmp_path):
+    client = WriterClient(str(tmp_path / "writer.sock"))
+    client.submit("list", [{"op": "add", "category": None, "item": "Milk"}])
+
+    (target, data, _, _), = client._unacked.values()
+    assert target == "list" and data[0]["op_id"]
@@ -0,0 +1,309 @@
+import threading
+import time
+from typing import Any, Callable
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class WriteBehind:
+    """
+    Coalescing write-behind engine.
+
+    Keeps only the latest pending snapshot for each target and writes it
+    from a single background thread once the target has been quiet for
+    the debounce period, or once the oldest pending change reaches the
+    deadline. Intermediate snapshots that are superseded before they are
+    written are dropped. A snapshot whose write raises is queued again,
+    unless a newer one arrived meanwhile, and retried with exponential
+    backoff up to max_retry_delay seconds. A snapshot may carry a token,
+    such as a journal sequence number, that is passed to on_written once
+    the snapshot, or one that superseded it, has been written.
+
+    Methods:
+        start() -- Start the background writer thread.
+        submit(target, snapshot, token) -- Queue the latest snapshot for a
+            target.
+        pending() -- Number of targets with unwritten snapshots.
+        lag() -- Age of the oldest change that is not yet written.
+        flush(timeout) -- Write everything now and wait until it is done.
+
+    Attributes:
+        debounce: Quiet period in seconds before a target is written.
+        max_delay: Maximum age in seconds of a pending snapshot.
+        max_retry_delay: Maximum seconds between retries of a failed write.
+        superseded: Number of snapshots dropped in favour of a newer one.
+        failed: Number of writes that raised and were queued again.
+    """
+
+    def __init__(self, writers: dict[str, Callable[[Any], None]],
+                 debounce: float = 0.5, max_delay: float = 2.0,
+                 max_retry_delay: float = 30.0,
+                 on_written: Callable[[str, Any], None] | None = None
+                 ) -> None:
+        """
+        Initialize the engine with one write function per target.
+
+        Arguments:
+            writers (dict[str, Callable]) -- Write function for each target.
+
+        Keyword Arguments:
+            debounce (float) -- Quiet period before writing, default: 0.5
+            max_delay (float) -- Deadline for a pending write, default: 2.0
+            max_retry_delay (float) -- Maximum backoff of a failed write,
+                default: 30.0
+            on_written (Callable | None) -- Called with the target and the
+                token of each written snapshot, default: None
+
+        Returns:
+            None
+
+        Example:
+            >>> engine = WriteBehind({"list": write_list})
+        """
+        self._writers = writers
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_retry_delay = max_retry_delay
+        self.on_written = on_written
+        self.superseded = 0
+        self.failed = 0
+        self._cond = threading.Condition()
+        self._pending: dict[str, Any] = {}
+        self._tokens: dict[str, Any] = {}
+        self._first_submit: dict[str, float] = {}
+        self._last_submit: dict[str, float] = {}
+        # Time of the oldest unwritten change of each target, kept across
+        # retries and cleared once a write succeeds
+        self._dirty_since: dict[str, float] = {}
+        # Consecutive failures and earliest retry time of failed targets
+        self._failures: dict[str, int] = {}
+        self._retry_at: dict[str, float] = {}
+        self._in_flight = 0
+        self._flush_requested = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "WriteBehind":
+        """
+        Start the background writer thread.
+
+        Arguments:
+            None
+
+        Returns:
+            WriteBehind -- The engine itself, for chaining.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name="write-behind",
+                                            daemon=True)
+            self._thread.start()
+            logger.info("Write-behind thread started.")
+        return self
+
+    def submit(self, target: str, snapshot: Any, token: Any = None) -> None:
+        """
+        Queue a snapshot for a target, replacing any unwritten one.
+
+        Arguments:
+            target (str) -- Name of the target, e.g. "list".
+            snapshot (Any) -- The full state to write.
+
+        Keyword Arguments:
+            token (Any) -- Passed to on_written once written, default: None
+
+        Returns:
+            None
+
+        Raises:
+            KeyError -- If no writer is registered for the target.
+        """
+        if target not in self._writers:
+            raise KeyError(f"No writer registered for target {target!r}")
+        now = time.monotonic()
+        with self._cond:
+            if target in self._pending:
+                self.superseded += 1
+            else:
+                self._first_submit[target] = now
+            self._pending[target] = snapshot
+            self._tokens[target] = token
+            self._last_submit[target] = now
+            self._dirty_since.setdefault(target, now)
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        """
+        Return the number of targets whose latest snapshot is not yet durable.
+
+        Arguments:
+            None
+
+        Returns:
+            int -- Pending targets, including a write in flight.
+        """
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def lag(self) -> float:
+        """
+        Return how long the oldest unwritten change has been waiting.
+
+        Arguments:
+            None
+
+        Returns:
+            float -- Seconds since the oldest change that is pending, in
+                flight or being retried was submitted, 0.0 if none.
+        """
+        with self._cond:
+            if not self._dirty_since:
+                return 0.0
+            return time.monotonic() - min(self._dirty_since.values())
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Write all pending snapshots immediately and wait for completion.
+
+        Keyword Arguments:
+            timeout (float | None) -- Seconds to wait, default: None (forever)
+
+        Returns:
+            bool -- True if everything was written before the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None \
+                    else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _due_in(self, target: str, now: float) -> float:
+        """
+        Seconds until a pending target should be written.
+
+        Arguments:
+            target (str) -- Name of the target.
+            now (float) -- Current monotonic time.
+
+        Returns:
+            float -- Seconds until due, zero or less when due now.
+        """
+        # Failed writes wait out their backoff, even when flushing
+        backoff = self._retry_at.get(target, now) - now
+        if self._flush_requested:
+            return backoff
+        return max(backoff, min(self._last_submit[target] + self.debounce,
+                                self._first_submit[target] + self.max_delay)
+                   - now)
+
+    def _take_due(self) -> tuple[str, Any, Any]:
+        """
+        Block until a target is due and remove its snapshot from pending.
+
+        Arguments:
+            None
+
+        Returns:
+            tuple[str, Any, Any] -- The target, its latest snapshot and the
+                snapshot's token.
+        """
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._flush_requested = False
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                target = min(self._pending,
+                             key=lambda name: self._due_in(name, now))
+                wait = self._due_in(target, now)
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                snapshot = self._pending.pop(target)
+                token = self._tokens.pop(target)
+                del self._first_submit[target], self._last_submit[target]
+                self._in_flight += 1
+                return target, snapshot, token
+
+    def _run(self) -> None:
+        """
+        Writer loop that writes due snapshots until the process exits.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        while True:
+            target, snapshot, token = self._take_due()
+            try:
+                self._writers[target](snapshot)
+            except Exception as e:
+                self._requeue(target, snapshot, token)
+                logger.error("Error in write-behind for %s: %s", target, e)
+            else:
+                self._written(target, token)
+                with self._cond:
+                    self._failures.pop(target, None)
+                    self._retry_at.pop(target, None)
+                    if target in self._pending:
+                        self._dirty_since[target] = \
+                            self._first_submit[target]
+                    else:
+                        self._dirty_since.pop(target, None)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _written(self, target: str, token: Any) -> None:
+        """
+        Report a written snapshot to on_written.
+
+        Arguments:
+            target (str) -- Name of the target.
+            token (Any) -- Token the snapshot was submitted with.
+
+        Returns:
+            None
+        """
+        if self.on_written is None:
+            return
+        try:
+            self.on_written(target, token)
+        except Exception as e:
+            logger.error("Error in on_written for %s: %s", target, e)
+
+    def _requeue(self, target: str, snapshot: Any, token: Any) -> None:
+        """
+        Queue a snapshot whose write failed again, with backoff.
+
+        Arguments:
+            target (str) -- Name of the target.
+            snapshot (Any) -- The snapshot that was not written.
+            token (Any) -- Token the snapshot was submitted with.
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        with self._cond:
+            self.failed += 1
+            failures = self._failures.get(target, 0) + 1
+            self._failures[target] = failures
+            self._retry_at[target] = now + min(
+                self.max_retry_delay, self.debounce * 2 ** failures)
+            # A newer snapshot replaces the failed one
+            if target not in self._pending:
+                self._pending[target] = snapshot
+                self._tokens[target] = token
+                self._first_submit[target] = now
+                self._last_submit[target] = now
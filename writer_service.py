@@ -0,0 +1,527 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
+from config import (WRITE_DEBOUNCE_SECONDS, WRITE_MAX_DELAY_SECONDS,
+                    WRITER_RECONNECT_SECONDS, WRITER_SOCKET_PATH)
+from history import purchase_row
+from logger_config import get_logger
+from oplog import OpLog, with_op_ids
+from storage import StorageBackend
+from write_behind import WriteBehind
+
+logger = get_logger(__name__)
+
+
+def _encode(message: dict[str, Any]) -> bytes:
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def _unique(changes: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    # Drops copies of a change sent again, by op_id or purchase_id
+    seen = set()
+    for change in changes:
+        key = change.get("op_id") or change.get("purchase_id")
+        if key is None or key not in seen:
+            seen.add(key)
+            yield change
+
+
+class _Connection:
+    """
+    Sending side of a client connection, shared by the handler thread and
+    the writer thread.
+    """
+
+    def __init__(self, wfile: BinaryIO) -> None:
+        self._wfile = wfile
+        self._lock = threading.Lock()
+
+    def send(self, message: dict[str, Any]) -> None:
+        # A closed connection is ignored, the client resends on reconnect
+        try:
+            with self._lock:
+                self._wfile.write(_encode(message))
+                self._wfile.flush()
+        except (OSError, ValueError):
+            pass
+
+
+class WriterService:
+    """
+    Host-wide writer that stores the changes of every app process.
+
+    App processes send the item operations of each change, and checked-off
+    purchases, over a Unix socket as JSON lines. The service queues them
+    per target and hands the targets to a WriteBehind engine, so bursts
+    from all processes are coalesced into one storage request per target
+    and only this process appends to the op-log and compacts it. Each
+    change is acknowledged to its sender once it is stored. A change sent
+    again after a lost acknowledgement, or after a reconnect while its
+    first copy is still queued, is stored once: operations carry an op_id
+    and purchases an id, copies in a batch are dropped and storage skips
+    those it already holds.
+
+    Methods:
+        submit(connection, message_id, target, data) -- Queue a change.
+        flush(timeout) -- Store everything queued now.
+        serve_forever() -- Accept app processes until shutdown().
+        shutdown() -- Stop serving and remove the socket.
+
+    Attributes:
+        socket_path: Path of the Unix socket.
+        received: Number of changes received.
+        batches: Number of storage requests made.
+    """
+
+    TARGETS = ("list", "groceries", "history")
+
+    def __init__(self, backend: StorageBackend, socket_path: str,
+                 debounce: float = WRITE_DEBOUNCE_SECONDS,
+                 max_delay: float = WRITE_MAX_DELAY_SECONDS) -> None:
+        """
+        Initialize the service.
+
+        Arguments:
+            backend (StorageBackend) -- Storage to write to.
+            socket_path (str) -- Path of the Unix socket to listen on.
+
+        Keyword Arguments:
+            debounce (float) -- Quiet period before writing a target,
+                default: WRITE_DEBOUNCE_SECONDS
+            max_delay (float) -- Deadline for a queued change,
+                default: WRITE_MAX_DELAY_SECONDS
+
+        Returns:
+            None
+
+        Example:
+            >>> WriterService(get_backend(), "/tmp/grocery.sock")
+        """
+        self.backend = backend
+        self.socket_path = socket_path
+        self.received = 0
+        self.batches = 0
+        self._oplogs = {"list": OpLog(backend, "list"),
+                        "groceries": OpLog(backend, "groceries")}
+        self._lock = threading.Lock()
+        # Target -> (connection, message id, data) of unstored changes
+        self._queued: dict[str, list[tuple[_Connection, int, Any]]] = {
+            target: [] for target in self.TARGETS}
+        self._writer = WriteBehind(
+            {target: partial(self._store, target) for target in self.TARGETS},
+            debounce=debounce, max_delay=max_delay)
+        self._server: socketserver.ThreadingUnixStreamServer | None = None
+
+    def submit(self, connection: _Connection, message_id: int, target: str,
+               data: Any) -> None:
+        """
+        Queue a change of an app process.
+
+        Arguments:
+            connection (_Connection) -- Where to acknowledge it.
+            message_id (int) -- Id the sender gave the change.
+            target (str) -- "list", "groceries" or "history".
+            data (Any) -- Operations, or a purchase with item, at and id.
+
+        Returns:
+            None
+
+        Raises:
+            KeyError -- If the target is unknown.
+        """
+        with self._lock:
+            self._queued[target].append((connection, message_id, data))
+            self.received += 1
+        self._writer.submit(target, None)
+
+    def _store(self, target: str, _: None = None) -> None:
+        """
+        Store the queued changes of a target in one request and acknowledge
+        them. They are queued again if the request fails.
+
+        Arguments:
+            target (str) -- Name of the target.
+
+        Returns:
+            None
+
+        Raises:
+            Exception -- If the write fails, so the engine retries it.
+        """
+        with self._lock:
+            batch, self._queued[target] = self._queued[target], []
+        if not batch:
+            return
+        try:
+            if target == "history":
+                self.backend.append_history(list(_unique(
+                    purchase_row(data["item"], data["at"], data.get("id"))
+                    for _, _, data in batch)))
+            else:
+                self._oplogs[target].append(list(_unique(
+                    op for _, _, ops in batch for op in ops)))
+        except Exception:
+            with self._lock:
+                self._queued[target][:0] = batch
+            raise
+        self.batches += 1
+        acks: dict[_Connection, list[int]] = defaultdict(list)
+        for connection, message_id, _ in batch:
+            acks[connection].append(message_id)
+        for connection, ids in acks.items():
+            connection.send({"ack": ids})
+        logger.info("Stored %d %s changes from %d connections",
+                    len(batch), target, len(acks))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Store all queued changes now and wait for completion.
+
+        Keyword Arguments:
+            timeout (float | None) -- Seconds to wait, default: None (forever)
+
+        Returns:
+            bool -- True if everything was stored before the timeout.
+        """
+        return self._writer.flush(timeout)
+
+    def _handle(self, rfile: BinaryIO, wfile: BinaryIO) -> None:
+        """
+        Read the messages of one app process until it disconnects.
+
+        Arguments:
+            rfile (BinaryIO) -- Incoming JSON lines.
+            wfile (BinaryIO) -- Outgoing JSON lines.
+
+        Returns:
+            None
+        """
+        connection = _Connection(wfile)
+        for line in rfile:
+            try:
+                message = json.loads(line)
+                if message.get("flush"):
+                    self.flush()
+                else:
+                    self.submit(connection, message["id"], message["target"],
+                                message["data"])
+            except (ValueError, KeyError) as e:
+                logger.error("Error in writer service message: %s", e)
+
+    def serve_forever(self) -> None:
+        """
+        Listen on the socket and serve app processes until shutdown().
+
+        A socket file left by a stopped service is replaced.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            RuntimeError -- If another service is listening on the socket.
+        """
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(f"A writer service is already listening "
+                                   f"on {self.socket_path}")
+            finally:
+                probe.close()
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                service._handle(self.rfile, self.wfile)
+
+        self._writer.start()
+        self._server = socketserver.ThreadingUnixStreamServer(
+            self.socket_path, Handler)
+        self._server.daemon_threads = True
+        logger.info("Writer service listening on %s", self.socket_path)
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """
+        Stop serving, store what is queued and remove the socket.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.flush()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class WriterClient:
+    """
+    Sends the changes of an app process to the writer service.
+
+    Changes are kept until the service acknowledges that they are stored,
+    and sent again after a reconnect, so a restart of the service loses
+    nothing. Operations are given an op_id when submitted, so the copies
+    sent again are stored once. Acknowledged changes are reported to
+    on_written with their token, like WriteBehind does.
+
+    Methods:
+        start() -- Start the connection thread.
+        submit(target, data, token) -- Send a change.
+        pending() -- Number of changes not yet stored.
+        lag() -- Age of the oldest change not yet stored.
+        flush(timeout) -- Ask the service to store everything now and wait.
+
+    Attributes:
+        socket_path: Path of the service's Unix socket.
+        reconnect_delay: Seconds between connection attempts.
+        failed: Number of lost or failed connections.
+    """
+
+    def __init__(self, socket_path: str,
+                 on_written: Callable[[str, Any], None] | None = None,
+                 reconnect_delay: float = WRITER_RECONNECT_SECONDS) -> None:
+        """
+        Initialize the client, it connects once started.
+
+        Arguments:
+            socket_path (str) -- Path of the service's Unix socket.
+
+        Keyword Arguments:
+            on_written (Callable | None) -- Called with the target and the
+                token of the newest stored change, default: None
+            reconnect_delay (float) -- Seconds between connection attempts,
+                default: WRITER_RECONNECT_SECONDS
+
+        Returns:
+            None
+
+        Example:
+            >>> client = WriterClient("/tmp/grocery.sock").start()
+        """
+        self.socket_path = socket_path
+        self.on_written = on_written
+        self.reconnect_delay = reconnect_delay
+        self.failed = 0
+        self._cond = threading.Condition()
+        # Message id -> (target, data, token, monotonic submit time)
+        self._unacked: dict[int, tuple[str, Any, Any, float]] = {}
+        self._next_id = 0
+        self._socket: socket.socket | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "WriterClient":
+        """
+        Start the thread that connects and reads acknowledgements.
+
+        Arguments:
+            None
+
+        Returns:
+            WriterClient -- The client itself, for chaining.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name="writer-client",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def _send(self, message: dict[str, Any]) -> None:
+        # The lock must be held; on error the reader thread reconnects
+        if self._socket is None:
+            return
+        try:
+            self._socket.sendall(_encode(message))
+        except OSError:
+            self._socket.close()
+            self._socket = None
+
+    def submit(self, target: str, data: Any, token: Any = None) -> None:
+        """
+        Send a change to the writer service.
+
+        Arguments:
+            target (str) -- "list", "groceries" or "history".
+            data (Any) -- Operations, or a purchase with item and at.
+
+        Keyword Arguments:
+            token (Any) -- Passed to on_written once stored, default: None
+
+        Returns:
+            None
+        """
+        if target != "history":
+            data = with_op_ids(data)
+        with self._cond:
+            self._next_id += 1
+            self._unacked[self._next_id] = (target, data, token,
+                                            time.monotonic())
+            self._send({"id": self._next_id, "target": target,
+                        "data": data})
+
+    def pending(self) -> int:
+        """
+        Return the number of changes the service has not stored yet.
+
+        Arguments:
+            None
+
+        Returns:
+            int -- Unacknowledged changes.
+        """
+        with self._cond:
+            return len(self._unacked)
+
+    def lag(self) -> float:
+        """
+        Return how long the oldest unstored change has been waiting.
+
+        Arguments:
+            None
+
+        Returns:
+            float -- Seconds since it was submitted, 0.0 if none.
+        """
+        with self._cond:
+            if not self._unacked:
+                return 0.0
+            submitted = next(iter(self._unacked.values()))[3]
+            return time.monotonic() - submitted
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Ask the service to store everything now and wait for it.
+
+        Keyword Arguments:
+            timeout (float | None) -- Seconds to wait, default: None (forever)
+
+        Returns:
+            bool -- True if every change was stored before the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._send({"flush": True})
+            while self._unacked:
+                remaining = None if deadline is None \
+                    else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _acknowledge(self, ids: list[int]) -> None:
+        """
+        Forget stored changes and report them to on_written.
+
+        Arguments:
+            ids (list[int]) -- Ids of the stored changes, oldest first.
+
+        Returns:
+            None
+        """
+        newest: dict[str, Any] = {}
+        with self._cond:
+            for message_id in ids:
+                entry = self._unacked.pop(message_id, None)
+                if entry is not None:
+                    newest[entry[0]] = entry[2]
+            self._cond.notify_all()
+        if self.on_written is None:
+            return
+        for target, token in newest.items():
+            try:
+                self.on_written(target, token)
+            except Exception as e:
+                logger.error("Error in on_written for %s: %s", target, e)
+
+    def _run(self) -> None:
+        """
+        Connect, resend unstored changes and read acknowledgements, again
+        after every lost connection.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+        warned = False
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                if not warned:
+                    logger.error("Writer service unavailable: %s", e)
+                    warned = True
+                time.sleep(self.reconnect_delay)
+                continue
+            with self._cond:
+                self._socket = sock
+                for message_id, (target, data, _, _) in \
+                        self._unacked.items():
+                    self._send({"id": message_id, "target": target,
+                                "data": data})
+            logger.info("Connected to writer service %s", self.socket_path)
+            warned = False
+            try:
+                for line in sock.makefile("rb"):
+                    self._acknowledge(json.loads(line).get("ack", []))
+            except (OSError, ValueError) as e:
+                logger.error("Error in writer client: %s", e)
+            with self._cond:
+                if self._socket is sock:
+                    self._socket = None
+                self.failed += 1
+            sock.close()
+            logger.warning("Lost the writer service, reconnecting")
+            time.sleep(self.reconnect_delay)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Store the changes of all app processes on this host.")
+    parser.add_argument("--socket",
+                        default=os.environ.get("GROCERY_WRITER_SOCKET",
+                                               WRITER_SOCKET_PATH),
+                        help="path of the Unix socket to listen on")
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error("no socket path, pass --socket or set "
+                     "GROCERY_WRITER_SOCKET")
+    from database import get_backend
+    service = WriterService(get_backend(), args.socket)
+    # Store what is queued when stopped by the process manager
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()